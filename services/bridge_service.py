@@ -2,6 +2,9 @@ import argparse
 
 from .enel_service.enel_event_handler import EnelEventHandler
 from .server import ZeroMQServer
+from .metrics import start_metrics_server
+from .deadline_handler import DeadlineEventHandler
+from .replay import EventRecorder
 from .event_handler import EventHandler, NoOpEventHandler
 from .ellis_port.ellis_event_handler import EllisEventHandler
 
@@ -42,8 +45,43 @@ if __name__ == "__main__":
         default=5555,
         help='Port number to listen on (default: 5555)'
     )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=4,
+        help='Number of worker threads processing events of different applications in parallel (default: 4)'
+    )
+    parser.add_argument(
+        '--trusted-payloads',
+        action='store_true',
+        help='Skip validation of event payloads, only use with listeners sending well-formed events'
+    )
+    parser.add_argument(
+        '--metrics-port',
+        type=int,
+        default=9555,
+        help='Port serving latency metrics on http://localhost:<port>/metrics, 0 disables it (default: 9555)'
+    )
+    parser.add_argument(
+        '--deadline-ms',
+        type=int,
+        default=0,
+        help='Answer JOB_END events within this many milliseconds and finish slower recommendations in the background, '
+             '0 disables the deadline (default: 0)'
+    )
+    parser.add_argument(
+        '--record',
+        type=str,
+        default=None,
+        help='Append all received events as JSON lines to this file, e.g. to replay them with services.replay'
+    )
     args = parser.parse_args()
 
     event_handler = get_event_handler(args.handler)
-    server = ZeroMQServer(event_handler, args.port)
+    if args.deadline_ms:
+        event_handler = DeadlineEventHandler(event_handler, args.deadline_ms)
+    recorder = EventRecorder(args.record) if args.record else None
+    server = ZeroMQServer(event_handler, args.port, args.workers, args.trusted_payloads, recorder)
+    if args.metrics_port:
+        start_metrics_server(server.metrics, args.metrics_port)
     server.start()
@@ -0,0 +1,98 @@
+import json
+import re
+from abc import ABC, abstractmethod
+from typing import Optional
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional, listeners fall back to JSON
+    msgpack = None
+
+
+class Codec(ABC):
+    """
+    Wire format of bridge messages.
+    """
+    name: str
+
+    @abstractmethod
+    def decode(self, message: bytes) -> dict:
+        pass
+
+    @abstractmethod
+    def encode(self, data: dict) -> bytes:
+        pass
+
+    @abstractmethod
+    def peek(self, message: bytes, key: str) -> Optional[str]:
+        """
+        Returns the first string value stored under the key anywhere in the message without decoding the message.
+        """
+        pass
+
+
+class JsonCodec(Codec):
+    name = "json"
+
+    def decode(self, message: bytes) -> dict:
+        return json.loads(message)
+
+    def encode(self, data: dict) -> bytes:
+        return json.dumps(data).encode()
+
+    def peek(self, message: bytes, key: str) -> Optional[str]:
+        match = re.search(rb'"' + re.escape(key.encode()) + rb'"\s*:\s*("(?:[^"\\]|\\.)*")', message)
+        return json.loads(match.group(1)) if match else None
+
+
+class MsgpackCodec(Codec):
+    name = "msgpack"
+
+    def __init__(self):
+        if msgpack is None:
+            raise RuntimeError("msgpack is not installed, binary bridge messages are not supported")
+
+    def decode(self, message: bytes) -> dict:
+        return msgpack.unpackb(message)
+
+    def encode(self, data: dict) -> bytes:
+        return msgpack.packb(data)
+
+    def peek(self, message: bytes, key: str) -> Optional[str]:
+        packed_key = msgpack.packb(key)
+        position = message.find(packed_key)
+        if position < 0:
+            return None
+        position += len(packed_key)
+        # the value has to be a str: fixstr, str 8 or str 16
+        header = message[position:position + 1]
+        if not header:
+            return None
+        elif 0xa0 <= header[0] <= 0xbf:
+            length, start = header[0] & 0x1f, position + 1
+        elif header[0] == 0xd9:
+            length, start = message[position + 1], position + 2
+        elif header[0] == 0xda:
+            length, start = int.from_bytes(message[position + 1:position + 3], 'big'), position + 3
+        else:
+            return None
+        return message[start:start + length].decode()
+
+
+JSON_CODEC = JsonCodec()
+MSGPACK_CODEC = MsgpackCodec() if msgpack is not None else None
+
+# a JSON envelope is an object, i.e. it starts with '{' (optionally preceded by whitespace)
+_JSON_PREFIXES = b'{ \t\r\n'
+
+
+def detect_codec(message: bytes) -> Codec:
+    """
+    Negotiate the codec of a request by its first byte. Responses are encoded with the codec of the request, so old
+    listeners sending JSON keep receiving JSON.
+    """
+    if message[:1] in _JSON_PREFIXES:
+        return JSON_CODEC
+    if MSGPACK_CODEC is None:
+        raise ValueError("Received a binary message, but msgpack is not installed")
+    return MSGPACK_CODEC
@@ -0,0 +1,126 @@
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError, wait
+from typing import List, Optional
+
+from .event_handler import EventHandler, AppStartMessage, JobStartMessage, JobEndMessage, AppEndMessage, \
+    ResponseMessage
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineEventHandler(EventHandler):
+    """
+    Wraps an event handler and answers JOB_END events within a deadline.
+
+    If the wrapped handler does not finish in time, the no-op recommendation is returned and the computation continues
+    in the background. Its recommendation is attached to the next JOB_START or JOB_END response of the application.
+
+    The JOB_END events of an application are handled one after another in the order they were received, even if
+    earlier ones are still computed in the background. A job end is only submitted to the workers once the previous one
+    of its application is finished, so queued job ends do not occupy workers needed by other applications.
+    APPLICATION_END waits for all of them.
+    """
+
+    def __init__(self, event_handler: EventHandler, deadline_ms: int, max_workers: int = 4):
+        self.event_handler = event_handler
+        self.deadline = deadline_ms / 1000
+        self.executor = ThreadPoolExecutor(max_workers, thread_name_prefix="deadline")
+        # app_event_id -> job end computations whose result has not been consumed yet, in the order of submission
+        self.pending: dict[str, List[Future]] = {}
+        self.lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        return self.event_handler.name
+
+    def handle_application_start(self, message: AppStartMessage) -> ResponseMessage:
+        return self.event_handler.handle_application_start(message)
+
+    def handle_job_start(self, message: JobStartMessage) -> ResponseMessage:
+        response = self.event_handler.handle_job_start(message)
+        late_response = self.pop_late_response(message.app_event_id)
+        if late_response is not None:
+            logger.info("Attaching late recommendation: %s", late_response.recommended_scale_out)
+            return late_response
+        return response
+
+    def handle_job_end(self, message: JobEndMessage) -> ResponseMessage:
+        future = Future()
+        with self.lock:
+            futures = self.pending.setdefault(message.app_event_id, [])
+            previous = futures[-1] if futures else None
+            futures.append(future)
+        if previous is None:
+            self.submit_job_end(future, message)
+        else:
+            previous.add_done_callback(lambda _: self.submit_job_end(future, message))
+        try:
+            response = future.result(timeout=self.deadline)
+            # earlier job ends of the application are finished as well, a fresh recommendation supersedes theirs
+            with self.lock:
+                finished = self.pending.pop(message.app_event_id, [])
+            for earlier in finished:
+                self.log_failure(earlier)
+            return response
+        except TimeoutError:
+            late_response = self.pop_late_response(message.app_event_id)
+            logger.warning("Job %s missed the deadline of %.0fms, computing in background",
+                           message.job_id, self.deadline * 1000)
+            if late_response is not None:
+                logger.info("Attaching late recommendation: %s", late_response.recommended_scale_out)
+                return late_response
+            return self.no_op_job_event_recommendation(message)
+
+    def submit_job_end(self, future: Future, message: JobEndMessage):
+        """
+        Handles the job end on a worker and completes the given future with its response.
+        """
+        def run():
+            try:
+                future.set_result(self.event_handler.handle_job_end(message))
+            except BaseException as e:
+                future.set_exception(e)
+
+        try:
+            self.executor.submit(run)
+        except RuntimeError as e:
+            # the executor is shut down, waiting for the job end must not hang
+            future.set_exception(e)
+
+    def handle_application_end(self, message: AppEndMessage) -> ResponseMessage:
+        with self.lock:
+            futures = self.pending.pop(message.app_event_id, [])
+        # the background computations still write the jobs' bookkeeping, so they have to finish before the app ends
+        wait(futures)
+        for future in futures:
+            self.log_failure(future)
+        return self.event_handler.handle_application_end(message)
+
+    def pop_late_response(self, app_event_id: str) -> Optional[ResponseMessage]:
+        """
+        Returns the latest recommendation computed in the background for the application, if one is finished by now.
+        """
+        finished = []
+        with self.lock:
+            futures = self.pending.get(app_event_id, [])
+            while futures and futures[0].done():
+                finished.append(futures.pop(0))
+            if not futures:
+                self.pending.pop(app_event_id, None)
+        late_response = None
+        for future in finished:
+            if not self.log_failure(future):
+                late_response = future.result()
+        return late_response
+
+    @staticmethod
+    def log_failure(future: Future) -> bool:
+        """
+        Logs the exception of a finished background computation and returns whether it failed.
+        """
+        exception = future.exception()
+        if exception is None:
+            return False
+        logger.error("Background computation failed", exc_info=exception)
+        return True
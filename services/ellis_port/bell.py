@@ -36,7 +36,7 @@ class Bell(UnivariatePredictor):
         ]
 
         scores = cv_score(models, splits)
-        best_idx = np.argmin(scores)
+        best_idx = np.argmin(np.mean(scores, axis=1))
         self.best_model = models[best_idx].fit(x, y)
         return self
 
@@ -0,0 +1,163 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError, ConnectionFailure, PyMongoError
+
+# queued write operation, its sequence number, the name of its collection and the operation itself
+WriteOperation = Tuple[int, str, InsertOne | UpdateOne]
+
+
+class WriteBehindError(Exception):
+    """
+    Raised by BulkWriter.flush if queued writes could not be written.
+    """
+
+
+class BulkWriter:
+    """
+    Write-behind layer for the bookkeeping of the EllisEventHandler. Writes are queued and flushed by a background
+    thread as bulk writes, so events are answered without waiting for MongoDB.
+
+    The queue is bounded: if MongoDB cannot keep up, enqueueing blocks until there is space again instead of buffering
+    an unlimited number of writes in memory. The operations of a collection are written in the order they were queued.
+    Writes queued within a `batch` block are queued together when it exits, so they are written with one bulk write
+    per collection.
+
+    Transient errors like a lost connection are retried. Writes that still fail are reported by the next flush.
+    """
+
+    def __init__(self, db, maxsize: int = 10000, batch_size: int = 1000, retries: int = 5, retry_delay: float = 0.1):
+        self.db = db
+        self.batch_size = batch_size
+        self.retries = retries
+        self.retry_delay = retry_delay
+        # each entry holds the operations of one write or of one batch
+        self.operations: queue.Queue[List[WriteOperation]] = queue.Queue(maxsize)
+        # sequence number of the last queued operation, guarded by enqueue_lock, so operations are queued in order
+        self.queued = 0
+        self.enqueue_lock = threading.Lock()
+        # operations of the batch of the current thread, None outside of a batch
+        self.local = threading.local()
+        # sequence number of the last written operation and the failed writes as (sequence number, error)
+        self.written = 0
+        self.failures: List[Tuple[int, str]] = []
+        self.written_condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, name='ellis-bulk-writer', daemon=True)
+        self.thread.start()
+
+    def insert(self, collection: str, document: dict):
+        self.enqueue(collection, InsertOne(document))
+
+    def update(self, collection: str, query: dict, update: dict):
+        self.enqueue(collection, UpdateOne(query, update))
+
+    def enqueue(self, collection: str, operation: InsertOne | UpdateOne):
+        batch = getattr(self.local, 'batch', None)
+        if batch is not None:
+            batch.append((collection, operation))
+        else:
+            self.put([(collection, operation)])
+
+    def put(self, operations: List[Tuple[str, InsertOne | UpdateOne]]):
+        if not operations:
+            return
+        with self.enqueue_lock:
+            sequenced = []
+            for collection, operation in operations:
+                self.queued += 1
+                sequenced.append((self.queued, collection, operation))
+            self.operations.put(sequenced)
+
+    @contextmanager
+    def batch(self):
+        """
+        Collects the writes of the current thread within the block and queues them at once when it exits, so the
+        background thread does not pick up only part of them. Nested blocks belong to the outermost one.
+        """
+        if getattr(self.local, 'batch', None) is not None:
+            yield
+            return
+        self.local.batch = []
+        try:
+            yield
+        finally:
+            batch, self.local.batch = self.local.batch, None
+            self.put(batch)
+
+    def flush(self):
+        """
+        Blocks until all writes queued before the call are written. Writes queued afterwards, e.g. by other
+        applications, are not waited for. Within a batch, the writes collected so far are queued first.
+
+        Raises:
+            WriteBehindError: If any of the writes could not be written.
+        """
+        batch = getattr(self.local, 'batch', None)
+        if batch:
+            self.local.batch = []
+            self.put(batch)
+        target = self.queued
+        with self.written_condition:
+            self.written_condition.wait_for(lambda: self.written >= target)
+            failures = [error for sequence, error in self.failures if sequence <= target]
+            self.failures = [(sequence, error) for sequence, error in self.failures if sequence > target]
+        if failures:
+            raise WriteBehindError(f"{len(failures)} write(s) failed: " + "; ".join(dict.fromkeys(failures)))
+
+    def run(self):
+        while True:
+            batch = list(self.operations.get())
+            while len(batch) < self.batch_size:
+                try:
+                    batch.extend(self.operations.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.write(batch)
+            except Exception as e:
+                for sequence, collection, _ in batch:
+                    self.fail(sequence, f"{collection}: {e}")
+            finally:
+                with self.written_condition:
+                    self.written = batch[-1][0]
+                    self.written_condition.notify_all()
+
+    def write(self, batch: List[WriteOperation]):
+        # the operations on a collection are written together in their order, the collections do not depend on each
+        # other
+        collections: Dict[str, List[Tuple[int, InsertOne | UpdateOne]]] = {}
+        for sequence, collection, operation in batch:
+            collections.setdefault(collection, []).append((sequence, operation))
+        for collection, operations in collections.items():
+            self.write_collection(collection, operations)
+
+    def write_collection(self, collection: str, operations: List[Tuple[int, InsertOne | UpdateOne]]):
+        attempt = 0
+        while operations:
+            try:
+                self.db[collection].bulk_write([operation for _, operation in operations], ordered=True)
+                return
+            except BulkWriteError as e:
+                # an ordered bulk write stops at the first failed operation, the following ones are retried
+                failed = e.details['writeErrors'][0]['index']
+                self.fail(operations[failed][0], f"{collection}: {e.details['writeErrors'][0].get('errmsg')}")
+                operations = operations[failed + 1:]
+            except PyMongoError as e:
+                transient = isinstance(e, ConnectionFailure) or e.has_error_label('RetryableWriteError')
+                if transient and attempt < self.retries:
+                    print(f"Retrying {len(operations)} operations on {collection} after: {e}")
+                    time.sleep(self.retry_delay * 2 ** attempt)
+                    attempt += 1
+                    continue
+                for sequence, _ in operations:
+                    self.fail(sequence, f"{collection}: {e}")
+                return
+
+    def fail(self, sequence: int, error: str):
+        print(f"Failed to write to {error}")
+        with self.written_condition:
+            self.failures.append((sequence, error))
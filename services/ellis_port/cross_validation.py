@@ -12,8 +12,8 @@ def cv_score(models, splits):
 
     for i, ((xtrain, ytrain), (xtest, ytest)) in enumerate(splits):
         for j, model in enumerate(models):
-            model.fit((xtrain, ytrain))
-            ypred = model.predict((xtest, ytest))
+            model.fit(xtrain, ytrain)
+            ypred = model.predict(xtest)
             scores[j, i] = loss_func(ypred, ytest)
 
     return scores
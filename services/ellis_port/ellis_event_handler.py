@@ -1,9 +1,15 @@
+import atexit
 import random
+from typing import Optional, List
+
+import numpy as np
+from bson.objectid import ObjectId
 from pymongo import MongoClient, ASCENDING
 
 from services.event_handler import EventHandler, AppStartMessage, JobStartMessage, JobEndMessage, ResponseMessage, \
-    AppEndMessage
-from .ellis_utils import EllisUtils
+    AppEndMessage, EventMessage
+from .bulk_writer import BulkWriter, WriteBehindError
+from .ellis_utils import EllisUtils, RuntimeTable
 from .config import Config
 
 
@@ -19,22 +25,32 @@ def connect_to_mongodb():
 
 
 class EllisEventHandler(EventHandler):
-    def __init__(self):
-        self.db = connect_to_mongodb()
+    def __init__(self, db=None):
+        self.db = db if db is not None else connect_to_mongodb()
         self.create_tables()
         self.ellis_utils = EllisUtils(self.db)
+        # persisted histories replace the MongoDB reads of the signatures seen before the restart
+        self.ellis_utils.runtime_history.warm_load()
         self.running_applications: dict[str, RunningApplication] = {}
+        # bookkeeping writes are not needed to answer events, they are written behind in bulk
+        self.writer = BulkWriter(self.db, Config.ELLIS_WRITE_QUEUE_SIZE)
+        atexit.register(self.writer.flush)
 
     def handle_application_start(self, message: AppStartMessage) -> ResponseMessage:
 
         app_event_id = self.insert_app_event(message)
         app_specs = message.app_specs
-        self.running_applications[app_event_id] = RunningApplication(app_event_id, message)
+        running_app = RunningApplication(app_event_id, message)
+        self.running_applications[app_event_id] = running_app
+        # reads the previous runs of the signature from MongoDB, unless they are already in memory
+        self.ellis_utils.runtime_history.get(message.app_name)
 
         if message.is_adaptive:
             initial_scaleout = self.ellis_utils.compute_initial_scale_out(
                 app_event_id, message.app_name, app_specs.min_executors, app_specs.max_executors, app_specs.target_runtime
             )
+            # the training data is fixed for the whole run, so all runtime predictions are computed upfront
+            running_app.runtime_table = self.compute_runtime_table(running_app)
             print(f"Dataset size: {message.app_specs.datasize_mb}")
             print(f"Recommending initial scale out: {initial_scaleout}")
             return ResponseMessage(
@@ -55,22 +71,32 @@ class EllisEventHandler(EventHandler):
         self.insert_job_event(message.app_event_id, message)
         return self.no_op_job_event_recommendation(message)
 
+    def handle_batch(self, messages: List[EventMessage]) -> List[ResponseMessage]:
+        # the bookkeeping writes of the batch are queued together, so they are written with one bulk write per
+        # collection
+        with self.writer.batch():
+            return super().handle_batch(messages)
+
     def handle_job_end(self, message: JobEndMessage) -> ResponseMessage:
 
         running_app = self.running_applications[message.app_event_id]
         self.update_job_event(message)
 
-        (scale_outs, _) = self.ellis_utils.get_non_adaptive_runs(running_app.app_event_id, running_app.app_signature)
-        if running_app.is_adaptive and scale_outs.size > 3:
-            recommended_scale_out = self.ellis_utils.update_scaleout(
-                message.app_event_id,
-                message.job_id,
-                message.app_time,
-                message.num_executors
-            )
+        if running_app.is_adaptive:
+            prediction = None
+            if running_app.runtime_table is not None:
+                prediction = running_app.runtime_table.remaining_runtimes(
+                    message.job_id, running_app.app_started_at, running_app.target_runtime
+                )
 
-            if recommended_scale_out == -1:
+            if prediction is None:
                 recommended_scale_out = message.num_executors
+            else:
+                recommended_scale_out = self.ellis_utils.select_scale_out(
+                    prediction,
+                    message.app_time,
+                    message.num_executors
+                )
 
             print(f"Recommending scale out: {recommended_scale_out}")
 
@@ -81,13 +107,33 @@ class EllisEventHandler(EventHandler):
         else:
             return self.no_op_job_event_recommendation(message)
 
+    def compute_runtime_table(self, running_app: "RunningApplication") -> Optional[RuntimeTable]:
+        """
+        Predicts the runtimes of all jobs of the application for all allowed scale-outs. Returns None if there are not
+        enough previous non-adaptive runs to recommend a scale-out.
+        """
+        (scale_outs, _) = self.ellis_utils.get_non_adaptive_runs(running_app.app_event_id, running_app.app_signature)
+        if scale_outs.size <= 3:
+            return None
+        return self.ellis_utils.compute_runtime_table(
+            running_app.app_event_id, running_app.app_signature, running_app.predicted_scale_outs
+        )
+
     def handle_application_end(self, message: AppEndMessage) -> ResponseMessage:
 
-        self.db[Config.ELLIS_APP_EVENT_COLLECTION].update_one(
-            {'_id': message.app_event_id},
+        self.writer.update(
+            Config.ELLIS_APP_EVENT_COLLECTION,
+            {'_id': ObjectId(message.app_event_id)},
             {'$set': {'finished_at': message.app_time}}
         )
-        self.running_applications.pop(message.app_event_id)
+        running_app = self.running_applications.pop(message.app_event_id)
+        # the run is complete in MongoDB before its end is acknowledged, failed writes raise a WriteBehindError
+        try:
+            self.writer.flush()
+        except WriteBehindError:
+            # the jobs of the run are already in the history, which is read from MongoDB again instead
+            self.ellis_utils.runtime_history.invalidate(running_app.app_signature)
+            raise
 
         return ResponseMessage(
             app_event_id=message.app_event_id,
@@ -95,39 +141,58 @@ class EllisEventHandler(EventHandler):
         )
 
     def insert_app_event(self, message: AppStartMessage):
-        result = self.db[Config.ELLIS_APP_EVENT_COLLECTION].insert_one({
+        # the id is generated here, so the write does not have to be awaited
+        app_event_id = ObjectId()
+        self.writer.insert(Config.ELLIS_APP_EVENT_COLLECTION, {
+            '_id': app_event_id,
             'app_id': message.app_name,
             'started_at': message.app_time,
             'target_runtime': message.app_specs.target_runtime,
             'min_executors': message.app_specs.min_executors,
             'max_executors': message.app_specs.max_executors,
         })
-        app_id = str(result.inserted_id)
-        return app_id
+        return str(app_event_id)
 
     def insert_job_event(self, app_event_id, message):
-        self.db[Config.ELLIS_JOB_EVENT_COLLECTION].insert_one({
-            'app_event_id': app_event_id,
+        running_app = self.running_applications[app_event_id]
+        running_app.job_started_at[message.job_id] = message.app_time
+        self.writer.insert(Config.ELLIS_JOB_EVENT_COLLECTION, self.to_job_event(running_app, message))
+
+    @staticmethod
+    def to_job_event(running_app: "RunningApplication", message):
+        # app_id and app_started_at are denormalized from the app event, so the history of an app signature can be
+        # read with a single indexed find
+        return {
+            'app_event_id': running_app.app_event_id,
+            'app_id': running_app.app_signature,
+            'app_started_at': running_app.app_started_at,
             'job_id': message.job_id,
             'started_at': message.app_time,
-        })
+        }
 
     def update_job_event(self, message):
 
-        job_event = self.db[Config.ELLIS_JOB_EVENT_COLLECTION].find_one(
-            {'app_event_id': message.app_event_id, 'job_id': message.job_id}
-        )
+        running_app = self.running_applications[message.app_event_id]
         finished_at = message.app_time
-        duration = finished_at - job_event['started_at']
+        duration = finished_at - running_app.job_started_at.pop(message.job_id)
 
-        self.db[Config.ELLIS_JOB_EVENT_COLLECTION].update_one(
-            {'app_event_id': job_event['app_event_id'], 'job_id': job_event['job_id']},
+        self.writer.update(
+            Config.ELLIS_JOB_EVENT_COLLECTION,
+            {'app_event_id': message.app_event_id, 'job_id': message.job_id},
             {'$set': {
                 'finished_at': finished_at,
                 'duration_ms': duration,
                 'scale_out': message.num_executors,
             }}
         )
+        self.ellis_utils.runtime_history.add(
+            running_app.app_signature,
+            message.app_event_id,
+            message.job_id,
+            message.num_executors,
+            duration,
+            running_app.app_started_at
+        )
 
     def create_tables(self):
         self.db[Config.ELLIS_APP_EVENT_COLLECTION].create_index(
@@ -138,10 +203,22 @@ class EllisEventHandler(EventHandler):
             [('app_event_id', ASCENDING), ('job_id', ASCENDING)],
             unique=True
         )
+        self.db[Config.ELLIS_JOB_EVENT_COLLECTION].create_index(
+            [('app_id', ASCENDING), ('job_id', ASCENDING)]
+        )
 
 class RunningApplication:
     def __init__(self, app_event_id: str, app_start_message: AppStartMessage):
         self.application_id = app_start_message.application_id
         self.app_event_id = app_event_id
         self.app_signature = app_start_message.app_name
+        self.app_started_at = app_start_message.app_time
+        self.target_runtime = app_start_message.app_specs.target_runtime
+        self.predicted_scale_outs = np.arange(
+            app_start_message.app_specs.min_executors, app_start_message.app_specs.max_executors + 1
+        )
         self.is_adaptive = app_start_message.is_adaptive
+        # job id -> start time of the running jobs
+        self.job_started_at: dict[int, int] = {}
+        # predicted runtimes per job and scale-out, computed at application start of adaptive runs
+        self.runtime_table: Optional[RuntimeTable] = None
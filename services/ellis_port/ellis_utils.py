@@ -1,11 +1,13 @@
 import numpy as np
-from typing import Tuple
-from collections import defaultdict
+from typing import Tuple, Optional
 from bson.objectid import ObjectId
 
 from .config import Config
 from .ernest import Ernest
 from .bell import Bell
+from .runtime_history import RuntimeHistoryCache
+from .fit_cache import FitCache
+from .slack_policy import SlackPolicy, SlackPolicyGrid
 
 relative_slack_up = 1.05
 absolute_slack_up = 0
@@ -14,7 +16,11 @@ absolute_slack_down = 0
 
 
 def compute_predictions(
-        scale_outs: np.ndarray, runtimes: np.ndarray, predicted_scale_outs: np.ndarray
+        scale_outs: np.ndarray,
+        runtimes: np.ndarray,
+        predicted_scale_outs: np.ndarray,
+        fit_cache: Optional[FitCache] = None,
+        ernest: Optional[Ernest] = None
 ) -> np.ndarray:
     """
     Computes predicted runtimes using interpolation and extrapolation models.
@@ -23,6 +29,8 @@ def compute_predictions(
         scale_outs (np.ndarray): Array of observed scale-outs.
         runtimes (np.ndarray): Array of observed runtimes corresponding to the scale-outs.
         predicted_scale_outs (np.ndarray): Array of scale-outs to predict runtimes for.
+        fit_cache (Optional[FitCache]): Cache of fitted models to reuse, models are fitted from scratch if None.
+        ernest (Optional[Ernest]): Ernest model already fitted to the observations, e.g. by Ernest.fit_many.
 
     Returns:
         np.ndarray: Array of predicted runtimes.
@@ -39,9 +47,14 @@ def compute_predictions(
     # Initialize predictions
     y_predict = np.zeros_like(x_predict)
 
+    def fit(model_class):
+        if fit_cache is None:
+            return model_class().fit(x, y)
+        return fit_cache.fit(model_class, x, y)
+
     # Fit the Ernest model
-    ernest = Ernest()
-    ernest.fit(x, y)
+    if ernest is None:
+        ernest = fit(Ernest)
 
     unique_scale_outs = np.unique(x).size
 
@@ -54,8 +67,7 @@ def compute_predictions(
     else:
         # Use the Bell model for interpolation and Ernest for extrapolation
         try:
-            bell = Bell()
-            bell.fit(x, y)
+            bell = fit(Bell)
             y_predict[interpolation_mask] = bell.predict(x_predict_interpolation)
             y_predict[~interpolation_mask] = ernest.predict(x_predict_extrapolation)
         except Exception as e:
@@ -65,6 +77,72 @@ def compute_predictions(
     return y_predict.astype(int)
 
 
+class RemainingRuntimePrediction:
+    """
+    Predicted runtimes of the remaining jobs of an application for all allowed scale-outs.
+    """
+
+    def __init__(
+            self,
+            app_start_time: int,
+            target_runtime: int,
+            predicted_scale_outs: np.ndarray,
+            next_job_runtimes: np.ndarray,
+            future_jobs_runtimes: np.ndarray
+    ):
+        self.app_start_time = app_start_time
+        self.target_runtime = target_runtime
+        self.predicted_scale_outs = predicted_scale_outs
+        self.next_job_runtimes = next_job_runtimes
+        self.future_jobs_runtimes = future_jobs_runtimes
+
+
+class RuntimeTable:
+    """
+    Predicted runtimes of all jobs of an application (rows, ordered by job id) for all allowed scale-outs (columns).
+
+    The training data of an application does not change while it runs, so the table is computed once at application
+    start. The runtimes of the remaining jobs after a job end are then looked up from suffix sums over the rows.
+    """
+
+    def __init__(self, job_ids: np.ndarray, predicted_scale_outs: np.ndarray, runtimes: np.ndarray):
+        self.job_ids = job_ids
+        self.predicted_scale_outs = predicted_scale_outs
+        self.runtimes = runtimes
+        # suffix_sums[i] is the predicted runtime of jobs i, i + 1, ... per scale-out, the last row is zero
+        self.suffix_sums = np.zeros((len(job_ids) + 1, len(predicted_scale_outs)), dtype=runtimes.dtype)
+        self.suffix_sums[:-1] = np.cumsum(runtimes[::-1], axis=0)[::-1]
+
+    def total_runtimes(self) -> np.ndarray:
+        return self.suffix_sums[0]
+
+    def remaining_runtimes(
+            self, job_id: int, app_start_time: int, target_runtime: int
+    ) -> Optional[RemainingRuntimePrediction]:
+        """
+        Looks up the predicted runtimes of the jobs following the given job.
+
+        Args:
+            job_id (int): The job after which the scale-out is updated.
+            app_start_time (int): The start time of the application.
+            target_runtime (int): The target runtime of the application.
+
+        Returns:
+            Optional[RemainingRuntimePrediction]: The prediction, or None if fewer than two jobs follow.
+        """
+        next_job_index = np.searchsorted(self.job_ids, job_id, side='right')
+        if len(self.job_ids) - next_job_index <= 1:
+            return None
+
+        return RemainingRuntimePrediction(
+            app_start_time=app_start_time,
+            target_runtime=target_runtime,
+            predicted_scale_outs=self.predicted_scale_outs,
+            next_job_runtimes=self.runtimes[next_job_index],
+            future_jobs_runtimes=self.suffix_sums[next_job_index + 1],
+        )
+
+
 class EllisUtils:
     def __init__(self, db):
         """
@@ -74,6 +152,9 @@ class EllisUtils:
             db: The MongoDB database object.
         """
         self.db = db
+        self.runtime_history = RuntimeHistoryCache(db, Config.ELLIS_HISTORY_DIR)
+        # fitted models shared by all predictions, the training data of a job is the same for a whole run
+        self.fit_cache = FitCache(Config.ELLIS_FIT_CACHE_SIZE)
 
     def compute_initial_scale_out(
             self,
@@ -137,72 +218,7 @@ class EllisUtils:
         Returns:
             Tuple[np.ndarray, np.ndarray]: Arrays of scale-outs and runtimes.
         """
-        app_event_collection = self.db[Config.ELLIS_APP_EVENT_COLLECTION]
-
-        pipeline = [
-            {
-                '$match': {
-                    'app_id': app_signature,
-                    '_id': {'$lt': ObjectId(app_event_id)}
-                }
-            },
-            {
-                '$lookup': {
-                    'from': Config.ELLIS_JOB_EVENT_COLLECTION,
-                    'let': {'appId': '$_id'},
-                    'pipeline': [
-                        {
-                            '$match': {
-                                '$expr': {
-                                    '$eq': [
-                                        '$app_event_id',
-                                        {'$toString': '$$appId'}
-                                    ]
-                                }
-                            }
-                        }
-                    ],
-                    'as': 'job_events'
-                }
-            },
-            {
-                '$unwind': '$job_events'
-            },
-            {
-                '$project': {
-                    'started_at': 1,
-                    'scale_out': '$job_events.scale_out',
-                    'duration_ms': '$job_events.duration_ms'
-                }
-            }
-        ]
-
-        result = list(app_event_collection.aggregate(pipeline))
-
-        # Group by 'started_at'
-        grouped = defaultdict(list)
-        for doc in result:
-            started_at = doc['started_at']
-            scale_out = doc['scale_out']
-            duration_ms = doc['duration_ms']
-            grouped[started_at].append((scale_out, duration_ms))
-
-        scale_outs_list = []
-        runtimes_list = []
-
-        for job_stages in grouped.values():
-            scale_outs = [scale_out for scale_out, _ in job_stages]
-            scale_out = scale_outs[0]
-            non_adaptive = all(s == scale_out for s in scale_outs)
-            if non_adaptive:
-                runtime = sum(duration_ms for _, duration_ms in job_stages)
-                scale_outs_list.append(scale_out)
-                runtimes_list.append(runtime)
-
-        scale_outs = np.array(scale_outs_list)
-        runtimes = np.array(runtimes_list)
-
-        return scale_outs, runtimes
+        return self.runtime_history.get(app_signature).non_adaptive_runs(app_event_id)
 
     def compute_predictions_from_stage_runtimes(
             self, app_event_id: str, app_signature: str, predicted_scale_outs: np.ndarray
@@ -218,129 +234,88 @@ class EllisUtils:
         Returns:
             np.ndarray: Array of predicted runtimes corresponding to the predicted scale-outs.
         """
-        job_runtime_data = self.gather_job_runtime_data(app_event_id, app_signature)
+        return self.compute_runtime_table(app_event_id, app_signature, predicted_scale_outs).total_runtimes()
+
+    def compute_runtime_table(
+            self, app_event_id: str, app_signature: str, predicted_scale_outs: np.ndarray
+    ) -> RuntimeTable:
+        """
+        Predicts the runtime of every job for a range of scale-outs based on historical data.
 
-        predicted_runtimes_list = []
+        Args:
+            app_event_id (str): The current application event ID.
+            app_signature (str): The application signature.
+            predicted_scale_outs (np.ndarray): Array of scale-outs to predict runtimes for.
+
+        Returns:
+            RuntimeTable: The predicted runtimes per job and scale-out.
+        """
+        history = self.runtime_history.get(app_signature)
+        job_runtime_data, job_ernests = history.job_runtime_models(app_event_id)
+
+        job_ids = np.array(sorted(job_runtime_data.keys()), dtype=int)
+        xs = [np.array([t[0] for t in job_runtime_data[job_id]]) for job_id in job_ids]
+        ys = [np.array([t[1] for t in job_runtime_data[job_id]]) for job_id in job_ids]
+        if job_ernests is None:
+            # the Ernest models of all jobs are fitted together
+            ernests = Ernest.fit_many(xs, ys)
+        else:
+            # the history keeps the Ernest models up to date as jobs finish, they are not refitted
+            ernests = [job_ernests[job_id] for job_id in job_ids]
 
-        for job_id in sorted(job_runtime_data.keys()):
-            x_y_tuples = job_runtime_data[job_id]
-            x = np.array([t[0] for t in x_y_tuples])
-            y = np.array([t[1] for t in x_y_tuples])
-            predicted_runtimes = compute_predictions(x, y, predicted_scale_outs)
-            predicted_runtimes_list.append(predicted_runtimes)
+        runtimes = np.zeros((len(job_ids), len(predicted_scale_outs)), dtype=int)
+        for i in range(len(job_ids)):
+            runtimes[i] = compute_predictions(xs[i], ys[i], predicted_scale_outs, self.fit_cache, ernests[i])
 
-        # Sum up the predicted runtimes across all jobs
-        total_predicted_runtimes = np.sum(predicted_runtimes_list, axis=0)
-        return total_predicted_runtimes
+        return RuntimeTable(job_ids, predicted_scale_outs, runtimes)
 
     def update_scaleout(self, app_event_id: str, job_id: int, job_end_time: int, current_scale_out: int) -> int:
-
-        app_event = self.db[Config.ELLIS_APP_EVENT_COLLECTION].find_one({'_id': ObjectId(app_event_id)})
-        app_signature = app_event['app_id']
-        app_start_time = app_event['started_at']
-        target_runtime = app_event['target_runtime']
-        min_executors = app_event['min_executors']
-        max_executors = app_event['max_executors']
-
-        job_runtime_data = self.gather_job_runtime_data(app_event_id, app_signature)
-        predicted_scale_outs = np.arange(min_executors, max_executors + 1)
-
-        remaining_runtimes = []
-        future_job_ids = sorted(k for k in job_runtime_data.keys() if k > job_id)
-        for future_job_id in future_job_ids:
-            x_y_tuples = job_runtime_data[future_job_id]
-            x = np.array([t[0] for t in x_y_tuples])
-            y = np.array([t[1] for t in x_y_tuples])
-            predicted_runtimes = compute_predictions(x, y, predicted_scale_outs)
-            remaining_runtimes.append(predicted_runtimes)
-
-        if len(remaining_runtimes) <= 1:
+        prediction = self.predict_remaining_runtimes(app_event_id, job_id)
+        if prediction is None:
             return -1
+        return self.select_scale_out(prediction, job_end_time, current_scale_out)
 
-        next_job_runtimes = remaining_runtimes[0]
-        future_jobs_runtimes = np.sum(remaining_runtimes[1:], axis=0)
+    def predict_remaining_runtimes(self, app_event_id: str, job_id: int) -> Optional["RemainingRuntimePrediction"]:
+        """
+        Predicts the runtimes of the jobs following the given job for all allowed scale-outs. Running applications
+        look the prediction up from the RuntimeTable computed at application start instead.
 
-        current_runtime = job_end_time - app_start_time
-        next_job_runtime = next_job_runtimes[current_scale_out - min_executors]
-        remaining_target_runtime = target_runtime - current_runtime - next_job_runtime
-        remaining_runtime_prediction = future_jobs_runtimes[current_scale_out - min_executors]
+        Args:
+            app_event_id (str): The current application event ID.
+            job_id (int): The job after which the scale-out is updated.
 
-        print(f"Current runtime: {current_runtime}")
-        print(f"Next job runtime: {next_job_runtime}")
-        print(f"Remaining target runtime: {remaining_target_runtime}")
-        print(f"Remaining runtime prediction: {remaining_runtime_prediction}")
+        Returns:
+            Optional[RemainingRuntimePrediction]: The prediction, or None if fewer than two jobs follow.
+        """
+        app_event = self.db[Config.ELLIS_APP_EVENT_COLLECTION].find_one({'_id': ObjectId(app_event_id)})
+        predicted_scale_outs = np.arange(app_event['min_executors'], app_event['max_executors'] + 1)
+        runtime_table = self.compute_runtime_table(app_event_id, app_event['app_id'], predicted_scale_outs)
+        return runtime_table.remaining_runtimes(job_id, app_event['started_at'], app_event['target_runtime'])
+
+    @staticmethod
+    def select_scale_out(
+            prediction: "RemainingRuntimePrediction",
+            job_end_time: int,
+            current_scale_out: int,
+            policy: Optional[SlackPolicy] = None
+    ) -> int:
+        """
+        Selects the scale-out for the remaining jobs given the predicted runtimes and the end time of the current job.
 
-        if remaining_runtime_prediction > remaining_target_runtime * relative_slack_up + absolute_slack_up:
-            candidate_scale_outs = np.where(future_jobs_runtimes < remaining_target_runtime * 0.9)[0]
-            if len(candidate_scale_outs) > 0:
-                next_scale_out_index = candidate_scale_outs[0]
-            else:
-                next_scale_out_index = np.argmin(future_jobs_runtimes)
-            next_scale_out = predicted_scale_outs[next_scale_out_index]
-            if next_scale_out != current_scale_out:
-                return int(next_scale_out)
-
-        elif remaining_runtime_prediction < remaining_target_runtime * relative_slack_down - absolute_slack_down:
-            candidate_scale_outs = np.where(future_jobs_runtimes < remaining_target_runtime * 0.9)[0]
-            if len(candidate_scale_outs) > 0:
-                next_scale_out_index = candidate_scale_outs[0]
-            else:
-                next_scale_out_index = np.argmin(future_jobs_runtimes)
-            next_scale_out = predicted_scale_outs[next_scale_out_index]
-            if next_scale_out < current_scale_out:
-                return int(next_scale_out)
+        Args:
+            prediction (RemainingRuntimePrediction): Predicted runtimes of the remaining jobs.
+            job_end_time (int): The end time of the current job.
+            current_scale_out (int): The current scale-out.
+            policy (Optional[SlackPolicy]): The slack policy, the module defaults if None.
 
-        return current_scale_out
+        Returns:
+            int: The recommended scale-out.
+        """
+        if policy is None:
+            policy = SlackPolicy(relative_slack_up, absolute_slack_up, relative_slack_down, absolute_slack_down)
+        scale_outs, slacks = SlackPolicyGrid.of(policy).evaluate(prediction, job_end_time, current_scale_out)
+        print(f"Predicted slack of the remaining jobs: {slacks[0]}")
+        return int(scale_outs[0])
 
     def gather_job_runtime_data(self, app_event_id, app_signature):
-        app_event_collection = self.db[Config.ELLIS_APP_EVENT_COLLECTION]
-        pipeline = [
-            {
-                '$match': {
-                    'app_id': app_signature,
-                    '_id': {'$lt': ObjectId(app_event_id)}
-                }
-            },
-            {
-                '$lookup': {
-                    'from': Config.ELLIS_JOB_EVENT_COLLECTION,
-                    'let': {'appId': '$_id'},
-                    'pipeline': [
-                        {
-                            '$match': {
-                                '$expr': {
-                                    '$eq': [
-                                        '$app_event_id',
-                                        {'$toString': '$$appId'}
-                                    ]
-                                }
-                            }
-                        }
-                    ],
-                    'as': 'job_events'
-                }
-            },
-            {
-                '$unwind': '$job_events'
-            },
-            {
-                '$project': {
-                    'job_id': '$job_events.job_id',
-                    'scale_out': '$job_events.scale_out',
-                    'duration_ms': '$job_events.duration_ms'
-                }
-            },
-            {
-                '$sort': {'job_id': 1}
-            }
-        ]
-        result = list(app_event_collection.aggregate(pipeline))
-
-        # Group by 'job_id'
-        job_runtime_data = defaultdict(list)
-        for doc in result:
-            job_id = doc['job_id']
-            scale_out = doc['scale_out']
-            duration_ms = doc['duration_ms']
-            job_runtime_data[job_id].append((scale_out, duration_ms))
-        return job_runtime_data
+        return self.runtime_history.get(app_signature).job_runtime_data(app_event_id)
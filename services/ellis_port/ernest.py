@@ -1,7 +1,10 @@
+from typing import List
+
 import numpy as np
-from scipy.optimize import nnls, lsq_linear
+from scipy.optimize import lsq_linear
 
 from services.ellis_port.univariate_predictor import UnivariatePredictor
+from services.ellis_port.nnls import nnls_gram, nnls_gram_batched
 
 
 class Ernest(UnivariatePredictor):
@@ -30,9 +33,8 @@ class Ernest(UnivariatePredictor):
         x, y = x.flatten(), y.flatten()
         X = self._fmap(x)
         try:
-            coeff, res = nnls(X, y, maxiter=10000)
-            self.coeff = coeff
-        except (RuntimeError, ValueError) as e:
+            self.coeff = nnls_gram(X.T @ X, X.T @ y)
+        except (RuntimeError, ValueError, np.linalg.LinAlgError) as e:
             print(f"nnls failed... x: {X}, y: {y}, Exception: {e}")
             result = lsq_linear(X, y, bounds=(0, np.inf))
             self.coeff = result.x
@@ -51,3 +53,107 @@ class Ernest(UnivariatePredictor):
         x = x.flatten()
         X = self._fmap(x)
         return np.dot(X, self.coeff)
+
+    @classmethod
+    def fit_many(cls, xs: List[np.ndarray], ys: List[np.ndarray]) -> List['Ernest']:
+        """
+        Fits one model per data set by solving all non-negative least squares problems together. The data sets are
+        reduced to their 4x4 normal equations, which are solved as one batch.
+
+        Parameters:
+        xs (List[np.ndarray]): Input feature arrays.
+        ys (List[np.ndarray]): Target arrays.
+
+        Returns:
+        List[Ernest]: The fitted models.
+        """
+        if len(xs) == 0:
+            return []
+        features = [cls._fmap(np.asarray(x, dtype=float).flatten()) for x in xs]
+        grams = np.stack([X.T @ X for X in features])
+        moments = np.stack([X.T @ np.asarray(y, dtype=float).flatten() for X, y in zip(features, ys)])
+
+        models = []
+        for coeff in nnls_gram_batched(grams, moments):
+            model = cls()
+            model.coeff = coeff
+            models.append(model)
+        return models
+
+    @classmethod
+    def predict_many(cls, models: List['Ernest'], x: np.ndarray) -> np.ndarray:
+        """
+        Predicts the target values of the same inputs with each of the models.
+
+        Parameters:
+        models (List[Ernest]): Fitted models.
+        x (np.ndarray): Input feature array.
+
+        Returns:
+        np.ndarray: Predicted values of shape (models, inputs).
+        """
+        X = cls._fmap(np.asarray(x, dtype=float).flatten())
+        coeffs = np.array([model.coeff for model in models]).reshape(len(models), X.shape[1])
+        return coeffs @ X.T
+
+
+class IncrementalErnest(Ernest):
+    """
+    Ernest model that is updated with new observations instead of being refitted from scratch.
+
+    Only the normal equations of the features, i.e. X^T X and X^T y, are kept. Adding an observation updates them in
+    constant time, and the non-negative least squares problem is warm-started from the previous coefficients.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        n = self._fmap(np.ones(1)).shape[1]
+        self.gram = np.zeros((n, n))
+        self.moment = np.zeros(n)
+        self.coeff = np.zeros(n)
+
+    def _fit(self, x: np.ndarray, y: np.ndarray):
+        """
+        Fit the model to the data, discarding all previous observations.
+
+        Parameters:
+        x (np.ndarray): The input feature array.
+        y (np.ndarray): The target array.
+
+        Returns:
+        self: The fitted model with updated coefficients.
+        """
+        self.reset()
+        return self.update(x, y)
+
+    def update(self, x: np.ndarray, y: np.ndarray):
+        """
+        Add observations to the model.
+
+        Parameters:
+        x (np.ndarray): The input feature array of the new observations.
+        y (np.ndarray): The target array of the new observations.
+
+        Returns:
+        self: The model with updated coefficients.
+        """
+        x, y = np.atleast_1d(x).flatten().astype(float), np.atleast_1d(y).flatten().astype(float)
+        X = self._fmap(x)
+        self.gram += X.T @ X
+        self.moment += X.T @ y
+        try:
+            self.coeff = nnls_gram(self.gram, self.moment, self.coeff)
+        except (RuntimeError, ValueError, np.linalg.LinAlgError) as e:
+            print(f"Warm-started nnls failed, solving from scratch: {e}")
+            self.coeff = nnls_gram_batched(self.gram[None], self.moment[None])[0]
+        return self
+
+    def snapshot(self) -> Ernest:
+        """
+        Returns an Ernest model with the current coefficients, which is not changed by later updates.
+        """
+        model = Ernest()
+        model.coeff = self.coeff.copy()
+        return model
@@ -0,0 +1,83 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Type, Tuple, Union
+
+import numpy as np
+
+from .univariate_predictor import UnivariatePredictor
+
+
+class FitCache:
+    """
+    LRU cache of fitted univariate predictors keyed by the model class and a fingerprint of the training data.
+
+    The training data of a job only changes when a run of its application signature finishes, so during an adaptive
+    run the models of each job are fitted once and reused on every following job end. Fitting is deterministic, so
+    a failed fit is cached as well and its exception is raised again on a hit.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self.models: OrderedDict[Tuple[str, str], Union[UnivariatePredictor, Exception]] = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def fingerprint(x: np.ndarray, y: np.ndarray) -> str:
+        """
+        Hashes the training data, including shapes and dtypes so that equal bytes of different arrays do not collide.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        for array in (x, y):
+            array = np.ascontiguousarray(array)
+            digest.update(f"{array.dtype.str}{array.shape}".encode())
+            digest.update(array.tobytes())
+        return digest.hexdigest()
+
+    def fit(self, model_class: Type[UnivariatePredictor], x: np.ndarray, y: np.ndarray) -> UnivariatePredictor:
+        """
+        Returns a model of the given class fitted to (x, y), fitting it only if it is not cached. Fitted models are
+        shared, so they must not be refitted by the caller.
+
+        Parameters:
+        model_class (Type[UnivariatePredictor]): Class of the model, created without arguments.
+        x (np.ndarray): Input feature array.
+        y (np.ndarray): Target array.
+
+        Returns:
+        UnivariatePredictor: The fitted model.
+        """
+        key = (model_class.__name__, self.fingerprint(x, y))
+        with self.lock:
+            model = self.models.get(key)
+            if model is not None:
+                self.models.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if isinstance(model, Exception):
+            raise model
+        if model is not None:
+            return model
+
+        # fitting is not locked, concurrent misses of the same key fit the model twice and keep the last one
+        try:
+            model = model_class().fit(x, y)
+        except Exception as e:
+            self.put(key, e)
+            raise
+        self.put(key, model)
+        return model
+
+    def put(self, key: Tuple[str, str], model: Union[UnivariatePredictor, Exception]):
+        with self.lock:
+            self.models[key] = model
+            self.models.move_to_end(key)
+            while len(self.models) > self.maxsize:
+                self.models.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.models.clear()
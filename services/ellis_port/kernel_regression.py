@@ -1,9 +1,11 @@
 import numpy as np
 import scipy as sp
 
-from .cross_validation import cv_score
 from .univariate_predictor import UnivariatePredictor
-from .interpolation_splits import InterpolationSplits
+
+# candidate bandwidths of the cross validation if no bandwidth is given
+BANDWIDTHS = np.linspace(1, 100, 100)
+
 
 class KernelRegression(UnivariatePredictor):
     """
@@ -26,46 +28,110 @@ class KernelRegression(UnivariatePredictor):
         """
         return np.vstack([x ** i for i in range(self.degree + 1)]).T
 
-    def _predict_single(self, X, y, x, w):
+    def _solve(self, A, b):
         """
-        Predicts output using the kernel regression model.
+        Solves a stack of linear systems, using the pseudo-inverse for the singular ones.
 
         Parameters:
-        x (np.ndarray): Input feature array.
+        A (np.ndarray): Matrices of shape (n, d, d).
+        b (np.ndarray): Right-hand sides of shape (n, d).
 
         Returns:
-        np.ndarray: Predicted values.
+        np.ndarray: Solutions of shape (n, d).
         """
-        XTW = X.T * w
-        matrix_x = np.dot(XTW, X) + self.tol * np.eye(X.shape[1])
-        matrix_b = np.dot(XTW, y)
-
         try:
-            c = np.linalg.solve(matrix_x, matrix_b)
-        except:
-            print("Could not compute solution, so either matrix_x is singular or not square.")
-            print("Will try now with the pseudo-inverse of matrix_x...")
-            c = np.linalg.pinv(matrix_x).dot(matrix_b)
-            print("Success with pseudo-inverse of matrix_x!")
-
-        ypred = np.dot(x, c)
-        return ypred
-
-    def __predict(self, X, y, Xpred, W):
-        n, d = Xpred.shape
-        ypred = np.zeros(n)
-        for i in range(n):
-            ypred[i] = self._predict_single(X, y, Xpred[i], W[i])
-        return ypred
+            return np.linalg.solve(A, b[..., None])[..., 0]
+        except np.linalg.LinAlgError:
+            # at least one matrix is singular, solve the systems one by one to find them
+            c = np.empty_like(b)
+            for i in range(len(A)):
+                try:
+                    c[i] = np.linalg.solve(A[i], b[i])
+                except np.linalg.LinAlgError:
+                    print("Could not compute solution, so either matrix_x is singular or not square.")
+                    print("Will try now with the pseudo-inverse of matrix_x...")
+                    c[i] = np.linalg.pinv(A[i]).dot(b[i])
+                    print("Success with pseudo-inverse of matrix_x!")
+            return c
+
+    def _normal_equations(self, X, counts, y_sums, W):
+        """
+        Builds the weighted normal equations (X^T W_i X) c_i = X^T W_i y for every row W_i of the weights.
+
+        Training points with the same input share their kernel weight, so the equations are built from the distinct
+        inputs, their number of occurrences and the sum of their targets. Both sides are matrix products of the
+        weights with per-input terms, which run as one BLAS call each.
+
+        Parameters:
+        X (np.ndarray): Feature mapped distinct training inputs of shape (u, d).
+        counts (np.ndarray): Number of training points per distinct input of shape (u,).
+        y_sums (np.ndarray): Sum of the training targets per distinct input of shape (u,).
+        W (np.ndarray): Kernel weights of the distinct inputs of shape (..., u).
+
+        Returns:
+        Tuple[np.ndarray, np.ndarray]: Matrices of shape (..., d, d) and right-hand sides of shape (..., d).
+        """
+        u, d = X.shape
+        outer_products = (X[:, :, None] * X[:, None, :]).reshape(u, d * d) * counts[:, None]
+        matrix_x = (W @ outer_products).reshape(*W.shape[:-1], d, d) + self.tol * np.eye(d)
+        matrix_b = W @ (X * y_sums[:, None])
+        return matrix_x, matrix_b
+
+    @staticmethod
+    def _group(x, y):
+        """
+        Groups the training data by its distinct inputs.
+
+        Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: The distinct inputs, their counts and their sums of targets.
+        """
+        xu, inverse, counts = np.unique(x, return_inverse=True, return_counts=True)
+        return xu, counts, np.bincount(inverse, weights=y, minlength=xu.size)
+
+    def select_bandwidth(self, x, y, bandwidths):
+        """
+        Selects the bandwidth with the lowest mean relative error in a cross validation over the InterpolationSplits,
+        i.e. each inner scale-out is predicted from the runs of all other scale-outs. Equivalent to scoring a
+        KernelRegression per bandwidth with cv_score, but all bandwidths and folds are computed as one tensor operation.
+
+        Parameters:
+        x (np.ndarray): Input feature array.
+        y (np.ndarray): Target array.
+        bandwidths (np.ndarray): Candidate bandwidths.
+
+        Returns:
+        float: The selected bandwidth.
+        """
+        xu, counts, y_sums = self._group(x, y)
+        folds = xu[1:-1]
+        if folds.size == 0:
+            # without folds all scores are undefined and the first bandwidth is chosen
+            return bandwidths[0]
+
+        # kernel weights of shape (bandwidths, folds, distinct inputs), each fold is predicted from all other inputs
+        h = np.asarray(bandwidths, dtype=float)
+        D = (folds[:, None] - xu[None, :]) ** 2
+        train = folds[:, None] != xu[None, :]
+        W = np.exp(-D[None, :, :] / (2 * h[:, None, None] ** 2)) * train
+
+        matrix_x, matrix_b = self._normal_equations(self._fmap(xu), counts, y_sums, W)
+        n_bw, n_folds, d = matrix_b.shape
+        c = self._solve(matrix_x.reshape(-1, d, d), matrix_b.reshape(-1, d)).reshape(n_bw, n_folds, d)
+        ypred = np.einsum('fk,bfk->bf', self._fmap(folds), c)
+
+        # mean relative error of the test points per fold, then averaged over the folds
+        test = np.isin(x, folds)
+        y_test = y[test]
+        fold = np.searchsorted(folds, x[test])
+        errors = np.abs((ypred[:, fold] - y_test) / y_test)
+        in_fold = fold[:, None] == np.arange(n_folds)[None, :]
+        scores = (errors @ in_fold) / in_fold.sum(axis=0)
+        return bandwidths[np.argmin(scores.mean(axis=1))]
 
     def _fit(self, x, y):
         x, y = x.flatten(), y.flatten()
         if self.bw is None:
-            models = [KernelRegression(bw=bw) for bw in np.linspace(1, 100, 100)]
-            scores = cv_score(models, InterpolationSplits(x, y))
-            scores = np.mean(scores, axis=1)
-            idx = np.argmin(scores)
-            self._bw = models[idx].bw
+            self._bw = self.select_bandwidth(x, y, BANDWIDTHS)
         else:
             self._bw = self.bw
 
@@ -77,13 +143,13 @@ class KernelRegression(UnivariatePredictor):
         xs = xs.flatten()
 
         xs = np.atleast_1d(xs)
-        x, y, h = self.x, self.y, self._bw
+        xu, counts, y_sums = self._group(self.x, self.y)
+        h = self._bw
 
-        D = sp.spatial.distance.cdist(np.atleast_2d(xs).T, np.atleast_2d(x).T, metric='sqeuclidean')
+        D = sp.spatial.distance.cdist(np.atleast_2d(xs).T, np.atleast_2d(xu).T, metric='sqeuclidean')
         W = np.exp(-D / (2 * h ** 2))
 
-        X = self._fmap(x)
-        X0 = self._fmap(xs)
-
-        ypred = self.__predict(X, y, X0, W)
-        return ypred
+        # the weighted least squares problems of all query points are built and solved as one stack
+        matrix_x, matrix_b = self._normal_equations(self._fmap(xu), counts, y_sums, W)
+        c = self._solve(matrix_x, matrix_b)
+        return np.einsum('ik,ik->i', self._fmap(xs), c)
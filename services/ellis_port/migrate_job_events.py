@@ -0,0 +1,66 @@
+"""
+Migrates Ellis job events to the denormalized layout: every job event stores the app_id and app_started_at of its app
+event, so the runtime history of an app signature is read with a single find on the (app_id, job_id) index.
+
+    python3 -m services.ellis_port.migrate_job_events
+"""
+from typing import Optional
+
+from bson.objectid import ObjectId
+from pymongo import ASCENDING, UpdateMany
+
+from .config import Config
+from .runtime_history import RuntimeHistoryCache
+
+BATCH_SIZE = 1000
+
+
+def migrate(db, batch_size: int = BATCH_SIZE, runtime_history: Optional[RuntimeHistoryCache] = None) -> int:
+    """
+    Copies app_id and app_started_at from the app events into their job events that lack them. The migration is
+    idempotent, so it can be re-run if interrupted.
+
+    The histories of the migrated signatures were loaded without these job events, so they are invalidated.
+
+    Args:
+        db: The MongoDB database object.
+        batch_size (int): Number of app events updated per bulk write.
+        runtime_history (Optional[RuntimeHistoryCache]): Cache whose histories of the migrated signatures are
+            invalidated.
+
+    Returns:
+        int: The number of migrated job events.
+    """
+    job_event_collection = db[Config.ELLIS_JOB_EVENT_COLLECTION]
+    job_event_collection.create_index([('app_id', ASCENDING), ('job_id', ASCENDING)])
+
+    app_event_ids = job_event_collection.distinct('app_event_id', {'app_id': {'$exists': False}})
+    app_events = list(db[Config.ELLIS_APP_EVENT_COLLECTION].find(
+        {'_id': {'$in': [ObjectId(app_event_id) for app_event_id in app_event_ids]}},
+        {'app_id': 1, 'started_at': 1}
+    ))
+
+    migrated = 0
+    for start in range(0, len(app_events), batch_size):
+        result = job_event_collection.bulk_write([
+            UpdateMany(
+                {'app_event_id': str(app_event['_id']), 'app_id': {'$exists': False}},
+                {'$set': {'app_id': app_event['app_id'], 'app_started_at': app_event['started_at']}}
+            )
+            for app_event in app_events[start:start + batch_size]
+        ], ordered=False)
+        migrated += result.modified_count
+
+    if runtime_history is not None:
+        for app_signature in {app_event['app_id'] for app_event in app_events}:
+            runtime_history.invalidate(app_signature)
+    return migrated
+
+
+if __name__ == "__main__":
+    from .ellis_event_handler import connect_to_mongodb
+
+    database = connect_to_mongodb()
+    # the persisted histories of the service are dropped, it reads them from MongoDB again when it restarts
+    migrated = migrate(database, runtime_history=RuntimeHistoryCache(database, Config.ELLIS_HISTORY_DIR))
+    print(f"Migrated {migrated} job events")
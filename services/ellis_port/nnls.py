@@ -0,0 +1,95 @@
+from typing import Optional
+
+import numpy as np
+
+
+def nnls_gram(
+        gram: np.ndarray, moment: np.ndarray, coeff: Optional[np.ndarray] = None, maxiter: Optional[int] = None
+) -> np.ndarray:
+    """
+    Solves the non-negative least squares problem min ||Xc - y||^2 s.t. c >= 0 given only its normal equations, i.e.
+    the Gram matrix X^T X and the moment X^T y. Uses the active set method of Lawson and Hanson, which for the few
+    parameters of the runtime models takes a handful of tiny solves.
+
+    The active set can be warm-started from a previous solution, e.g. the coefficients before new observations were
+    added to the normal equations. Usually its passive set is still optimal and a single solve suffices.
+
+    Parameters:
+    gram (np.ndarray): The Gram matrix X^T X of shape (n, n).
+    moment (np.ndarray): The moment X^T y of shape (n,).
+    coeff (Optional[np.ndarray]): Non-negative coefficients to start from, zero if None.
+    maxiter (Optional[int]): Maximum number of iterations, 3 * n if None.
+
+    Returns:
+    np.ndarray: The non-negative coefficients.
+    """
+    n = moment.size
+    maxiter = 3 * n if maxiter is None else maxiter
+    eps = 10 * n * np.finfo(float).eps
+
+    c = np.zeros(n) if coeff is None else np.maximum(coeff, 0.0)
+    passive = c > 0
+
+    def solve_passive():
+        s = np.zeros(n)
+        if passive.any():
+            s[passive] = np.linalg.lstsq(gram[np.ix_(passive, passive)], moment[passive], rcond=None)[0]
+        return s
+
+    for _ in range(maxiter):
+        s = solve_passive()
+        # move back towards the feasible region until all passive coefficients are positive
+        while passive.any() and np.any(s[passive] <= 0):
+            blocking = np.flatnonzero(passive & (s <= 0))
+            ratios = c[blocking] / (c[blocking] - s[blocking])
+            c = c + ratios.min() * (s - c)
+            c[blocking[np.argmin(ratios)]] = 0.0
+            passive &= c > 0
+            c[~passive] = 0.0
+            s = solve_passive()
+        c = s
+
+        # the gradient of the active coefficients tells whether freeing one of them decreases the residual
+        gradient = moment - gram @ c
+        active = ~passive
+        tol = eps * (np.abs(moment).max() + np.abs(gram).max() * np.abs(c).max() + 1.0)
+        if not active.any() or np.max(gradient[active]) <= tol:
+            return c
+        passive[np.argmax(np.where(active, gradient, -np.inf))] = True
+
+    raise RuntimeError(f"nnls_gram did not converge within {maxiter} iterations")
+
+
+def nnls_gram_batched(grams: np.ndarray, moments: np.ndarray) -> np.ndarray:
+    """
+    Solves a batch of small non-negative least squares problems given by their normal equations at once.
+
+    The optimum of each problem is the unconstrained least squares solution on one of the 2^n subsets of its
+    coefficients. All subsets are solved for all problems as stacked linear systems, and the feasible solution with the
+    lowest residual is chosen per problem. This is exact and, for the four parameters of Ernest, cheaper than running
+    an active set method per problem in Python.
+
+    Parameters:
+    grams (np.ndarray): Gram matrices X^T X of shape (k, n, n).
+    moments (np.ndarray): Moments X^T y of shape (k, n).
+
+    Returns:
+    np.ndarray: The non-negative coefficients of shape (k, n).
+    """
+    k, n = moments.shape
+    best = np.zeros((k, n))
+    # the residual ||Xc - y||^2 up to the constant y^T y, which is 0 for c = 0
+    best_objective = np.zeros(k)
+    for subset in range(1, 2 ** n):
+        passive = np.array([(subset >> i) & 1 for i in range(n)], dtype=bool)
+        gram = grams[:, passive][:, :, passive]
+        moment = moments[:, passive]
+        c = np.zeros((k, n))
+        # the pseudo-inverse gives the least squares solution if a subset is rank deficient
+        c[:, passive] = np.einsum('kij,kj->ki', np.linalg.pinv(gram), moment)
+        objective = np.einsum('ki,kij,kj->k', c, grams, c) - 2 * np.einsum('ki,ki->k', c, moments)
+        feasible = np.all(c[:, passive] >= 0, axis=1)
+        better = feasible & (objective < best_objective)
+        best[better] = c[better]
+        best_objective[better] = objective[better]
+    return best
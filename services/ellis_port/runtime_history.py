@@ -0,0 +1,276 @@
+import glob
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote, unquote
+
+import numpy as np
+from bson.objectid import ObjectId
+
+from .config import Config
+from .ernest import Ernest, IncrementalErnest
+
+# a finished job, app event ids are stored as hex strings, which sort like the ObjectIds they encode
+RECORD_DTYPE = np.dtype([
+    ('app_event_id', 'S24'),
+    ('app_started_at', '<i8'),
+    ('job_id', '<i8'),
+    ('scale_out', '<i8'),
+    ('duration_ms', '<i8'),
+])
+RECORD_FILE_SUFFIX = '.records'
+
+
+class RuntimeHistory:
+    """
+    Runtimes of the finished jobs of all runs of one application signature, stored as a structured array.
+
+    Runs are identified by their app event id. As app event ids are ObjectIds, they are ordered by creation, which
+    allows to restrict queries to the runs prior to a given run.
+
+    If the history has a path, every added job is also appended to that file of raw records, from which the history
+    is warm-loaded after a restart.
+
+    The Ernest model of each job is kept up to date with the added jobs, so the models of a new run are not refitted
+    on the whole history.
+    """
+
+    def __init__(self, records: Optional[np.ndarray] = None, path: Optional[str] = None):
+        records = np.empty(0, dtype=RECORD_DTYPE) if records is None else records
+        self.size = len(records)
+        self.records = np.empty(max(2 * self.size, 64), dtype=RECORD_DTYPE)
+        self.records[:self.size] = records
+        self.path = path
+        # job id -> Ernest model of all records of the job, fitted when first needed
+        self.ernests: Optional[Dict[int, IncrementalErnest]] = None
+        self.lock = threading.Lock()
+
+    @classmethod
+    def read(cls, path: str) -> 'RuntimeHistory':
+        """
+        Loads a history from its record file. An incomplete record at the end, left by an interrupted append, is
+        ignored.
+        """
+        num_records = os.path.getsize(path) // RECORD_DTYPE.itemsize
+        if num_records == 0:
+            return cls(path=path)
+        records = np.memmap(path, dtype=RECORD_DTYPE, mode='r', shape=(num_records,))
+        return cls(np.array(records), path)
+
+    def write(self, path: str):
+        """
+        Replaces the record file at the given path with all records and appends all further records to it.
+        """
+        with self.lock:
+            temporary_path = f"{path}.tmp"
+            self.records[:self.size].tofile(temporary_path)
+            os.replace(temporary_path, path)
+            self.path = path
+
+    def add(self, app_event_id: str, job_id: int, scale_out: int, duration_ms: int, app_started_at: int = 0):
+        record = np.array(
+            [(app_event_id.encode(), app_started_at, job_id, scale_out, duration_ms)], dtype=RECORD_DTYPE
+        )
+        with self.lock:
+            if self.size == len(self.records):
+                self.records = np.resize(self.records, 2 * len(self.records))
+            self.records[self.size] = record[0]
+            self.size += 1
+            if self.ernests is not None:
+                self.ernests.setdefault(job_id, IncrementalErnest()).update(scale_out, duration_ms)
+            if self.path is not None:
+                with open(self.path, 'ab') as file:
+                    file.write(record.tobytes())
+
+    def previous_runs(self, app_event_id: str) -> np.ndarray:
+        """
+        Returns the records of the runs prior to the given run, ordered by run and by insertion within a run.
+        """
+        before = str(ObjectId(app_event_id)).encode()
+        with self.lock:
+            records = self.records[:self.size]
+            records = records[records['app_event_id'] < before]
+        return records[np.argsort(records['app_event_id'], kind='stable')]
+
+    def job_runtime_data(self, app_event_id: str) -> Dict[int, List[Tuple[int, int]]]:
+        """
+        Groups the (scale-out, duration) pairs of the runs prior to the given run by job id.
+        """
+        return self.group_by_job(self.previous_runs(app_event_id))
+
+    def job_runtime_models(
+            self, app_event_id: str
+    ) -> Tuple[Dict[int, List[Tuple[int, int]]], Optional[Dict[int, Ernest]]]:
+        """
+        Returns the job runtime data of the runs prior to the given run together with the Ernest model of each job
+        fitted to it. The models cover all records, so they are None if the history already holds jobs of the given or
+        a later run, e.g. for a run that has finished jobs.
+        """
+        before = str(ObjectId(app_event_id)).encode()
+        with self.lock:
+            records = self.records[:self.size]
+            previous = records['app_event_id'] < before
+            ernests = None
+            if previous.all():
+                if self.ernests is None:
+                    self.ernests = self.fit_ernests(records)
+                ernests = {job_id: model.snapshot() for job_id, model in self.ernests.items()}
+            records = records[previous]
+        records = records[np.argsort(records['app_event_id'], kind='stable')]
+        return self.group_by_job(records), ernests
+
+    @staticmethod
+    def fit_ernests(records: np.ndarray) -> Dict[int, IncrementalErnest]:
+        return {
+            job_id: IncrementalErnest().fit(np.array([t[0] for t in runtimes]), np.array([t[1] for t in runtimes]))
+            for job_id, runtimes in RuntimeHistory.group_by_job(records).items()
+        }
+
+    @staticmethod
+    def group_by_job(records: np.ndarray) -> Dict[int, List[Tuple[int, int]]]:
+        records = records[np.argsort(records['job_id'], kind='stable')]
+        job_ids, starts = np.unique(records['job_id'], return_index=True)
+        scale_outs = np.split(records['scale_out'], starts[1:])
+        durations = np.split(records['duration_ms'], starts[1:])
+        return {
+            int(job_id): list(zip(s.tolist(), d.tolist())) for job_id, s, d in zip(job_ids, scale_outs, durations)
+        }
+
+    def non_adaptive_runs(self, app_event_id: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the scale-outs and total runtimes of the runs prior to the given run that kept their scale-out.
+        """
+        records = self.previous_runs(app_event_id)
+        if len(records) == 0:
+            return np.array([]), np.array([])
+        _, starts = np.unique(records['app_event_id'], return_index=True)
+        min_scale_outs = np.minimum.reduceat(records['scale_out'], starts)
+        max_scale_outs = np.maximum.reduceat(records['scale_out'], starts)
+        runtimes = np.add.reduceat(records['duration_ms'], starts)
+        non_adaptive = min_scale_outs == max_scale_outs
+        return min_scale_outs[non_adaptive], runtimes[non_adaptive]
+
+
+class RuntimeHistoryCache:
+    """
+    Keeps the runtime history of each application signature in memory, so predictions do not have to re-aggregate
+    all previous runs from MongoDB on every job end. The history of a signature is loaded once and then kept up to date
+    with the jobs finished by this service.
+
+    If a directory is given, each history is persisted there as a file of records, written through on every finished
+    job. The files are warm-loaded when the service starts, so signatures seen before are not read from MongoDB again.
+    Jobs may have finished while the service was down or on another instance of it, so the number of records of a
+    warm-loaded history is compared with the number of job events in MongoDB when it is first needed. If they differ,
+    the history is read from MongoDB again.
+    """
+
+    def __init__(self, db, directory: Optional[str] = None):
+        self.db = db
+        self.directory = directory
+        self.histories: Dict[str, RuntimeHistory] = {}
+        # warm-loaded signatures that have not been compared with MongoDB yet
+        self.unsynced: set[str] = set()
+        self.lock = threading.Lock()
+
+    def path(self, app_signature: str) -> str:
+        return os.path.join(self.directory, quote(app_signature, safe='') + RECORD_FILE_SUFFIX)
+
+    def warm_load(self) -> int:
+        """
+        Loads the histories of all signatures persisted in the directory.
+
+        Returns:
+            int: The number of loaded histories.
+        """
+        if self.directory is None:
+            return 0
+        os.makedirs(self.directory, exist_ok=True)
+        histories = {
+            unquote(os.path.basename(path)[:-len(RECORD_FILE_SUFFIX)]): RuntimeHistory.read(path)
+            for path in glob.glob(os.path.join(self.directory, '*' + RECORD_FILE_SUFFIX))
+        }
+        with self.lock:
+            self.histories.update(histories)
+            self.unsynced.update(histories)
+        return len(histories)
+
+    def get(self, app_signature: str) -> RuntimeHistory:
+        with self.lock:
+            history = self.histories.get(app_signature)
+            unsynced = app_signature in self.unsynced
+            self.unsynced.discard(app_signature)
+        if history is not None and unsynced:
+            history = self.sync(app_signature, history)
+        if history is None:
+            history = self.load(app_signature)
+            with self.lock:
+                # another thread may have loaded the history in the meantime
+                if app_signature in self.histories:
+                    return self.histories[app_signature]
+                if self.directory is not None:
+                    history.write(self.path(app_signature))
+                self.histories[app_signature] = history
+        return history
+
+    def sync(self, app_signature: str, history: RuntimeHistory) -> RuntimeHistory:
+        """
+        Replaces a warm-loaded history by the one read from MongoDB if their numbers of jobs differ.
+        """
+        count = self.db[Config.ELLIS_JOB_EVENT_COLLECTION].count_documents(
+            {'app_id': app_signature, 'duration_ms': {'$exists': True}}
+        )
+        if count == history.size:
+            return history
+        print(f"History of {app_signature} has {history.size} of {count} jobs, reading it from MongoDB")
+        loaded = self.load(app_signature)
+        with self.lock:
+            # unless another thread replaced the history in the meantime
+            if self.histories.get(app_signature) is not history:
+                return self.histories.get(app_signature, loaded)
+            if self.directory is not None:
+                loaded.write(self.path(app_signature))
+            self.histories[app_signature] = loaded
+        return loaded
+
+    def load(self, app_signature: str) -> RuntimeHistory:
+        # served by the (app_id, job_id) index, job events written before it existed are migrated by
+        # services.ellis_port.migrate_job_events
+        job_events = self.db[Config.ELLIS_JOB_EVENT_COLLECTION].find(
+            {'app_id': app_signature, 'duration_ms': {'$exists': True}},
+            {'app_event_id': 1, 'app_started_at': 1, 'job_id': 1, 'scale_out': 1, 'duration_ms': 1}
+        ).sort('job_id', 1)
+
+        records = np.array([
+            (job_event['app_event_id'].encode(), job_event.get('app_started_at', 0), job_event['job_id'],
+             job_event['scale_out'], job_event['duration_ms'])
+            for job_event in job_events
+        ], dtype=RECORD_DTYPE)
+        return RuntimeHistory(records)
+
+    def add(
+            self,
+            app_signature: str,
+            app_event_id: str,
+            job_id: int,
+            scale_out: int,
+            duration_ms: int,
+            app_started_at: int = 0
+    ):
+        """
+        Adds a finished job to the history of its signature. If the history is not loaded, it will be read from
+        MongoDB including the job when it is needed.
+        """
+        with self.lock:
+            history = self.histories.get(app_signature)
+        if history is not None:
+            history.add(app_event_id, job_id, scale_out, duration_ms, app_started_at)
+
+    def invalidate(self, app_signature: str):
+        """
+        Drops the history of a signature and its file, so it is read from MongoDB again when it is needed.
+        """
+        with self.lock:
+            self.histories.pop(app_signature, None)
+            self.unsynced.discard(app_signature)
+            if self.directory is not None and os.path.exists(self.path(app_signature)):
+                os.remove(self.path(app_signature))
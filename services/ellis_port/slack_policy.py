@@ -0,0 +1,127 @@
+from functools import lru_cache
+from typing import List, NamedTuple, Tuple
+
+import numpy as np
+
+
+class SlackPolicy(NamedTuple):
+    """
+    Thresholds for rescaling an application after a job end.
+
+    The application is scaled up if the predicted runtime of the remaining jobs exceeds the remaining target runtime
+    times relative_slack_up plus absolute_slack_up, and scaled down if it is below the remaining target runtime times
+    relative_slack_down minus absolute_slack_down. In both cases the smallest scale-out whose prediction is below the
+    remaining target runtime times candidate_slack is chosen, or the fastest scale-out if there is none.
+    """
+    relative_slack_up: float = 1.05
+    absolute_slack_up: float = 0
+    relative_slack_down: float = 0.85
+    absolute_slack_down: float = 0
+    candidate_slack: float = 0.9
+
+
+class SlackPolicyGrid:
+    """
+    A set of slack policies stored column-wise, so all of them can be evaluated for a prediction at once with a few
+    array operations instead of a Python loop over the policies.
+    """
+
+    def __init__(self, policies: List[SlackPolicy]):
+        self.policies = policies
+        # one row per field of SlackPolicy, one column per policy
+        columns = np.array(policies, dtype=float).reshape(len(policies), len(SlackPolicy._fields)).T
+        (self.relative_slack_up, self.absolute_slack_up, self.relative_slack_down, self.absolute_slack_down,
+         self.candidate_slack) = columns
+
+    @staticmethod
+    @lru_cache(maxsize=16)
+    def of(policy: SlackPolicy) -> "SlackPolicyGrid":
+        """
+        Returns a shared grid of the single given policy, so it is not rebuilt on every job end.
+        """
+        return SlackPolicyGrid([policy])
+
+    @classmethod
+    def product(cls, **values: List[float]) -> "SlackPolicyGrid":
+        """
+        Creates a grid of all combinations of the given values, fields without values keep their default.
+
+        Example:
+            SlackPolicyGrid.product(relative_slack_up=[1.0, 1.05, 1.1], relative_slack_down=[0.8, 0.85, 0.9])
+        """
+        names = list(values)
+        combinations = np.array(np.meshgrid(*values.values(), indexing='ij')).reshape(len(names), -1).T
+        return cls([SlackPolicy(**dict(zip(names, combination))) for combination in combinations.tolist()])
+
+    def evaluate(
+            self,
+            prediction: "RemainingRuntimePrediction",
+            job_end_time: int,
+            current_scale_out: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Selects the scale-out for the remaining jobs under every policy of the grid.
+
+        Args:
+            prediction (RemainingRuntimePrediction): Predicted runtimes of the remaining jobs.
+            job_end_time (int): The end time of the current job.
+            current_scale_out (int): The current scale-out.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The selected scale-out per policy and its predicted slack, i.e. the
+            remaining target runtime minus the predicted runtime of the remaining jobs. Negative slack means the target
+            runtime is predicted to be missed.
+        """
+        predicted_scale_outs = prediction.predicted_scale_outs
+        future_jobs_runtimes = prediction.future_jobs_runtimes
+        min_scale_out = predicted_scale_outs[0]
+        current_index = current_scale_out - min_scale_out
+
+        current_runtime = job_end_time - prediction.app_start_time
+        remaining_target_runtime = float(
+            prediction.target_runtime - current_runtime - prediction.next_job_runtimes[current_index]
+        )
+        remaining_runtime_prediction = future_jobs_runtimes[current_index]
+
+        scale_up = remaining_runtime_prediction > remaining_target_runtime * self.relative_slack_up + self.absolute_slack_up
+        scale_down = remaining_runtime_prediction < (
+            remaining_target_runtime * self.relative_slack_down - self.absolute_slack_down
+        )
+        if (scale_up | scale_down).any():
+            # the candidate of a policy is the first scale-out predicted below its candidate slack, which is where the
+            # running minimum of the predictions drops below it, or the fastest scale-out if there is none
+            descending_minima = -np.minimum.accumulate(future_jobs_runtimes)
+            candidate_indices = np.searchsorted(
+                descending_minima, -remaining_target_runtime * self.candidate_slack, side='right'
+            ).clip(max=descending_minima.argmax())
+            candidate_scale_outs = predicted_scale_outs[candidate_indices]
+            # scaling up takes precedence, scaling down must not increase the scale-out
+            rescale = scale_up | (scale_down & (candidate_scale_outs < current_scale_out))
+            scale_outs = np.where(rescale, candidate_scale_outs, current_scale_out)
+        else:
+            scale_outs = np.full(len(self.policies), current_scale_out)
+
+        slacks = remaining_target_runtime - future_jobs_runtimes[scale_outs - min_scale_out]
+        return scale_outs, slacks
+
+    def best(
+            self,
+            prediction: "RemainingRuntimePrediction",
+            job_end_time: int,
+            current_scale_out: int
+    ) -> Tuple[SlackPolicy, int, int]:
+        """
+        Evaluates all policies and returns the policy selecting the smallest scale-out that is predicted to meet the
+        target runtime, or the one with the largest slack if none is.
+
+        Returns:
+            Tuple[SlackPolicy, int, int]: The policy, its scale-out and its predicted slack.
+        """
+        scale_outs, slacks = self.evaluate(prediction, job_end_time, current_scale_out)
+        feasible = slacks >= 0
+        if feasible.any():
+            # smallest feasible scale-out, ties are broken by the larger slack
+            index = int(np.lexsort((-slacks, np.where(feasible, scale_outs, scale_outs.max() + 1)))[0])
+        else:
+            index = int(np.argmax(slacks))
+        return self.policies[index], int(scale_outs[index]), int(slacks[index])
@@ -0,0 +1,41 @@
+import unittest
+
+import mongomock
+
+from services.ellis_port.config import Config
+from services.ellis_port.ellis_event_handler import EllisEventHandler
+from services.event_handler import AppStartMessage, JobStartMessage, JobEndMessage, AppEndMessage
+from services.test.test_event_handler import app_start_payload
+
+
+class EllisHandlerTestCase(unittest.TestCase):
+    """
+    Runs applications through an EllisEventHandler backed by an in-memory MongoDB.
+    """
+
+    def setUp(self):
+        self.db = mongomock.MongoClient(tz_aware=True)[Config.MONGODB_DATABASE]
+        self.handler = EllisEventHandler(db=self.db)
+        self.app_time = 0
+
+    def start_application(self, is_adaptive: bool = False) -> str:
+        self.app_time += 100000
+        app_start = AppStartMessage.create({**app_start_payload(), 'app_time': self.app_time, 'is_adaptive': is_adaptive})
+        return self.handler.handle_application_start(app_start).app_event_id
+
+    def run_jobs(self, app_event_id: str, scale_outs: list[int]):
+        for job_id, scale_out in enumerate(scale_outs):
+            job = {'app_event_id': app_event_id, 'job_id': job_id, 'num_executors': scale_out}
+            self.handler.handle_job_start(JobStartMessage.create({**job, 'app_time': self.app_time}))
+            self.app_time += 1000 * (job_id + 1)
+            self.handler.handle_job_end(JobEndMessage.create({
+                **job, 'app_time': self.app_time, 'rescaling_time_ratio': 0.0, 'stages': {}
+            }))
+        self.handler.handle_application_end(AppEndMessage.create({
+            'app_event_id': app_event_id, 'app_time': self.app_time, 'num_executors': scale_outs[-1]
+        }))
+
+    def run_application(self, scale_outs: list[int], is_adaptive: bool = False) -> str:
+        app_event_id = self.start_application(is_adaptive)
+        self.run_jobs(app_event_id, scale_outs)
+        return app_event_id
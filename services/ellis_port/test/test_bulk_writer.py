@@ -0,0 +1,193 @@
+import threading
+import time
+import unittest
+from unittest import mock
+
+import mongomock
+from bson.objectid import ObjectId
+from pymongo.errors import AutoReconnect
+
+from services.ellis_port.bulk_writer import BulkWriter, WriteBehindError
+from services.ellis_port.config import Config
+from services.ellis_port.test import EllisHandlerTestCase
+from services.event_handler import JobStartMessage, JobEndMessage, AppStartMessage
+from services.test.test_event_handler import app_start_payload
+
+
+class TestBulkWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.db = mongomock.MongoClient(tz_aware=True)[Config.MONGODB_DATABASE]
+        self.writer = BulkWriter(self.db, maxsize=4, batch_size=2)
+
+    def test_writes_keep_their_order(self):
+        for job_id in range(10):
+            self.writer.insert('jobs', {'job_id': job_id})
+            self.writer.update('jobs', {'job_id': job_id}, {'$set': {'duration_ms': 1000 * job_id}})
+            self.writer.insert('apps', {'job_id': job_id})
+        self.writer.flush()
+
+        self.assertEqual(list(range(0, 10000, 1000)), [job['duration_ms'] for job in self.db['jobs'].find()])
+        self.assertEqual(10, self.db['apps'].count_documents({}))
+
+    def test_failed_write_does_not_drop_following_writes(self):
+        _id = ObjectId()
+        self.writer.insert('apps', {'_id': _id})
+        self.writer.insert('apps', {'_id': _id})
+        self.writer.insert('apps', {'_id': ObjectId()})
+        with self.assertRaises(WriteBehindError):
+            self.writer.flush()
+
+        self.assertEqual(2, self.db['apps'].count_documents({}))
+        # the failure is only reported once
+        self.writer.flush()
+
+    def test_retries_transient_errors(self):
+        writer = BulkWriter(self.db, retry_delay=0)
+        bulk_write = mongomock.Collection.bulk_write
+        attempts = []
+
+        def fail_once(collection, *args, **kwargs):
+            attempts.append(collection.name)
+            if len(attempts) == 1:
+                raise AutoReconnect("connection lost")
+            return bulk_write(collection, *args, **kwargs)
+
+        with mock.patch.object(mongomock.Collection, 'bulk_write', autospec=True, side_effect=fail_once):
+            writer.insert('apps', {'_id': ObjectId()})
+            writer.flush()
+
+        self.assertEqual(['apps', 'apps'], attempts)
+        self.assertEqual(1, self.db['apps'].count_documents({}))
+
+    def test_batch_is_queued_at_once(self):
+        writer = BulkWriter(self.db)
+        batches = []
+        write = writer.write
+
+        def record_batch(batch):
+            batches.append([collection for _, collection, _ in batch])
+            write(batch)
+
+        with mock.patch.object(writer, 'write', side_effect=record_batch):
+            with writer.batch():
+                for job_id in range(3):
+                    writer.insert('jobs', {'job_id': job_id})
+                    # the background thread would pick up the writes so far while the batch is collected
+                    time.sleep(0.01)
+                    writer.insert('apps', {'job_id': job_id})
+                self.assertEqual(0, writer.queued)
+            writer.flush()
+
+        self.assertEqual([['jobs', 'apps'] * 3], batches)
+        self.assertEqual(3, self.db['jobs'].count_documents({}))
+
+    def test_flush_within_batch_writes_the_batch(self):
+        with self.writer.batch():
+            self.writer.insert('jobs', {'job_id': 0})
+            self.writer.flush()
+            self.assertEqual(1, self.db['jobs'].count_documents({}))
+            self.writer.insert('jobs', {'job_id': 1})
+        self.writer.flush()
+
+        self.assertEqual(2, self.db['jobs'].count_documents({}))
+
+    def test_flush_does_not_wait_for_later_writes(self):
+        writer = BulkWriter(self.db, batch_size=1)
+        jobs_written, later_written = threading.Event(), threading.Event()
+        write_collection = writer.write_collection
+
+        def block(collection, operations):
+            (jobs_written if collection == 'jobs' else later_written).wait(timeout=5)
+            write_collection(collection, operations)
+
+        with mock.patch.object(writer, 'write_collection', side_effect=block):
+            writer.insert('jobs', {'job_id': 0})
+            flushed = threading.Thread(target=writer.flush)
+            flushed.start()
+            flushed.join(timeout=0.1)
+            # queued after the flush and not written until the end of the test
+            writer.insert('later', {'job_id': 1})
+            jobs_written.set()
+            flushed.join(timeout=1)
+            self.assertFalse(flushed.is_alive())
+            later_written.set()
+            writer.flush()
+
+        self.assertEqual(1, self.db['later'].count_documents({}))
+
+
+class TestWriteBehind(EllisHandlerTestCase):
+
+    def test_application_end_flushes_writes(self):
+        app_event_id = self.run_application([4, 6])
+
+        app_event = self.db[Config.ELLIS_APP_EVENT_COLLECTION].find_one({'_id': ObjectId(app_event_id)})
+        self.assertEqual(self.app_time, app_event['finished_at'])
+        jobs = self.db[Config.ELLIS_JOB_EVENT_COLLECTION].find({'app_event_id': app_event_id}).sort('job_id', 1)
+        self.assertEqual([(4, 1000), (6, 2000)], [(job['scale_out'], job['duration_ms']) for job in jobs])
+
+    def test_events_do_not_wait_for_mongodb(self):
+        for scale_out in [2, 4, 6, 8, 10]:
+            self.run_application([scale_out] * 4)
+
+        writing_threads = set()
+        write = self.handler.writer.write
+
+        def record_thread(batch):
+            writing_threads.add(threading.current_thread())
+            write(batch)
+
+        with mock.patch.object(self.handler.writer, 'write', side_effect=record_thread), \
+                mock.patch.object(self.db[Config.ELLIS_JOB_EVENT_COLLECTION], 'find_one') as find_one:
+            app_event_id = self.start_application(is_adaptive=True)
+            self.run_jobs(app_event_id, [8, 8, 8, 8])
+
+        self.assertEqual({self.handler.writer.thread}, writing_threads)
+        self.assertEqual(0, find_one.call_count)
+        self.assertEqual(4, self.db[Config.ELLIS_JOB_EVENT_COLLECTION].count_documents({'app_event_id': app_event_id}))
+
+    def test_batch_is_handled_in_order(self):
+        app_event_id = self.start_application()
+        job = {'app_event_id': app_event_id, 'job_id': 0, 'num_executors': 4}
+        responses = self.handler.handle_batch([
+            JobStartMessage.create({**job, 'app_time': self.app_time}),
+            JobEndMessage.create({**job, 'app_time': self.app_time + 1000, 'rescaling_time_ratio': 0.0, 'stages': {}}),
+            JobStartMessage.create({**job, 'job_id': 1, 'app_time': self.app_time + 1000}),
+        ])
+        self.handler.writer.flush()
+
+        self.assertEqual([app_event_id] * 3, [response.app_event_id for response in responses])
+        jobs = self.db[Config.ELLIS_JOB_EVENT_COLLECTION].find({'app_event_id': app_event_id}).sort('job_id', 1)
+        self.assertEqual([(0, 1000), (1, None)], [(job['job_id'], job.get('duration_ms')) for job in jobs])
+
+    def test_batch_is_written_with_one_bulk_write_per_collection(self):
+        app_event_ids = [self.start_application() for _ in range(2)]
+        self.handler.writer.flush()
+        bulk_write = mongomock.Collection.bulk_write
+        collections = []
+
+        def record_collection(collection, *args, **kwargs):
+            collections.append(collection.name)
+            return bulk_write(collection, *args, **kwargs)
+
+        messages = []
+        for app_event_id in app_event_ids:
+            job = {'app_event_id': app_event_id, 'job_id': 0, 'num_executors': 4}
+            messages.append(JobStartMessage.create({**job, 'app_time': self.app_time}))
+            messages.append(JobEndMessage.create({
+                **job, 'app_time': self.app_time + 1000, 'rescaling_time_ratio': 0.0, 'stages': {}
+            }))
+        messages.insert(2, AppStartMessage.create({**app_start_payload(), 'app_time': self.app_time + 1000}))
+
+        with mock.patch.object(mongomock.Collection, 'bulk_write', autospec=True, side_effect=record_collection):
+            self.handler.handle_batch(messages)
+            self.handler.writer.flush()
+
+        self.assertEqual(sorted([Config.ELLIS_JOB_EVENT_COLLECTION, Config.ELLIS_APP_EVENT_COLLECTION]),
+                         sorted(collections))
+        self.assertEqual(2, self.db[Config.ELLIS_JOB_EVENT_COLLECTION].count_documents({'duration_ms': 1000}))
+
+
+if __name__ == '__main__':
+    unittest.main()
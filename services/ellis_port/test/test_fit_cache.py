@@ -0,0 +1,90 @@
+import unittest
+
+import mongomock
+import numpy as np
+from bson.objectid import ObjectId
+
+from services.ellis_port.config import Config
+from services.ellis_port.ellis_utils import EllisUtils, compute_predictions
+from services.ellis_port.ernest import Ernest
+from services.ellis_port.fit_cache import FitCache
+from services.ellis_port.test.test_migrate_job_events import insert_runs
+
+
+class TestFitCache(unittest.TestCase):
+
+    def setUp(self):
+        self.x = np.array([2., 4., 6., 8.])
+        self.y = np.array([900., 600., 500., 450.])
+
+    def test_fit_is_memoized(self):
+        cache = FitCache()
+        ernest = cache.fit(Ernest, self.x, self.y)
+
+        self.assertIs(ernest, cache.fit(Ernest, self.x.copy(), self.y.copy()))
+        self.assertIsNot(ernest, cache.fit(Ernest, self.x, self.y + 1))
+        self.assertEqual((1, 2), (cache.hits, cache.misses))
+        self.assertTrue(np.allclose(Ernest().fit(self.x, self.y).coeff, ernest.coeff))
+
+    def test_fingerprint_depends_on_shape_and_dtype(self):
+        fingerprints = {
+            FitCache.fingerprint(self.x, self.y),
+            FitCache.fingerprint(self.x.reshape(2, 2), self.y),
+            FitCache.fingerprint(self.x.astype(np.float32), self.y),
+        }
+        self.assertEqual(3, len(fingerprints))
+
+    def test_least_recently_used_model_is_evicted(self):
+        cache = FitCache(maxsize=2)
+        first = cache.fit(Ernest, self.x, self.y)
+        cache.fit(Ernest, self.x, self.y + 1)
+        cache.fit(Ernest, self.x, self.y)
+        cache.fit(Ernest, self.x, self.y + 2)
+
+        self.assertEqual(2, len(cache.models))
+        self.assertIs(first, cache.fit(Ernest, self.x, self.y))
+        self.assertEqual(3, cache.misses)
+
+    def test_failed_fit_is_memoized(self):
+        class FailingPredictor(Ernest):
+            fits = 0
+
+            def _fit(self, x, y):
+                FailingPredictor.fits += 1
+                raise ValueError("cannot fit")
+
+        cache = FitCache()
+        for _ in range(2):
+            with self.assertRaises(ValueError):
+                cache.fit(FailingPredictor, self.x, self.y)
+        self.assertEqual(1, FailingPredictor.fits)
+
+    def test_compute_predictions_with_cache(self):
+        cache = FitCache()
+        predicted_scale_outs = np.arange(2, 13)
+        expected = compute_predictions(self.x, self.y, predicted_scale_outs)
+
+        for _ in range(3):
+            self.assertTrue(np.array_equal(expected, compute_predictions(self.x, self.y, predicted_scale_outs, cache)))
+        self.assertEqual(1, cache.misses)
+
+    def test_models_are_fitted_once_per_application(self):
+        db = mongomock.MongoClient(tz_aware=True)[Config.MONGODB_DATABASE]
+        insert_runs(db, 20, denormalized=True)
+        current = ObjectId()
+        db[Config.ELLIS_APP_EVENT_COLLECTION].insert_one({
+            '_id': current, 'app_id': 'kmeans', 'started_at': 10 ** 7, 'target_runtime': 3000,
+            'min_executors': 2, 'max_executors': 12
+        })
+        utils = EllisUtils(db)
+
+        utils.compute_initial_scale_out(str(current), 'kmeans', 2, 12, 3000)
+        misses = utils.fit_cache.misses
+        utils.update_scaleout(str(current), 0, 10 ** 7 + 1000, 6)
+        utils.update_scaleout(str(current), 0, 10 ** 7 + 1000, 6)
+
+        self.assertEqual(misses, utils.fit_cache.misses)
+
+
+if __name__ == '__main__':
+    unittest.main()
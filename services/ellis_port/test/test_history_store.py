@@ -0,0 +1,122 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import mongomock
+import numpy as np
+from bson.objectid import ObjectId
+
+from services.ellis_port.config import Config
+from services.ellis_port.ellis_event_handler import EllisEventHandler
+from services.ellis_port.runtime_history import RECORD_DTYPE, RuntimeHistory, RuntimeHistoryCache
+from services.ellis_port.test import EllisHandlerTestCase
+
+
+class TestRuntimeHistoryRecords(unittest.TestCase):
+
+    def test_history_grows_beyond_its_capacity(self):
+        history = RuntimeHistory()
+        app_event_ids = [str(ObjectId()) for _ in range(50)]
+        for app_event_id in app_event_ids:
+            for job_id in range(3):
+                history.add(app_event_id, job_id, 4, 1000 * (job_id + 1), 42)
+
+        self.assertEqual(150, history.size)
+        scale_outs, runtimes = history.non_adaptive_runs(str(ObjectId()))
+        self.assertEqual([4] * 50, scale_outs.tolist())
+        self.assertEqual([6000] * 50, runtimes.tolist())
+        self.assertEqual(49, len(history.job_runtime_data(app_event_ids[-1])[0]))
+
+    def test_incomplete_record_is_ignored(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'kmeans.records')
+            history = RuntimeHistory()
+            history.write(path)
+            history.add(str(ObjectId()), 0, 4, 1000)
+            history.add(str(ObjectId()), 0, 6, 800)
+            with open(path, 'ab') as file:
+                file.write(b'\0' * (RECORD_DTYPE.itemsize // 2))
+
+            self.assertEqual([(4, 1000), (6, 800)], RuntimeHistory.read(path).job_runtime_data(str(ObjectId()))[0])
+
+
+class TestHistoryStore(EllisHandlerTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        patcher = mock.patch.object(Config, 'ELLIS_HISTORY_DIR', self.directory.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        super().setUp()
+
+    def test_history_is_written_through(self):
+        self.run_application([4, 4, 4])
+        self.run_application([6, 6, 6])
+
+        history = RuntimeHistory.read(os.path.join(self.directory.name, 'kmeans.records'))
+        self.assertEqual(6, history.size)
+        self.assertEqual([4, 4, 4, 6, 6, 6], history.records['scale_out'][:history.size].tolist())
+        self.assertEqual({100000, 206000}, set(history.records['app_started_at'][:history.size].tolist()))
+
+    def test_history_is_warm_loaded_at_start(self):
+        for scale_out in [2, 4, 6, 8, 10]:
+            self.run_application([scale_out] * 4)
+        current = self.run_application([2])
+        expected = self.handler.ellis_utils.gather_job_runtime_data(current, 'kmeans')
+
+        restarted = EllisEventHandler(db=self.db)
+        with mock.patch.object(RuntimeHistoryCache, 'load', side_effect=AssertionError("history read from MongoDB")):
+            self.assertEqual(expected, restarted.ellis_utils.gather_job_runtime_data(current, 'kmeans'))
+            self.handler = restarted
+            self.run_application([8, 8, 8, 8], is_adaptive=True)
+
+    def test_signatures_are_escaped(self):
+        cache = RuntimeHistoryCache(mongomock.MongoClient()['test'], self.directory.name)
+        cache.get('spark/kmeans 2').add(str(ObjectId()), 0, 4, 1000)
+
+        restarted = RuntimeHistoryCache(None, self.directory.name)
+        self.assertEqual(1, restarted.warm_load())
+        self.assertEqual(1, restarted.histories['spark/kmeans 2'].size)
+
+    def test_warm_loaded_history_is_synced_with_mongodb(self):
+        self.run_application([4, 4, 4])
+        # runs finished by another instance of the service, which does not persist the history here
+        with mock.patch.object(Config, 'ELLIS_HISTORY_DIR', None):
+            self.handler = EllisEventHandler(db=self.db)
+        self.run_application([6, 6, 6])
+        current = self.run_application([8, 8, 8])
+
+        restarted = EllisEventHandler(db=self.db)
+        history = restarted.ellis_utils.runtime_history.get('kmeans')
+
+        self.assertEqual(9, history.size)
+        self.assertEqual([4, 6], restarted.ellis_utils.get_non_adaptive_runs(current, 'kmeans')[0].tolist())
+        # the persisted history is replaced, so the next restart is up to date
+        self.assertEqual(9, RuntimeHistory.read(os.path.join(self.directory.name, 'kmeans.records')).size)
+        with mock.patch.object(RuntimeHistoryCache, 'load', side_effect=AssertionError("history read from MongoDB")):
+            EllisEventHandler(db=self.db).ellis_utils.runtime_history.get('kmeans')
+
+
+class TestHistoryStoreBenchmark(unittest.TestCase):
+
+    def test_non_adaptive_runs(self):
+        import time
+        rng = np.random.default_rng(0)
+        history = RuntimeHistory()
+        app_event_ids = [str(ObjectId()) for _ in range(2000)]
+        for app_event_id in app_event_ids:
+            scale_out = int(rng.integers(2, 13))
+            for job_id in range(10):
+                history.add(app_event_id, job_id, scale_out, int(rng.integers(1000, 5000)))
+
+        start = time.perf_counter()
+        scale_outs, _ = history.non_adaptive_runs(str(ObjectId()))
+        history.job_runtime_data(str(ObjectId()))
+        print(f"\n{history.size} records grouped in {(time.perf_counter() - start) * 1000:.1f} ms")
+        self.assertEqual(2000, len(scale_outs))
+
+
+if __name__ == '__main__':
+    unittest.main()
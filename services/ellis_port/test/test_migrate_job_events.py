@@ -0,0 +1,135 @@
+import os
+import tempfile
+import time
+import unittest
+from collections import defaultdict
+
+import mongomock
+from bson.objectid import ObjectId
+
+from services.ellis_port.config import Config
+from services.ellis_port.ellis_utils import EllisUtils
+from services.ellis_port.migrate_job_events import migrate
+from services.ellis_port.runtime_history import RuntimeHistoryCache
+
+NUM_JOBS = 3
+# opt-in benchmark of the history reads on this many previous runs, e.g. 10000
+BENCHMARK_RUNS = int(os.getenv('ELLIS_BENCHMARK_RUNS', '0'))
+
+
+def insert_runs(db, num_runs: int, denormalized: bool) -> list[str]:
+    """Inserts non-adaptive runs of the kmeans signature with NUM_JOBS jobs each, returns their app event ids."""
+    app_events = [
+        {'_id': ObjectId(), 'app_id': 'kmeans', 'started_at': 100000 * i, 'target_runtime': 600000,
+         'min_executors': 2, 'max_executors': 12}
+        for i in range(num_runs)
+    ]
+    db[Config.ELLIS_APP_EVENT_COLLECTION].insert_many(app_events)
+
+    job_events = []
+    for i, app_event in enumerate(app_events):
+        for job_id in range(NUM_JOBS):
+            job_event = {
+                'app_event_id': str(app_event['_id']),
+                'job_id': job_id,
+                'started_at': app_event['started_at'] + 1000 * job_id,
+                'finished_at': app_event['started_at'] + 1000 * (job_id + 1),
+                'duration_ms': 1000 - 10 * (i % 10),
+                'scale_out': 2 + i % 10,
+            }
+            if denormalized:
+                job_event.update({'app_id': app_event['app_id'], 'app_started_at': app_event['started_at']})
+            job_events.append(job_event)
+    db[Config.ELLIS_JOB_EVENT_COLLECTION].insert_many(job_events)
+    return [str(app_event['_id']) for app_event in app_events]
+
+
+class TestMigrateJobEvents(unittest.TestCase):
+
+    def setUp(self):
+        self.db = mongomock.MongoClient(tz_aware=True)[Config.MONGODB_DATABASE]
+
+    def test_migrate_denormalizes_app_events(self):
+        app_event_ids = insert_runs(self.db, 5, denormalized=False)
+
+        self.assertEqual(5 * NUM_JOBS, migrate(self.db, batch_size=2))
+        # re-running the migration is a no-op
+        self.assertEqual(0, migrate(self.db))
+
+        job_event = self.db[Config.ELLIS_JOB_EVENT_COLLECTION].find_one({'app_event_id': app_event_ids[3]})
+        self.assertEqual('kmeans', job_event['app_id'])
+        self.assertEqual(300000, job_event['app_started_at'])
+
+        current = str(ObjectId())
+        scale_outs, _ = EllisUtils(self.db).get_non_adaptive_runs(current, 'kmeans')
+        self.assertEqual([2, 3, 4, 5, 6], scale_outs.tolist())
+
+    def test_migrate_invalidates_histories(self):
+        insert_runs(self.db, 5, denormalized=False)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        cache = RuntimeHistoryCache(self.db, directory.name)
+        current = str(ObjectId())
+        self.assertEqual(0, cache.get('kmeans').non_adaptive_runs(current)[0].size)
+
+        migrate(self.db, runtime_history=cache)
+
+        self.assertEqual([2, 3, 4, 5, 6], cache.get('kmeans').non_adaptive_runs(current)[0].tolist())
+        # the persisted history is replaced as well
+        restarted = RuntimeHistoryCache(self.db, directory.name)
+        restarted.warm_load()
+        self.assertEqual(5 * NUM_JOBS, restarted.histories['kmeans'].size)
+
+    def compare_history_reads(self, num_runs: int):
+        """
+        Reads the history of a job end on the same previous runs with the former $lookup path, which queries the job
+        events of every previous app event, a single find on the denormalized job events, and the in-memory history.
+        Checks that all three return the same runtimes and prints their timings. mongomock implements neither $lookup
+        with let nor indexes, so the former path is run as the equivalent per app event queries.
+        """
+        insert_runs(self.db, num_runs, denormalized=True)
+        current = str(ObjectId())
+        utils = EllisUtils(self.db)
+
+        def lookup_job_runtime_data():
+            job_runtime_data = defaultdict(list)
+            app_events = self.db[Config.ELLIS_APP_EVENT_COLLECTION].find(
+                {'app_id': 'kmeans', '_id': {'$lt': ObjectId(current)}}, {'_id': 1}
+            )
+            for app_event in app_events:
+                job_events = self.db[Config.ELLIS_JOB_EVENT_COLLECTION].find({'app_event_id': str(app_event['_id'])})
+                for job_event in job_events:
+                    job_runtime_data[job_event['job_id']].append((job_event['scale_out'], job_event['duration_ms']))
+            return job_runtime_data
+
+        def find_job_runtime_data():
+            return utils.runtime_history.load('kmeans').job_runtime_data(current)
+
+        def memory_job_runtime_data():
+            return utils.gather_job_runtime_data(current, 'kmeans')
+
+        utils.runtime_history.get('kmeans')
+        results = {}
+        for name, read in [('$lookup', lookup_job_runtime_data), ('find', find_job_runtime_data),
+                           ('memory', memory_job_runtime_data)]:
+            start = time.perf_counter()
+            job_runtime_data = read()
+            print(f"{num_runs} runs, {name}: {(time.perf_counter() - start) * 1e3:.1f} ms per job end")
+            results[name] = {job_id: sorted(runtimes) for job_id, runtimes in job_runtime_data.items()}
+
+        self.assertEqual(list(range(NUM_JOBS)), sorted(results['$lookup'].keys()))
+        self.assertEqual(num_runs, len(results['$lookup'][0]))
+        self.assertEqual(results['$lookup'], results['find'])
+        self.assertEqual(results['$lookup'], results['memory'])
+
+    def test_history_reads_agree(self):
+        self.compare_history_reads(100)
+
+    @unittest.skipUnless(BENCHMARK_RUNS, "set ELLIS_BENCHMARK_RUNS, e.g. to 10000, to run the history benchmark")
+    def test_history_benchmark(self):
+        # the former path on mongomock scans all job events per app event, so 10k runs take well over ten minutes
+        self.compare_history_reads(BENCHMARK_RUNS)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,15 @@
+import timeit
 import unittest
 import numpy as np
 
 from services.ellis_port.bell import Bell
-from services.ellis_port.kernel_regression import KernelRegression
-from services.ellis_port.ernest import Ernest
+from services.ellis_port.kernel_regression import KernelRegression, BANDWIDTHS
+from services.ellis_port.interpolation_splits import InterpolationSplits
+from services.ellis_port.ernest import Ernest, IncrementalErnest
+from services.ellis_port.nnls import nnls_gram
+from scipy.optimize import nnls
+from services.ellis_port.cross_validation import cv_score
+from services.ellis_port.ellis_utils import compute_predictions
 
 
 class TestUnivariatePredictors(unittest.TestCase):
@@ -15,7 +21,8 @@ class TestUnivariatePredictors(unittest.TestCase):
         bell = Bell()
         bell.fit(x, y)
 
-        self.assertTrue(True)
+        self.assertIsNotNone(bell.best_model)
+        self.assertTrue(np.all(np.isfinite(bell.predict(np.arange(2., 10.)))))
 
     def test_ernest(self):
         ernest = Ernest()
@@ -77,6 +84,80 @@ class TestUnivariatePredictors(unittest.TestCase):
             except Exception as e:
                 self.fail(f"fit method raised an exception with input {scale_outs}, {runtimes}: {e}")
 
+    def test_nnls_gram_matches_scipy_nnls(self):
+        """Solving from the normal equations should reach the residual of scipy's nnls on the design matrix."""
+        rng = np.random.default_rng(42)
+        for _ in range(200):
+            x = rng.integers(1, 20, rng.integers(2, 30)).astype(float)
+            y = 5000 / x + rng.uniform(-200, 500, x.size)
+            X = Ernest._fmap(x)
+            try:
+                expected, _ = nnls(X, y, maxiter=10000)
+            except RuntimeError:
+                # scipy does not converge on some of these problems, they are solved from the normal equations though
+                nnls_gram(X.T @ X, X.T @ y)
+                continue
+
+            coeff = nnls_gram(X.T @ X, X.T @ y)
+
+            self.assertTrue(np.all(coeff >= 0))
+            residual, expected_residual = np.sum((X @ coeff - y) ** 2), np.sum((X @ expected - y) ** 2)
+            self.assertLessEqual(residual, expected_residual * (1 + 1e-9) + 1e-9)
+
+    def test_incremental_ernest_matches_refit(self):
+        """Adding observations one at a time should give the same model as refitting on all of them."""
+        rng = np.random.default_rng(42)
+        x = rng.integers(2, 13, 30).astype(float)
+        y = 5000 / x + rng.uniform(300, 500, x.size)
+
+        incremental = IncrementalErnest()
+        for i in range(x.size):
+            incremental.update(x[i], y[i])
+            refit = Ernest().fit(x[:i + 1], y[:i + 1])
+            self.assertTrue(np.allclose(refit.predict(x), incremental.predict(x), rtol=1e-6))
+
+        # the warm-started solution equals the one solved from scratch on the same normal equations
+        X = Ernest._fmap(x)
+        self.assertTrue(np.allclose(nnls_gram(X.T @ X, X.T @ y), incremental.coeff))
+        self.assertTrue(np.allclose(incremental.coeff, IncrementalErnest().fit(x, y).coeff))
+
+    def test_ernest_fit_many(self):
+        """Fitting the models of several jobs together should predict like fitting them one by one."""
+        rng = np.random.default_rng(42)
+        xs = [rng.integers(2, 13, n).astype(float) for n in rng.integers(1, 30, 50)]
+        ys = [5000 / x + rng.uniform(300, 500, x.size) for x in xs]
+        x_predict = np.arange(2, 13, dtype=float)
+
+        models = Ernest.fit_many(xs, ys)
+        y_predict = Ernest.predict_many(models, x_predict)
+
+        self.assertEqual((50, x_predict.size), y_predict.shape)
+        for x, y, model, row in zip(xs, ys, models, y_predict):
+            ernest = Ernest().fit(x, y)
+            residual = np.sum((ernest.predict(x) - y) ** 2)
+            batched_residual = np.sum((Ernest.predict_many([model], x)[0] - y) ** 2)
+            self.assertLessEqual(batched_residual, residual * (1 + 1e-6) + 1e-6)
+            if np.unique(x).size >= 4:
+                # the solution is only unique if there are at least as many scale-outs as parameters
+                self.assertTrue(np.allclose(ernest.predict(x_predict), row, rtol=1e-4))
+
+    def test_ernest_fit_many_benchmark(self):
+        rng = np.random.default_rng(42)
+        xs = [rng.integers(2, 13, 20).astype(float) for _ in range(100)]
+        ys = [5000 / x + rng.uniform(300, 500, x.size) for x in xs]
+        number = 5
+        one_by_one = timeit.timeit(lambda: [Ernest().fit(x, y) for x, y in zip(xs, ys)], number=number) / number
+        batched = timeit.timeit(lambda: Ernest.fit_many(xs, ys), number=number) / number
+        print(f"Ernest fit of 100 jobs: {one_by_one * 1e3:.1f} ms one by one, {batched * 1e3:.1f} ms batched")
+
+    def test_fit_many_default(self):
+        xs = [np.array([2., 4., 6., 8.]), np.array([3., 5., 7.])]
+        ys = [np.array([900., 600., 500., 450.]), np.array([700., 560., 500.])]
+        models = KernelRegression.fit_many(xs, ys)
+        y_predict = KernelRegression.predict_many(models, np.array([4., 5.]))
+        self.assertTrue(np.allclose([models[0].predict(np.array([4., 5.])), models[1].predict(np.array([4., 5.]))],
+                                    y_predict))
+
     def test_kernel_regression_correct_prediction(self):
         """KernelRegression should calculate the correct predictions."""
         kernel_regression = KernelRegression(bw=1.8)
@@ -91,6 +172,99 @@ class TestUnivariatePredictors(unittest.TestCase):
         # Check that the predictions are close to the expected true values
         self.assertTrue(np.allclose(y_true, y_predict, atol=1e-4))
 
+    def test_kernel_regression_matches_pointwise_solution(self):
+        """The batched KernelRegression prediction should equal solving each weighted least squares problem alone."""
+        x = np.array([2., 2., 4., 4., 6., 8., 8., 10., 12.])
+        y = np.array([900., 880., 610., 640., 520., 470., 455., 430., 420.])
+        x_predict = np.arange(2, 13, dtype=float)
+        kernel_regression = KernelRegression(bw=2.5).fit(x, y)
+
+        X = np.c_[np.ones_like(x), x]
+        y_expected = []
+        for xp in x_predict:
+            w = np.exp(-(xp - x) ** 2 / (2 * 2.5 ** 2))
+            c = np.linalg.solve((X.T * w) @ X + kernel_regression.tol * np.eye(2), (X.T * w) @ y)
+            y_expected.append(c[0] + c[1] * xp)
+
+        self.assertTrue(np.allclose(y_expected, kernel_regression.predict(x_predict)))
+
+    def test_kernel_regression_singular_systems(self):
+        """Query points whose weighted normal matrix is singular fall back to the pseudo-inverse."""
+        kernel_regression = KernelRegression(bw=1).fit(np.array([4., 4., 4.]), np.array([1., 2., 3.]))
+        y_predict = kernel_regression.predict(np.arange(2, 13, dtype=float))
+
+        self.assertTrue(np.all(np.isfinite(y_predict)))
+        self.assertAlmostEqual(2., y_predict[2])
+
+    @staticmethod
+    def select_bandwidth_by_refitting(x, y):
+        """Selects the bandwidth by fitting one KernelRegression per bandwidth and fold."""
+        splits = list(InterpolationSplits(x, y))
+        scores = np.zeros((len(BANDWIDTHS), len(splits)))
+        for i, ((x_train, y_train), (x_test, y_test)) in enumerate(splits):
+            for j, bw in enumerate(BANDWIDTHS):
+                y_predict = KernelRegression(bw=bw).fit(x_train, y_train).predict(x_test)
+                scores[j, i] = np.mean(np.abs((y_predict - y_test) / y_test))
+        return BANDWIDTHS[np.argmin(np.mean(scores, axis=1))]
+
+    def test_kernel_regression_bandwidth_selection(self):
+        """The tensorized bandwidth selection should choose the same bandwidth as refitting a model per candidate."""
+        rng = np.random.default_rng(42)
+        for _ in range(20):
+            x = rng.integers(2, 13, 20).astype(float)
+            y = 5000 / x + rng.uniform(300, 500, x.size)
+            kernel_regression = KernelRegression().fit(x, y)
+            self.assertEqual(self.select_bandwidth_by_refitting(x, y), kernel_regression._bw)
+
+        # without inner scale-outs there are no folds
+        self.assertEqual(1., KernelRegression().fit(np.array([2., 4., 4.]), np.array([3., 2., 2.]))._bw)
+
+    def test_kernel_regression_bandwidth_selection_benchmark(self):
+        rng = np.random.default_rng(42)
+        x = rng.integers(2, 13, 30).astype(float)
+        y = 5000 / x + rng.uniform(300, 500, x.size)
+        number = 5
+        refitting = timeit.timeit(lambda: self.select_bandwidth_by_refitting(x, y), number=number) / number
+        tensorized = timeit.timeit(lambda: KernelRegression().fit(x, y), number=number) / number
+        print(f"bandwidth selection: {refitting * 1e3:.1f} ms refitting, {tensorized * 1e3:.1f} ms tensorized "
+              f"({refitting / tensorized:.0f}x)")
+
+    def test_cv_score(self):
+        """cv_score should fit every model on the training and score it on the test data of every split."""
+        x = np.array([2., 2., 4., 4., 6., 8., 8., 10., 12.])
+        y = np.array([900., 880., 610., 640., 520., 470., 455., 430., 420.])
+        models = [Ernest(), KernelRegression(bw=3.)]
+
+        scores = cv_score(models, InterpolationSplits(x, y))
+
+        self.assertEqual((2, 4), scores.shape)
+        for i, ((x_train, y_train), (x_test, y_test)) in enumerate(InterpolationSplits(x, y)):
+            y_predict = Ernest().fit(x_train, y_train).predict(x_test)
+            self.assertAlmostEqual(np.mean(np.abs((y_predict - y_test) / y_test)), scores[0, i])
+
+    def test_bell_interpolation_in_compute_predictions(self):
+        """With more than five scale-outs, compute_predictions should interpolate with Bell instead of failing."""
+        rng = np.random.default_rng(42)
+        x = np.repeat(np.arange(2., 14., 2.), 3)
+        y = 5000 / x + rng.uniform(300, 500, x.size)
+        predicted_scale_outs = np.arange(1, 15)
+
+        bell = Bell().fit(x, y)
+        y_predict = compute_predictions(x, y, predicted_scale_outs)
+
+        interpolation = (predicted_scale_outs >= 2) & (predicted_scale_outs <= 12)
+        self.assertEqual(bell.predict(predicted_scale_outs[interpolation].astype(float)).astype(int).tolist(),
+                         y_predict[interpolation].tolist())
+
+    def test_bell_benchmark(self):
+        rng = np.random.default_rng(42)
+        for n in [15, 60, 300]:
+            x = rng.integers(2, 13, n).astype(float)
+            y = 5000 / x + rng.uniform(300, 500, n)
+            number = 5
+            seconds = timeit.timeit(lambda: Bell().fit(x, y), number=number) / number
+            print(f"Bell fit on {n} runs: {seconds * 1e3:.1f} ms")
+
 
 if __name__ == '__main__':
     unittest.main()
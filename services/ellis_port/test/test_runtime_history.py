@@ -0,0 +1,97 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+from bson.objectid import ObjectId
+
+from services.ellis_port.bulk_writer import WriteBehindError
+from services.ellis_port.config import Config
+from services.ellis_port.ellis_event_handler import EllisEventHandler
+from services.ellis_port.ernest import Ernest, IncrementalErnest
+from services.ellis_port.runtime_history import RuntimeHistory
+from services.ellis_port.test import EllisHandlerTestCase
+
+
+class TestRuntimeHistory(EllisHandlerTestCase):
+
+    def test_history_is_loaded_from_mongodb(self):
+        self.run_application([4, 4, 4])
+        self.run_application([6, 8, 8])
+        current = self.run_application([2])
+
+        utils = EllisEventHandler(db=self.db).ellis_utils
+        job_runtime_data = utils.gather_job_runtime_data(current, 'kmeans')
+        self.assertEqual({0: [(4, 1000), (6, 1000)], 1: [(4, 2000), (8, 2000)], 2: [(4, 3000), (8, 3000)]},
+                         job_runtime_data)
+
+        scale_outs, runtimes = utils.get_non_adaptive_runs(current, 'kmeans')
+        self.assertEqual([4], scale_outs.tolist())
+        self.assertEqual([6000], runtimes.tolist())
+
+    def test_history_is_updated_incrementally(self):
+        first = self.run_application([4, 4])
+        history = self.handler.ellis_utils.runtime_history.get('kmeans')
+        second = self.run_application([6, 6])
+        current = self.run_application([2])
+
+        self.assertIs(history, self.handler.ellis_utils.runtime_history.get('kmeans'))
+        self.assertEqual([4, 6], self.handler.ellis_utils.get_non_adaptive_runs(current, 'kmeans')[0].tolist())
+        # runs only see their predecessors
+        self.assertEqual([4], self.handler.ellis_utils.get_non_adaptive_runs(second, 'kmeans')[0].tolist())
+        self.assertEqual([], self.handler.ellis_utils.get_non_adaptive_runs(first, 'kmeans')[0].tolist())
+
+    def test_invalidate_reloads_history(self):
+        self.run_application([4, 4])
+        cache = self.handler.ellis_utils.runtime_history
+        history = cache.get('kmeans')
+
+        cache.invalidate('kmeans')
+
+        self.assertIsNot(history, cache.get('kmeans'))
+        self.assertEqual(history.records[:history.size].tolist(), cache.get('kmeans').records[:history.size].tolist())
+
+    def test_failed_writes_invalidate_history(self):
+        self.run_application([4, 4])
+        cache = self.handler.ellis_utils.runtime_history
+        history = cache.get('kmeans')
+        app_event_id = self.start_application()
+
+        with mock.patch.object(self.handler.writer, 'flush', side_effect=WriteBehindError("1 write(s) failed")):
+            with self.assertRaises(WriteBehindError):
+                self.run_jobs(app_event_id, [6, 6])
+
+        self.assertNotIn('kmeans', cache.histories)
+        self.assertIsNot(history, cache.get('kmeans'))
+
+    def test_ernest_models_are_updated_incrementally(self):
+        for scale_out in [2, 4, 6]:
+            self.run_application([scale_out] * 3)
+        history = self.handler.ellis_utils.runtime_history.get('kmeans')
+        history.job_runtime_models(str(ObjectId()))
+
+        with mock.patch.object(RuntimeHistory, 'fit_ernests') as fit_ernests, \
+                mock.patch.object(IncrementalErnest, 'update', autospec=True, side_effect=IncrementalErnest.update) \
+                as update:
+            last = self.run_application([8, 8, 8])
+            job_runtime_data, ernests = history.job_runtime_models(str(ObjectId()))
+
+        self.assertEqual(0, fit_ernests.call_count)
+        self.assertEqual(3, update.call_count)
+        # the warm-started models equal models fitted from scratch
+        for job_id, runtimes in job_runtime_data.items():
+            x, y = np.array(runtimes).T
+            self.assertTrue(np.allclose(Ernest().fit(x, y).coeff, ernests[job_id].coeff))
+        # the models cover the jobs of the last run, so they do not apply to it
+        self.assertIsNone(history.job_runtime_models(last)[1])
+
+    def test_adaptive_run_uses_history(self):
+        for scale_out in [2, 4, 6, 8, 10]:
+            self.run_application([scale_out] * 4)
+        self.run_application([8, 8, 8, 8], is_adaptive=True)
+
+        jobs = list(self.db[Config.ELLIS_JOB_EVENT_COLLECTION].find({'duration_ms': {'$exists': True}}))
+        self.assertEqual(24, len(jobs))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from services.ellis_port.ellis_utils import RuntimeTable, compute_predictions
+from services.ellis_port.test import EllisHandlerTestCase
+
+
+class TestRuntimeTable(unittest.TestCase):
+
+    def setUp(self):
+        self.table = RuntimeTable(
+            job_ids=np.array([0, 1, 2, 4]),
+            predicted_scale_outs=np.arange(2, 5),
+            runtimes=np.array([[10, 8, 6], [20, 16, 12], [30, 24, 18], [40, 32, 24]])
+        )
+
+    def test_remaining_runtimes(self):
+        prediction = self.table.remaining_runtimes(0, 1000, 5000)
+
+        self.assertEqual([20, 16, 12], prediction.next_job_runtimes.tolist())
+        self.assertEqual([70, 56, 42], prediction.future_jobs_runtimes.tolist())
+        self.assertEqual((1000, 5000), (prediction.app_start_time, prediction.target_runtime))
+        # job ids do not have to be contiguous, job 4 follows job 2
+        self.assertEqual([40, 32, 24], self.table.remaining_runtimes(1, 1000, 5000).future_jobs_runtimes.tolist())
+        self.assertEqual([100, 80, 60], self.table.total_runtimes().tolist())
+
+    def test_no_prediction_for_last_jobs(self):
+        self.assertIsNone(self.table.remaining_runtimes(2, 1000, 5000))
+        self.assertIsNone(self.table.remaining_runtimes(3, 1000, 5000))
+        self.assertIsNone(self.table.remaining_runtimes(4, 1000, 5000))
+
+
+class TestRuntimeTableOfRunningApplication(EllisHandlerTestCase):
+
+    def test_table_matches_predictions_per_job(self):
+        for scale_out in [2, 4, 6, 8, 10]:
+            self.run_application([scale_out] * 4)
+        app_event_id = self.start_application(is_adaptive=True)
+        running_app = self.handler.running_applications[app_event_id]
+        job_runtime_data = self.handler.ellis_utils.gather_job_runtime_data(app_event_id, 'kmeans')
+
+        for row, job_id in zip(running_app.runtime_table.runtimes, running_app.runtime_table.job_ids):
+            x, y = np.array(job_runtime_data[job_id]).T
+            # the Ernest models of the table are fitted in one batch, which may round differently
+            expected = compute_predictions(x, y, running_app.predicted_scale_outs)
+            self.assertTrue(np.allclose(expected, row, atol=1), f"{expected} != {row}")
+
+    def test_job_end_does_not_predict(self):
+        for scale_out in [2, 4, 6, 8, 10]:
+            self.run_application([scale_out] * 4)
+
+        with mock.patch('services.ellis_port.ellis_utils.compute_predictions', wraps=compute_predictions) as predict:
+            app_event_id = self.start_application(is_adaptive=True)
+            predictions_at_app_start = predict.call_count
+            self.run_jobs(app_event_id, [8, 8, 8, 8])
+
+        self.assertGreater(predictions_at_app_start, 0)
+        self.assertEqual(predictions_at_app_start, predict.call_count)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import time
+import unittest
+
+import numpy as np
+
+from services.ellis_port.ellis_utils import EllisUtils, RemainingRuntimePrediction
+from services.ellis_port.slack_policy import SlackPolicy, SlackPolicyGrid
+
+
+def select_scale_out_loop(prediction, job_end_time, current_scale_out, policy):
+    # the scalar implementation EllisUtils.select_scale_out had before the policy grid
+    predicted_scale_outs = prediction.predicted_scale_outs
+    min_executors = predicted_scale_outs[0]
+    future_jobs_runtimes = prediction.future_jobs_runtimes
+    current_runtime = job_end_time - prediction.app_start_time
+    next_job_runtime = prediction.next_job_runtimes[current_scale_out - min_executors]
+    remaining_target_runtime = prediction.target_runtime - current_runtime - next_job_runtime
+    remaining_runtime_prediction = future_jobs_runtimes[current_scale_out - min_executors]
+
+    def candidate():
+        candidate_scale_outs = np.where(future_jobs_runtimes < remaining_target_runtime * policy.candidate_slack)[0]
+        if len(candidate_scale_outs) > 0:
+            return predicted_scale_outs[candidate_scale_outs[0]]
+        return predicted_scale_outs[np.argmin(future_jobs_runtimes)]
+
+    if remaining_runtime_prediction > remaining_target_runtime * policy.relative_slack_up + policy.absolute_slack_up:
+        return int(candidate())
+    elif remaining_runtime_prediction < remaining_target_runtime * policy.relative_slack_down - policy.absolute_slack_down:
+        next_scale_out = candidate()
+        if next_scale_out < current_scale_out:
+            return int(next_scale_out)
+    return current_scale_out
+
+
+def random_prediction(rng, predicted_scale_outs=np.arange(2, 13)):
+    # runtimes decrease with the scale-out, with some noise
+    next_job_runtimes = (rng.uniform(5000, 20000) / predicted_scale_outs + rng.uniform(0, 200, predicted_scale_outs.size))
+    future_jobs_runtimes = (rng.uniform(20000, 200000) / predicted_scale_outs + rng.uniform(0, 2000, predicted_scale_outs.size))
+    return RemainingRuntimePrediction(
+        app_start_time=0,
+        target_runtime=int(rng.uniform(10000, 60000)),
+        predicted_scale_outs=predicted_scale_outs,
+        next_job_runtimes=next_job_runtimes.astype(int),
+        future_jobs_runtimes=future_jobs_runtimes.astype(int),
+    )
+
+
+class TestSlackPolicyGrid(unittest.TestCase):
+
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+        self.grid = SlackPolicyGrid.product(
+            relative_slack_up=[1.0, 1.05, 1.1],
+            absolute_slack_up=[0, 500],
+            relative_slack_down=[0.75, 0.85, 0.95],
+            candidate_slack=[0.8, 0.9, 1.0],
+        )
+
+    def test_grid_matches_scalar_selection(self):
+        self.assertEqual(54, len(self.grid.policies))
+        for _ in range(200):
+            prediction = random_prediction(self.rng)
+            job_end_time = int(self.rng.uniform(0, 10000))
+            current_scale_out = int(self.rng.integers(2, 13))
+
+            scale_outs, slacks = self.grid.evaluate(prediction, job_end_time, current_scale_out)
+
+            expected = [
+                select_scale_out_loop(prediction, job_end_time, current_scale_out, policy)
+                for policy in self.grid.policies
+            ]
+            self.assertEqual(expected, scale_outs.tolist())
+            remaining_target_runtime = (prediction.target_runtime - job_end_time
+                                        - prediction.next_job_runtimes[current_scale_out - 2])
+            self.assertEqual((remaining_target_runtime - prediction.future_jobs_runtimes[scale_outs - 2]).tolist(),
+                             slacks.tolist())
+
+    def test_select_scale_out_uses_default_policy(self):
+        for _ in range(50):
+            prediction = random_prediction(self.rng)
+            self.assertEqual(select_scale_out_loop(prediction, 5000, 6, SlackPolicy()),
+                             EllisUtils.select_scale_out(prediction, 5000, 6))
+
+    def test_best_policy(self):
+        prediction = RemainingRuntimePrediction(
+            app_start_time=0, target_runtime=10000, predicted_scale_outs=np.arange(2, 6),
+            next_job_runtimes=np.array([1000, 1000, 1000, 1000]), future_jobs_runtimes=np.array([12000, 8000, 6000, 4000])
+        )
+        grid = SlackPolicyGrid([SlackPolicy(candidate_slack=0.5), SlackPolicy(candidate_slack=0.9)])
+
+        # 9000 ms of target runtime remain, 3 executors are the smallest scale-out meeting 90% of it
+        self.assertEqual((grid.policies[1], 3, 1000), grid.best(prediction, 0, 2))
+
+    def test_benchmark(self):
+        predictions = [random_prediction(self.rng) for _ in range(100)]
+
+        start = time.perf_counter()
+        loop_scale_outs = [
+            [select_scale_out_loop(prediction, 5000, 6, policy) for policy in self.grid.policies]
+            for prediction in predictions
+        ]
+        loop = time.perf_counter() - start
+
+        start = time.perf_counter()
+        grid_scale_outs = [self.grid.evaluate(prediction, 5000, 6)[0].tolist() for prediction in predictions]
+        grid = time.perf_counter() - start
+
+        print(f"\n{len(self.grid.policies)} policies per job end: loop {loop * 10:.3f} ms, grid {grid * 10:.3f} ms")
+        self.assertEqual(loop_scale_outs, grid_scale_outs)
+
+if __name__ == '__main__':
+    unittest.main()
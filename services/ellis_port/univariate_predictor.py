@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+from typing import List
 import numpy as np
 
 class UnivariatePredictor(ABC):
@@ -54,3 +55,32 @@ class UnivariatePredictor(ABC):
         np.ndarray: Predicted values.
         """
         return self._predict(x)
+
+    @classmethod
+    def fit_many(cls, xs: List[np.ndarray], ys: List[np.ndarray]) -> List['UnivariatePredictor']:
+        """
+        Fits one model per data set, e.g. one per job of an application. The data sets may differ in size.
+        Subclasses can override this to fit all models together.
+
+        Parameters:
+        xs (List[np.ndarray]): Input feature arrays.
+        ys (List[np.ndarray]): Target arrays.
+
+        Returns:
+        List[UnivariatePredictor]: The fitted models.
+        """
+        return [cls().fit(x, y) for x, y in zip(xs, ys)]
+
+    @classmethod
+    def predict_many(cls, models: List['UnivariatePredictor'], x: np.ndarray) -> np.ndarray:
+        """
+        Predicts the target values of the same inputs with each of the models.
+
+        Parameters:
+        models (List[UnivariatePredictor]): Fitted models.
+        x (np.ndarray): Input feature array.
+
+        Returns:
+        np.ndarray: Predicted values of shape (models, inputs).
+        """
+        return np.array([model.predict(x) for model in models]).reshape(len(models), np.size(x))
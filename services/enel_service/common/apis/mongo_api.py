@@ -2,21 +2,64 @@ import asyncio
 import functools
 import logging
 import datetime
+import threading
 from datetime import date
-from typing import List, Any, Optional
+from typing import List, Any, Optional, Dict, Tuple
 
 import pymongo
 from motor.motor_asyncio import AsyncIOMotorClient
-from pymongo import IndexModel
+from pymongo import IndexModel, UpdateOne
+from pymongo.errors import BulkWriteError
+from pymongo.results import BulkWriteResult
 
 from .api_interface import DatabaseApi
 from ..configuration import MongoSettings
+from ..db_schemes import GlobalSpecsModel, OptionalSpecsModel, compute_spec_hash
+
+
+# pooled clients per connection string and event loop, a motor client must only be used on the loop it was created on
+_clients: Dict[Tuple[str, Optional[asyncio.AbstractEventLoop]], AsyncIOMotorClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_pooled_client(connection_string: str, max_pool_size: int) -> AsyncIOMotorClient:
+    """
+    Returns the process-wide client of the connection string for the running event loop, creating it on first use.
+    Clients of closed event loops are dropped.
+    """
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    with _clients_lock:
+        for key in [key for key in _clients if key[1] is not None and key[1].is_closed()]:
+            _clients.pop(key).close()
+        client = _clients.get((connection_string, loop))
+        if client is None:
+            client = AsyncIOMotorClient(connection_string, maxPoolSize=max_pool_size)
+            _clients[(connection_string, loop)] = client
+        return client
+
+
+async def close_pooled_clients(running_loop_only: bool = False):
+    """
+    Closes all pooled clients, e.g. when the service shuts down. With running_loop_only, only the clients of the running
+    event loop are closed, so each client can be closed on the loop it was used on.
+    """
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        keys = [key for key in _clients if not running_loop_only or key[1] is loop]
+        clients = [_clients.pop(key) for key in keys]
+    for client in clients:
+        close_func = client.close()
+        if asyncio.iscoroutine(close_func):
+            await close_func
 
 
 def handle_connection(func):
     @functools.wraps(func)
     async def wrapper(self, collection_name: str, *args, **kwargs):
-        # establish connection
+        # the pooled client of the running event loop stays connected between operations
         await self.connect()
 
         collection = self.database.get_collection(collection_name)
@@ -27,8 +70,6 @@ def handle_connection(func):
         else:
             logging.error(f"Collection '{collection_name}' does not exists in database '{self.mongodb_database}'.")
 
-        # tear down connection
-        await self.disconnect(kwargs.get("session", None) is not None)
         return result
 
     return wrapper
@@ -44,6 +85,7 @@ class MongoApi(DatabaseApi):
                                        f"{self.settings.mongodb_endpoint}:{self.settings.mongodb_port}"
                                        f"/{self.settings.mongodb_database}?{self.settings.mongodb_connection_params}")
 
+        # an explicitly set client is used instead of the pooled one
         self.client: Optional[AsyncIOMotorClient] = None
         self.database: Optional[Any] = None
 
@@ -63,28 +105,37 @@ class MongoApi(DatabaseApi):
                                                                             exc_info=exc)
 
     async def connect(self):
-        self.get_client()
         logging.debug(f"Connecting to database '{self.mongodb_database}'...")
-        self.database = self.client[self.mongodb_database]
+        self.database = self.get_client()[self.mongodb_database]
 
     async def disconnect(self, active_session: bool = False):
         if not active_session:
             await self.close_client()
         logging.debug(f"Disconnecting from database '{self.mongodb_database}'...")
-        self.database = None
 
     def get_client(self) -> AsyncIOMotorClient:
-        if self.client is None:
-            self.client = AsyncIOMotorClient(self.connection_string)
-        return self.client
+        if self.client is not None:
+            return self.client
+        return get_pooled_client(self.connection_string, self.settings.mongodb_max_pool_size)
 
     async def close_client(self):
-        if self.client is not None:
-            close_func = self.client.close()
-            if asyncio.iscoroutine(close_func):
-                await close_func
+        """
+        Releases the client of this instance. Pooled clients stay open for other instances and are closed by
+        close_pooled_clients on shutdown.
+        """
         self.client = None
 
+    async def ping(self) -> bool:
+        """
+        Checks that the database is reachable with the pooled client.
+        """
+        try:
+            await self.get_client().admin.command("ping")
+            return True
+        except BaseException as e:
+            self.error_log("admin", "Could not ping database", err=e)
+            return False
+
     @handle_connection
     async def find(self, collection_name: str, *args, catch_error: bool = True, **kwargs):
         collection = self.database.get_collection(collection_name)
@@ -220,6 +271,35 @@ class MongoApi(DatabaseApi):
                 raise e
         return acknowledged
 
+    @handle_connection
+    async def bulk_write(self, collection_name: str, operations: List[Any], *args, ordered: bool = False,
+                         catch_error: bool = True, **kwargs) -> Optional[BulkWriteResult]:
+        """
+        execute several write operations with one command
+        :param collection_name: collection name
+        :param operations: pymongo write operations, e.g. UpdateOne or InsertOne
+        :param args:
+        :param ordered: whether to stop at the first failed operation, unordered writes may be applied in any order
+        :param catch_error:
+        :param kwargs:
+        :return: the result, or None if the write failed
+        """
+        collection = self.database.get_collection(collection_name)
+        result: Optional[BulkWriteResult] = None
+        try:
+            result = await collection.bulk_write(operations, *args, ordered=ordered, **kwargs)
+            self.debug_log(collection_name, (f"Bulk write of {len(operations)} operations: "
+                                             f"inserted {result.inserted_count}, "
+                                             f"matched {result.matched_count}, "
+                                             f"modified {result.modified_count}, "
+                                             f"upserted {result.upserted_count} documents"))
+        except BaseException as e:
+            self.error_log(collection_name, f"Could not execute 'bulk_write'-command in '{collection_name}' "
+                                            f"with {len(operations)} operations", err=e)
+            if not catch_error:
+                raise e
+        return result
+
     @handle_connection
     async def aggregate(self, collection_name: str, *args, catch_error: bool = True, **kwargs):
         collection = self.database.get_collection(collection_name)
@@ -234,3 +314,160 @@ class MongoApi(DatabaseApi):
             if not catch_error:
                 raise e
         return results
+
+    @handle_connection
+    async def create_index_models(self, collection_name: str, index_models: List[IndexModel],
+                                  catch_error: bool = True) -> List[str]:
+        """
+        create indexes, existing indexes with the same name and keys are left as they are
+        :param collection_name: collection name
+        :param index_models: the indexes to create
+        :param catch_error:
+        :return: the names of the indexes
+        """
+        collection = self.database.get_collection(collection_name)
+        names: List[str] = []
+        try:
+            names = await collection.create_indexes(index_models)
+            self.debug_log(collection_name, f"Created indexes {names} on '{collection_name}'")
+        except BaseException as e:
+            self.error_log(collection_name, f"Could not create indexes on '{collection_name}'", err=e)
+            if not catch_error:
+                raise e
+        return names
+
+    @handle_connection
+    async def explain_aggregate(self, collection_name: str, pipeline: List[dict], catch_error: bool = True) -> dict:
+        """
+        explain the query plan of an aggregation, e.g. to check that it uses an index
+        :param collection_name: collection name
+        :param pipeline: the aggregation pipeline
+        :param catch_error:
+        :return: the explain output, or an empty dict if explain failed
+        """
+        result: dict = {}
+        try:
+            result = await self.database.command("explain",
+                                                 {"aggregate": collection_name, "pipeline": pipeline, "cursor": {}},
+                                                 verbosity="queryPlanner")
+        except BaseException as e:
+            self.error_log(collection_name, f"Could not explain aggregation on '{collection_name}'", err=e)
+            if not catch_error:
+                raise e
+        return result
+
+    @handle_connection
+    async def backfill_spec_hashes(self, collection_name: str, batch_size: int = 1000, rehash: bool = False,
+                                   catch_error: bool = True) -> int:
+        """
+        compute the spec hash of executions without one, i.e. executions written before the field existed, so the
+        indexed lookups find them. The executions are streamed and updated in batches.
+        :param collection_name: collection name
+        :param batch_size: number of executions read and updated per batch
+        :param rehash: also recompute the hashes that are stored already and update outdated ones, e.g. after the spec
+        models changed. This reads the whole collection, see services.enel_service.migrate_spec_hashes
+        :param catch_error:
+        :return: the number of updated executions
+        """
+        collection = self.database.get_collection(collection_name)
+        filter_dict: dict = {"global_specs": {"$exists": True}}
+        if not rehash:
+            filter_dict["spec_hash"] = {"$exists": False}
+        count: int = 0
+        operations: list = []
+        try:
+            async for execution in collection.find(filter_dict,
+                                                   {"spec_hash": 1, "global_specs": 1, "optional_specs": 1},
+                                                   batch_size=batch_size):
+                spec_hash: str = compute_spec_hash(GlobalSpecsModel(**execution["global_specs"]),
+                                                   OptionalSpecsModel(**execution.get("optional_specs", {})))
+                if execution.get("spec_hash") != spec_hash:
+                    operations.append(UpdateOne({"_id": execution["_id"]}, {"$set": {"spec_hash": spec_hash}}))
+                if len(operations) == batch_size:
+                    await self.bulk_write(collection_name, operations, catch_error=False)
+                    count += len(operations)
+                    operations = []
+            if operations:
+                await self.bulk_write(collection_name, operations, catch_error=False)
+                count += len(operations)
+        except BaseException as e:
+            self.error_log(collection_name, f"Could not backfill the spec hashes in '{collection_name}'", err=e)
+            if not catch_error:
+                raise e
+        return count
+
+    @staticmethod
+    async def create_indexes(catch_error: bool = True):
+        """
+        create the indexes of the Enel collections and backfill the missing spec hashes on startup
+        :param catch_error: if False, a failed backfill or index creation is raised, e.g. to retry it later
+        """
+        mongo_api: MongoApi = MongoApi()
+        job_collection: str = mongo_api.settings.mongodb_job_execution_collection
+
+        count: int = await mongo_api.backfill_spec_hashes(job_collection, catch_error=catch_error)
+        if count:
+            logging.info(f"Computed the spec hash of {count} documents in '{job_collection}'.")
+
+        # successor lookups match jobs with the same specs following a job id, job updates and fine-tuning match the
+        # jobs of an application execution
+        await mongo_api.create_index_models(job_collection, [
+            IndexModel([("spec_hash", pymongo.ASCENDING), ("job_id", pymongo.ASCENDING)], name="spec_hash_job_id"),
+            IndexModel([("application_execution_id", pymongo.ASCENDING), ("job_id", pymongo.ASCENDING)],
+                       name="application_execution_id_job_id")
+        ], catch_error=catch_error)
+        await mongo_api.close_client()
+
+
+class BulkWriteCoalescer:
+    """
+    Coalesces the writes of concurrent coroutines into one unordered bulk write per collection, so the database sees
+    fewer, larger writes under load. Writes issued in the same iteration of the event loop, or within flush_interval
+    seconds, are sent together. As the writes of a batch may be applied in any order, they must not depend on each
+    other.
+    """
+
+    def __init__(self, mongo_api: MongoApi, flush_interval: float = 0, max_batch_size: int = 1000):
+        self.mongo_api = mongo_api
+        self.flush_interval = flush_interval
+        self.max_batch_size = max_batch_size
+        self.pending: Dict[str, List[Tuple[Any, asyncio.Future]]] = {}
+        self.flush_handle: Optional[asyncio.Handle] = None
+
+    async def write(self, collection_name: str, operation: Any) -> bool:
+        """
+        Queues a write operation and waits until its batch is written.
+        :param collection_name: collection name
+        :param operation: pymongo write operation, e.g. UpdateOne
+        :return: whether the operation was acknowledged
+        """
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future = loop.create_future()
+        batch = self.pending.setdefault(collection_name, [])
+        batch.append((operation, future))
+        if len(batch) >= self.max_batch_size:
+            loop.create_task(self.write_batch(collection_name, self.pending.pop(collection_name)))
+        elif self.flush_handle is None:
+            self.flush_handle = loop.call_later(self.flush_interval, self.flush)
+        return await future
+
+    def flush(self):
+        self.flush_handle = None
+        pending, self.pending = self.pending, {}
+        for collection_name, batch in pending.items():
+            asyncio.get_running_loop().create_task(self.write_batch(collection_name, batch))
+
+    async def write_batch(self, collection_name: str, batch: List[Tuple[Any, asyncio.Future]]):
+        failed: set = set()
+        try:
+            await self.mongo_api.bulk_write(collection_name, [operation for operation, _ in batch], catch_error=False)
+        except BulkWriteError as e:
+            # the other operations of an unordered bulk write are applied nevertheless
+            failed = {error["index"] for error in e.details.get("writeErrors", [])}
+            self.mongo_api.error_log(collection_name, f"{len(failed)} of {len(batch)} coalesced writes failed", err=e)
+        except BaseException as e:
+            failed = set(range(len(batch)))
+            self.mongo_api.error_log(collection_name, f"{len(batch)} coalesced writes failed", err=e)
+        for index, (_, future) in enumerate(batch):
+            if not future.done():
+                future.set_result(index not in failed)
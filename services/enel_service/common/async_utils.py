@@ -1,6 +1,10 @@
 import asyncio
+import atexit
 import functools
+import threading
 from asyncio import Task
+from concurrent.futures import Future
+from typing import Coroutine, Dict
 
 
 def _to_task(future, loop):
@@ -36,3 +40,57 @@ def async_return(result):
     f = asyncio.Future()
     f.set_result(result)
     return f
+
+
+class BackgroundEventLoop:
+    """
+    An event loop running forever in a daemon thread. Coroutines are submitted from synchronous code, e.g. the worker
+    threads of the bridge, instead of creating and tearing down an event loop per call with asyncio.run.
+    """
+
+    def __init__(self, name: str):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name=name, daemon=True)
+        self.thread.start()
+
+    def submit(self, coroutine: Coroutine) -> Future:
+        """
+        Schedules the coroutine on the loop and returns a future of its result.
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def run(self, coroutine: Coroutine, timeout: float = None):
+        """
+        Runs the coroutine on the loop and blocks until its result is available.
+        """
+        return self.submit(coroutine).result(timeout)
+
+    def stop(self):
+        if self.loop.is_closed():
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+_background_loops: Dict[str, BackgroundEventLoop] = {}
+_background_loops_lock = threading.Lock()
+
+
+def get_background_loop(name: str = "enel-event-loop") -> BackgroundEventLoop:
+    """
+    Returns the process-wide background event loop of the given name, starting it on first use or after it was
+    stopped. All loops are stopped when the process exits.
+    """
+    with _background_loops_lock:
+        if name not in _background_loops or _background_loops[name].loop.is_closed():
+            _background_loops[name] = BackgroundEventLoop(name)
+        return _background_loops[name]
+
+
+@atexit.register
+def stop_background_loops():
+    with _background_loops_lock:
+        for loop in _background_loops.values():
+            loop.stop()
+        _background_loops.clear()
@@ -72,6 +72,7 @@ class MongoSettings(BaseSettings):
     mongodb_password: Optional[str] = "servicerootpassword"
     mongodb_application_execution_collection: Optional[str] = "application_execution"
     mongodb_job_execution_collection: Optional[str] = "job_execution"
+    mongodb_max_pool_size: Optional[int] = 100
 
     @staticmethod
     @lru_cache()
@@ -1,8 +1,9 @@
+import hashlib
+import json
 from datetime import datetime
-from typing import List, Dict, Union, Optional
-from wsgiref.validate import validator
+from typing import List, Dict, Union, Optional, NamedTuple
 
-from pydantic import BaseModel, Field, validate_model
+from pydantic import BaseModel, Field, validate_model, validator
 
 
 class GlobalSpecsModel(BaseModel):
@@ -59,6 +60,26 @@ class MetricsModel(BaseModel):
         allow_population_by_field_name = True
 
 
+def compute_spec_hash(global_specs: BaseModel, optional_specs: BaseModel) -> str:
+    """
+    Hash of all global and optional specs, executions with the same specs have the same hash.
+    """
+    specs: str = json.dumps([global_specs.dict(), optional_specs.dict()], sort_keys=True, default=str)
+    return hashlib.sha1(specs.encode()).hexdigest()
+
+
+def spec_filter(global_specs: BaseModel, optional_specs: BaseModel) -> dict:
+    """
+    Filter for executions with the given specs. The indexed spec hash narrows the executions down, the specs themselves
+    rule out hash collisions.
+    """
+    return {
+        "spec_hash": compute_spec_hash(global_specs, optional_specs),
+        **{f"global_specs.{k}": v for k, v in global_specs.dict().items()},
+        **{f"optional_specs.{k}": v for k, v in optional_specs.dict().items()}
+    }
+
+
 class ApplicationSubmissionModel(BaseModel):
     global_specs: GlobalSpecsModel = Field(...)
     optional_specs: OptionalSpecsModel = Field(...)
@@ -96,6 +117,15 @@ class ApplicationExecutionModel(ApplicationSubmissionModel, CoreDataModel):
     created_at: datetime = Field(default=None)
     updated_at: datetime = Field(default=None)
 
+    # hash of the specs, computed whenever the model is created and thus written with it
+    spec_hash: str = Field(default=None)
+
+    @validator("spec_hash", always=True)
+    def set_spec_hash(cls, v, values):
+        if values.get("global_specs") is None or values.get("optional_specs") is None:
+            return v
+        return compute_spec_hash(values["global_specs"], values["optional_specs"])
+
     class Config:
         allow_population_by_field_name = True
 
@@ -125,3 +155,63 @@ class JobExecutionModel(ApplicationExecutionModel):
     stages: Dict[str, StageDataModel] = Field(default={})
     # time required for rescaling. In the default case, we dont have a rescaling
     rescaling_time_ratio: float = Field(default=0.0, ge=0.0)
+
+
+class AppRecord(NamedTuple):
+    """
+    Read-only subset of an application execution for hot-path lookups. Only these fields are fetched from the database,
+    and apart from the small specs nothing is parsed or validated.
+    """
+    id: str
+    start_time: Optional[datetime]
+    end_time: Optional[datetime]
+    end_scale_out: Optional[int]
+    global_specs: GlobalSpecsModel
+
+    @classmethod
+    def projection(cls) -> dict:
+        return {field: 1 for field in cls._fields if field != "id"}
+
+    @classmethod
+    def from_document(cls, document: dict) -> "AppRecord":
+        return cls(
+            id=document["_id"],
+            start_time=document.get("start_time"),
+            end_time=document.get("end_time"),
+            end_scale_out=document.get("end_scale_out"),
+            global_specs=GlobalSpecsModel(**document["global_specs"]),
+        )
+
+
+class JobRecord(NamedTuple):
+    """
+    Read-only subset of a job execution for hot-path lookups. Unlike JobExecutionModel, the stages of the job are
+    neither fetched nor validated, which matters for jobs with hundreds of stages.
+    """
+    id: str
+    application_id: Optional[str]
+    application_execution_id: str
+    application_signature: Optional[str]
+    job_id: int
+    end_time: Optional[datetime]
+    end_scale_out: Optional[int]
+    global_specs: GlobalSpecsModel
+    optional_specs: OptionalSpecsModel
+
+    @classmethod
+    def projection(cls) -> dict:
+        return {field: 1 for field in cls._fields if field != "id"}
+
+    @classmethod
+    def from_document(cls, document: dict) -> "JobRecord":
+        return cls(
+            id=document["_id"],
+            application_id=document.get("application_id"),
+            application_execution_id=document["application_execution_id"],
+            application_signature=document.get("application_signature"),
+            job_id=document["job_id"],
+            end_time=document.get("end_time"),
+            end_scale_out=document.get("end_scale_out"),
+            global_specs=GlobalSpecsModel(**document["global_specs"]),
+            optional_specs=OptionalSpecsModel(**document.get("optional_specs", {})),
+        )
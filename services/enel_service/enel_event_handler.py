@@ -1,35 +1,85 @@
 import asyncio
+import atexit
 import threading
+from concurrent.futures import Future
+from typing import Optional, List
 
 from bson.objectid import ObjectId
 from pydantic import BaseModel
 
 from .modeling.handlers_training import handle_trigger_model_training
 from .common.db_schemes import ApplicationExecutionModel, GlobalSpecsModel, OptionalSpecsModel, MasterSpecsModel, \
-    WorkerSpecsModel
+    WorkerSpecsModel, JobExecutionModel
 from .submission.handlers import alter_submission_model
 from .modeling.handlers_scale_out import handle_online_scale_out_prediction
+from .modeling.handlers_runtime import get_successor_jobs
 from .modeling.schemes import UpdateInformationRequest, RootDataUpdateModel, OnlineScaleOutPredictionRequest, TriggerModelTrainingRequest
 from .modeling.handlers_updating import handle_update_information
 from .common.apis.hdfs_api import HdfsApi
-from .common.apis.mongo_api import MongoApi
+from .common.apis.mongo_api import MongoApi, BulkWriteCoalescer, close_pooled_clients
+from .common.async_utils import get_background_loop
 from ..event_handler import EventHandler, AppEndMessage, ResponseMessage, JobEndMessage, JobStartMessage, \
     AppStartMessage, EventType, Stage
 
-def run_async_in_background(coroutine):
-    loop = asyncio.new_event_loop()
-    thread = threading.Thread(target=loop.run_until_complete, args=(coroutine,))
-    thread.daemon = True
-    thread.start()
-
 class EnelEventHandler(EventHandler):
+    """
+    Event handler recommending scale-outs with Enel. The handlers are coroutines running on a long-lived event loop of
+    the process; the synchronous EventHandler methods submit them to it and wait for the response. Model training runs
+    on a separate loop, so it does not delay events.
+    """
+
     def __init__(self):
         self.mongo_api = MongoApi()
         self.hdfs_api = HdfsApi()
         self.running_applications: dict[str, RunningApplication] = {}
-        pass
+        # successor jobs are fetched speculatively when a job starts, using a separate client so the speculation does
+        # not interleave with the connection handling of the events
+        self.speculation_mongo_api = MongoApi()
+        self.training_mongo_api = MongoApi()
+        # job end updates of concurrent applications are written together
+        self.coalescer = BulkWriteCoalescer(self.mongo_api)
+        self.loop = get_background_loop()
+        self.training_loop = get_background_loop("enel-training-loop")
+        # successor lookups match on the spec hash, so it has to be backfilled before the first lookup
+        self.indexes_created = False
+        self.indexes_lock = threading.Lock()
+        if self.loop.run(self.mongo_api.ping()):
+            self.create_indexes()
+        else:
+            print("MongoDB is not reachable, events will fail until it is")
+        atexit.register(self.close)
+
+    def create_indexes(self):
+        """
+        Creates the indexes and backfills the spec hashes once. If it fails, it is retried on the next application
+        start.
+        """
+        with self.indexes_lock:
+            if self.indexes_created:
+                return
+            try:
+                self.loop.run(MongoApi.create_indexes(catch_error=False))
+                self.indexes_created = True
+            except Exception as e:
+                print(f"Could not create indexes, retrying on the next application start: {e}")
+
+    def close(self):
+        # the pooled clients, e.g. the one of training_mongo_api, are closed on the loops they were used on, then the
+        # loops are stopped
+        for loop in [self.loop, self.training_loop]:
+            if loop.loop.is_closed():
+                continue
+            loop.run(close_pooled_clients(running_loop_only=True))
+            loop.stop()
 
     def handle_application_start(self, message: AppStartMessage) -> ResponseMessage:
+        self.create_indexes()
+        return self.loop.run(self.handle_application_start_async(message))
+
+    def handle_job_end(self, message: JobEndMessage) -> ResponseMessage:
+        return self.loop.run(self.handle_job_end_async(message))
+
+    async def handle_application_start_async(self, message: AppStartMessage) -> ResponseMessage:
 
         app_event_id = str(ObjectId())
         application = RunningApplication(app_event_id, message)
@@ -37,19 +87,22 @@ class EnelEventHandler(EventHandler):
 
         # add the application
         application_execution_model = application.to_application_execution_model(message)
-        app_model: ApplicationExecutionModel = asyncio.run(
-            alter_submission_model(application_execution_model, self.hdfs_api, self.mongo_api)
+        app_model: ApplicationExecutionModel = await alter_submission_model(
+            application_execution_model, self.hdfs_api, self.mongo_api
         )
         initial_scaleout = app_model.worker_specs.scale_out
         application.scale_out_map[0] = initial_scaleout
+        application.app_model = app_model
 
         # update it
         update_request = application.to_update_information_request(message)
-        asyncio.run(handle_update_information(update_request, self.mongo_api))
+        await handle_update_information(update_request, self.mongo_api)
 
         if message.is_training:
             training_request = application.to_trigger_model_training_request(application_execution_model)
-            run_async_in_background(handle_trigger_model_training(training_request, self.mongo_api, self.hdfs_api))
+            self.training_loop.submit(
+                handle_trigger_model_training(training_request, self.training_mongo_api, self.hdfs_api)
+            )
 
         print(f"Recommending initial scale-out: {initial_scaleout}")
 
@@ -60,9 +113,18 @@ class EnelEventHandler(EventHandler):
 
     def handle_job_start(self, message: JobStartMessage) -> ResponseMessage:
         self.add_job(message)
+        application = self.running_applications.get(message.app_event_id)
+        if application.is_adaptive:
+            application.speculations[message.job_id] = self.loop.submit(
+                get_successor_jobs(application.app_model.global_specs,
+                                   application.app_model.optional_specs,
+                                   application.app_signature,
+                                   message.job_id,
+                                   self.speculation_mongo_api)
+            )
         return self.no_op_job_event_recommendation(message)
 
-    def handle_job_end(self, message: JobEndMessage) -> ResponseMessage:
+    async def handle_job_end_async(self, message: JobEndMessage) -> ResponseMessage:
 
         self.update_job(message)
         job_id = message.job_id
@@ -71,7 +133,10 @@ class EnelEventHandler(EventHandler):
         app_scale_out_map = application.scale_out_map
         app_scale_out_map[next_job_id] = app_scale_out_map.get(next_job_id, app_scale_out_map.get(job_id))
 
-        application.try_handle_online_scale_out_request(message, self.hdfs_api, self.mongo_api)
+        successor_jobs = await application.pop_successor_jobs(job_id)
+        await application.try_handle_online_scale_out_request(
+            message, self.hdfs_api, self.mongo_api, successor_jobs, self.coalescer
+        )
 
         if app_scale_out_map[next_job_id] != app_scale_out_map.get(job_id):
             print(f"Recommending next scale-out: {app_scale_out_map[next_job_id]}")
@@ -125,6 +190,8 @@ class RunningApplication:
         self.job_info_map: dict[str, JobInfo] = {}
         self.scale_out_map: dict[int, int] = {}
         self.lastPredictionLength = -1
+        self.app_model: Optional[ApplicationExecutionModel] = None
+        self.speculations: dict[int, Future] = {}
 
     def put_info_map(self, job_id: int, job_info: JobInfo):
         map_key = self.to_map_key(job_id)
@@ -133,12 +200,28 @@ class RunningApplication:
     def to_map_key(self, job_id: int):
         return f"appId={self.application_id}-jobId={job_id}"
 
-    def try_handle_online_scale_out_request(self, message, hdfs_api: HdfsApi, mongo_api: MongoApi):
+    async def pop_successor_jobs(self, job_id: int) -> Optional[List[JobExecutionModel]]:
+        """
+        Returns the successor jobs fetched when the job started, or None if they have to be fetched again.
+        """
+        speculation = self.speculations.pop(job_id, None)
+        if speculation is None:
+            return None
+        try:
+            # the speculation runs on the same loop, so it is awaited instead of blocking the loop on its result
+            return await asyncio.wrap_future(speculation)
+        except Exception as e:
+            print(f"Could not prefetch successor jobs: {e}")
+            return None
+
+    async def try_handle_online_scale_out_request(self, message, hdfs_api: HdfsApi, mongo_api: MongoApi,
+                                            successor_jobs: Optional[List[JobExecutionModel]] = None,
+                                            coalescer: Optional[BulkWriteCoalescer] = None):
 
         request_prediction = self.is_adaptive
         prediction_request = self.to_online_scale_out_prediction_request(message.job_id, request_prediction)
-        prediction_response = asyncio.run(
-            handle_online_scale_out_prediction(prediction_request, None, hdfs_api, mongo_api)
+        prediction_response = await handle_online_scale_out_prediction(
+            prediction_request, None, hdfs_api, mongo_api, successor_jobs, coalescer
         )
 
         remaining_jobs = list(filter(
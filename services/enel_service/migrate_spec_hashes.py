@@ -0,0 +1,34 @@
+"""
+Recomputes the spec hash of all Enel job executions and updates the outdated ones, e.g. after the spec models changed.
+Executions without a spec hash are hashed when the service starts, this reads the whole collection and is run on
+demand:
+
+    python3 -m services.enel_service.migrate_spec_hashes
+"""
+import asyncio
+
+from .common.apis.mongo_api import MongoApi, close_pooled_clients
+
+BATCH_SIZE = 1000
+
+
+async def migrate(batch_size: int = BATCH_SIZE) -> int:
+    """
+    Re-hashes the job executions in batches. The migration is idempotent, so it can be re-run if interrupted.
+
+    Args:
+        batch_size (int): Number of executions read and updated per batch.
+
+    Returns:
+        int: The number of updated job executions.
+    """
+    mongo_api = MongoApi()
+    try:
+        return await mongo_api.backfill_spec_hashes(mongo_api.settings.mongodb_job_execution_collection, batch_size,
+                                                    rehash=True, catch_error=False)
+    finally:
+        await close_pooled_clients()
+
+
+if __name__ == "__main__":
+    print(f"Updated the spec hash of {asyncio.run(migrate())} job executions")
@@ -6,6 +6,8 @@ import scipy.optimize
 import scipy.spatial
 from numpy.linalg import LinAlgError
 
+from services.ellis_port.nnls import nnls_gram
+
 
 class InterpolationSplits:
     def __init__(self, x, y):
@@ -60,8 +62,10 @@ class Ernest(object):
         x, y = args[0]
         x, y = x.flatten(), y.flatten()
         X = self._fmap(x)
-        coeff, res = sp.optimize.nnls(X, y)
-        self.coeff = coeff
+        try:
+            self.coeff = nnls_gram(X.T @ X, X.T @ y)
+        except (RuntimeError, LinAlgError):
+            self.coeff, res = sp.optimize.nnls(X, y)
         return self
 
     def predict(self, x, y=None):
@@ -80,29 +84,28 @@ class KernelReg(object):
     def _fmap(self, x):
         return np.vstack([x ** i for i in range(self.degree + 1)]).T
 
-    def _predict_single(self, X, y, x, w):
-        XTW = X.T * w
-
-        matrix_x = np.dot(XTW, X) + self.tol * np.eye(X.shape[1])
-        matrix_b = np.dot(XTW, y)
-
+    def _solve(self, A, b):
         try:
-            c = np.linalg.solve(matrix_x, matrix_b)
-        except LinAlgError as err:
-            print("Could not compute solution, so either matrix_x is singular or not square.")
-            print("Will try now with the pseudo-inverse of matrix_x...")
-            c = np.linalg.pinv(matrix_x).dot(matrix_b)
-            print("Success with pseudo-inverse of matrix_x!")
-
-        ypred = np.dot(x, c)
-        return ypred
+            return np.linalg.solve(A, b[..., None])[..., 0]
+        except LinAlgError:
+            # at least one matrix is singular, solve the systems one by one to find them
+            c = np.empty_like(b)
+            for i in range(len(A)):
+                try:
+                    c[i] = np.linalg.solve(A[i], b[i])
+                except LinAlgError:
+                    print("Could not compute solution, so either matrix_x is singular or not square.")
+                    print("Will try now with the pseudo-inverse of matrix_x...")
+                    c[i] = np.linalg.pinv(A[i]).dot(b[i])
+                    print("Success with pseudo-inverse of matrix_x!")
+            return c
 
     def _predict(self, X, y, Xpred, W):
-        n, d = Xpred.shape
-        ypred = np.zeros(n)
-        for i in range(n):
-            ypred[i] = self._predict_single(X, y, Xpred[i], W[i])
-        return ypred
+        # the weighted normal equations (X^T W_i X) c_i = X^T W_i y of all query points, solved as one stack
+        matrix_x = np.einsum('ij,jk,jl->ikl', W, X, X) + self.tol * np.eye(X.shape[1])
+        matrix_b = np.einsum('ij,jk,j->ik', W, X, y)
+        c = self._solve(matrix_x, matrix_b)
+        return np.einsum('ik,ik->i', Xpred, c)
 
     def fit(self, *args, **kwargs):
         x, y = args[0]
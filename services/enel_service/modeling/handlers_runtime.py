@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from typing import List, Optional, Any, Tuple, Dict
 
@@ -8,7 +9,8 @@ from fastapi import HTTPException, status
 from services.enel_service.common.apis.hdfs_api import HdfsApi
 from services.enel_service.common.apis.mongo_api import MongoApi
 from services.enel_service.common.configuration import GeneralSettings, MongoSettings
-from services.enel_service.common.db_schemes import JobExecutionModel
+from services.enel_service.common.db_schemes import JobExecutionModel, GlobalSpecsModel, OptionalSpecsModel, \
+    JobRecord, spec_filter
 from services.enel_service.config.onlinepredictor_config import OnlinePredictorConfig
 from services.enel_service.modeling.datasets import ExecutionDataset
 from services.enel_service.modeling.schemes import OnlineRuntimePredictionResponse
@@ -21,24 +23,18 @@ mongo_settings: MongoSettings = MongoSettings.get_instance()
 onlinepredictor_config: OnlinePredictorConfig = OnlinePredictorConfig()
 
 
-async def handle_online_runtime_prediction(job_execution_id: str,
-                                           hdfs_api: HdfsApi,
-                                           mongo_api: MongoApi):
-    # PREPARATION
-    # get entry from DB
-    db_element: JobExecutionModel = await get_by_execution_id(job_execution_id, mongo_api, scope="job")
-    # get artifacts
-    checkpoint, data_transformer, model_wrapper, model = get_all_artifacts("onlinepredictor",
-                                                                           db_element,
-                                                                           hdfs_api)
-    # get successor jobs
+async def get_successor_jobs(global_specs: GlobalSpecsModel,
+                             optional_specs: OptionalSpecsModel,
+                             application_signature: str,
+                             job_id: int,
+                             mongo_api: MongoApi) -> List[JobExecutionModel]:
+    # get one past execution of each job following the given job
     related_successor_jobs: List[Any] = await mongo_api. \
         aggregate(mongo_settings.mongodb_job_execution_collection, [{
         "$match": {
-            **{f"global_specs.{k}": v for k, v in db_element.global_specs.dict().items()},
-            **{f"optional_specs.{k}": v for k, v in db_element.optional_specs.dict().items()},
-            'application_signature': db_element.application_signature,
-            'job_id': {'$gt': db_element.job_id},
+            **spec_filter(global_specs, optional_specs),
+            'application_signature': application_signature,
+            'job_id': {'$gt': job_id},
             'start_time': {'$exists': True, '$ne': None},
             'end_time': {'$exists': True, '$ne': None}
         }}, {
@@ -49,13 +45,71 @@ async def handle_online_runtime_prediction(job_execution_id: str,
         "$replaceRoot": {
             "newRoot": "$doc"
         }}, {
+        # bookkeeping of past predictions is not needed to predict with the successors
+        "$project": {
+            "fit_time": 0,
+            "predict_time": 0,
+            "preparation_time": 0,
+            "predicted_scale_out": 0,
+            "created_at": 0,
+            "updated_at": 0
+        }}, {
         "$sort": {
             "application_id": pymongo.ASCENDING,
             "job_id": pymongo.ASCENDING
         }}
     ])
 
-    successor_jobs: List[JobExecutionModel] = [JobExecutionModel(**elem_dict) for elem_dict in related_successor_jobs]
+    return [JobExecutionModel(**elem_dict) for elem_dict in related_successor_jobs]
+
+
+def predict_runtimes(db_element: JobRecord,
+                     successor_jobs: List[JobExecutionModel],
+                     data_transformer,
+                     model_wrapper,
+                     model) -> Tuple[List[int], List[List[float]], float]:
+    """
+    Predicts the runtimes of the successor jobs for each scale-out of the job's range. Returns the scale-outs, the
+    predicted runtimes per scale-out and the total prediction time.
+    """
+    scale_out_range, eval_data, db_data = prepare_for_inference(db_element, "online", successor_jobs)
+    data_transformer.fit(eval_data, suffix="training")
+
+    # get predictions
+    total_runtimes_list: List[List[float]] = []
+    total_predict_time: float = 0
+    for scale_out in scale_out_range:
+        new_eval_data: List[CustomData] = [data_transformer(element) for i, element in enumerate(eval_data)
+                                           if db_data[i].end_scale_out == scale_out]
+
+        # batch jobs of each app together in correct order
+        new_eval_data = CustomData.to_app_batch_list(new_eval_data)
+        result: list = model_wrapper.predict(model, new_eval_data)
+        runtimes: torch.Tensor = torch.cat([d["job_runtime_pred"] for d in result if "job_runtime_pred" in d], dim=0)
+        total_predict_time += model_wrapper.predict_time
+        total_runtimes_list.append(sum(runtimes.tolist(), []))
+    return scale_out_range, total_runtimes_list, total_predict_time
+
+
+async def handle_online_runtime_prediction(job_execution_id: str,
+                                           hdfs_api: HdfsApi,
+                                           mongo_api: MongoApi,
+                                           successor_jobs: Optional[List[JobExecutionModel]] = None):
+    # PREPARATION
+    # get entry from DB
+    db_element: JobRecord = await get_by_execution_id(job_execution_id, mongo_api, scope="job", record_type=JobRecord)
+    # get artifacts, loading them from HDFS blocks, so it runs in a thread instead of on the shared event loop
+    checkpoint, data_transformer, model_wrapper, model = await asyncio.to_thread(get_all_artifacts,
+                                                                                 "onlinepredictor",
+                                                                                 db_element,
+                                                                                 hdfs_api)
+    # get successor jobs, unless they were already fetched when the job started
+    if successor_jobs is None:
+        successor_jobs = await get_successor_jobs(db_element.global_specs,
+                                                  db_element.optional_specs,
+                                                  db_element.application_signature,
+                                                  db_element.job_id,
+                                                  mongo_api)
     logging.info(f"Number of successor jobs: {len(successor_jobs)}")
     if len(successor_jobs) <= 1:
         return OnlineRuntimePredictionResponse(scale_outs=[], predicted_job_dict={}, abort=True)
@@ -92,26 +146,14 @@ async def handle_online_runtime_prediction(job_execution_id: str,
 
     fit_time: float = 0.0
     if predecessor_jobs_dataset is not None and len(predecessor_jobs_dataset):
-        model = model_wrapper.fit(model, predecessor_jobs_dataset, checkpoint)
+        # fine-tuning is CPU-bound, so it runs in a thread instead of stalling the events of other applications
+        model = await asyncio.to_thread(model_wrapper.fit, model, predecessor_jobs_dataset, checkpoint)
         fit_time = model_wrapper.fit_time
 
     # PREDICTION
-    scale_out_range, eval_data, db_data = prepare_for_inference(db_element, "online", successor_jobs)
-    data_transformer.fit(eval_data, suffix="training")
-
-    # get predictions
-    total_runtimes_list: List[List[float]] = []
-    total_predict_time: float = 0
-    for scale_out in scale_out_range:
-        new_eval_data: List[CustomData] = [data_transformer(element) for i, element in enumerate(eval_data)
-                                           if db_data[i].end_scale_out == scale_out]
-
-        # batch jobs of each app together in correct order
-        new_eval_data = CustomData.to_app_batch_list(new_eval_data)
-        result: list = model_wrapper.predict(model, new_eval_data)
-        runtimes: torch.Tensor = torch.cat([d["job_runtime_pred"] for d in result if "job_runtime_pred" in d], dim=0)
-        total_predict_time += model_wrapper.predict_time
-        total_runtimes_list.append(sum(runtimes.tolist(), []))
+    scale_out_range, total_runtimes_list, total_predict_time = await asyncio.to_thread(
+        predict_runtimes, db_element, successor_jobs, data_transformer, model_wrapper, model
+    )
 
     if len(total_runtimes_list) != len(scale_out_range):
         logging.error("There are more predicted runtimes than scale-outs!")
@@ -5,9 +5,9 @@ from fastapi import BackgroundTasks
 import logging
 
 from services.enel_service.common.apis.hdfs_api import HdfsApi
-from services.enel_service.common.apis.mongo_api import MongoApi
+from services.enel_service.common.apis.mongo_api import MongoApi, BulkWriteCoalescer
 from services.enel_service.common.configuration import MongoSettings
-from services.enel_service.common.db_schemes import JobExecutionModel, ApplicationExecutionModel
+from services.enel_service.common.db_schemes import JobExecutionModel, AppRecord
 from services.enel_service.modeling.handlers_runtime import handle_online_runtime_prediction
 from services.enel_service.modeling.handlers_updating import handle_update_information
 from services.enel_service.modeling.schemes import \
@@ -20,7 +20,9 @@ mongo_settings: MongoSettings = MongoSettings.get_instance()
 async def handle_online_scale_out_prediction(request: OnlineScaleOutPredictionRequest,
                                              background_tasks: BackgroundTasks | None,
                                              hdfs_api: HdfsApi,
-                                             mongo_api: MongoApi):
+                                             mongo_api: MongoApi,
+                                             successor_jobs: Optional[List[JobExecutionModel]] = None,
+                                             coalescer: Optional[BulkWriteCoalescer] = None):
     logging_prefix: str = f"[Application-Execution-Id: {request.application_execution_id},  " \
                           f"Application-Id: {request.application_id}, " \
                           f"Job-Id: {request.job_id}]"
@@ -35,21 +37,24 @@ async def handle_online_scale_out_prediction(request: OnlineScaleOutPredictionRe
             background_tasks.add_task(handle_update_information, update_information_request, mongo_api)
             return OnlineScaleOutPredictionResponse()
         elif not background_tasks:
-            await handle_update_information(update_information_request, mongo_api)
+            await handle_update_information(update_information_request, mongo_api, coalescer)
             return OnlineScaleOutPredictionResponse()
         else:
             raise ValueError("background_tasks must be either BackgroundTasks or ThreadPoolExecutor")
     else:
-        job_db_element: Optional[JobExecutionModel] = await handle_update_information(update_information_request, mongo_api)
+        job_db_element: Optional[JobExecutionModel] = await handle_update_information(update_information_request,
+                                                                                      mongo_api, coalescer)
     if job_db_element is not None:
-        app_db_element: ApplicationExecutionModel = ApplicationExecutionModel(
-            **(await mongo_api.find_one(
+        app_db_element: AppRecord = AppRecord.from_document(
+            await mongo_api.find_one(
                 mongo_settings.mongodb_application_execution_collection,
-                {"_id": job_db_element.application_execution_id})))
+                {"_id": job_db_element.application_execution_id},
+                AppRecord.projection()))
 
         response: OnlineRuntimePredictionResponse = await handle_online_runtime_prediction(job_db_element.id,
                                                                                            hdfs_api,
-                                                                                           mongo_api)
+                                                                                           mongo_api,
+                                                                                           successor_jobs)
 
         # if not enough successor or predecessor jobs, we simply return
         if response.abort:
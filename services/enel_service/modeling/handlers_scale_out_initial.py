@@ -1,8 +1,9 @@
+import asyncio
 import datetime
 import logging
 
 from fastapi import HTTPException, status
-from typing import List, Union, Any
+from typing import List, Union, Any, Tuple
 import numpy as np
 import pymongo
 import torch
@@ -10,7 +11,7 @@ import torch
 from services.enel_service.common.apis.hdfs_api import HdfsApi
 from services.enel_service.common.apis.mongo_api import MongoApi
 from services.enel_service.common.configuration import MongoSettings, GeneralSettings
-from services.enel_service.common.db_schemes import ApplicationExecutionModel, JobExecutionModel
+from services.enel_service.common.db_schemes import ApplicationExecutionModel, JobExecutionModel, spec_filter
 from services.enel_service.config.onlinepredictor_config import OnlinePredictorConfig
 from services.enel_service.modeling.bell_utils import AllocationAssistant
 from services.enel_service.modeling.schemes import OfflineScaleOutPredictionResponse, OfflineRuntimePredictionResponse
@@ -23,18 +24,53 @@ mongo_settings: MongoSettings = MongoSettings.get_instance()
 onlinepredictor_config: OnlinePredictorConfig = OnlinePredictorConfig()
 
 
+def predict_initial_runtimes(first_job_dummy: JobExecutionModel,
+                             successor_jobs: List[JobExecutionModel],
+                             scale_outs: List[int],
+                             durations: List[float],
+                             data_transformer,
+                             model_wrapper,
+                             model) -> Tuple[List[int], List[float], float]:
+    """
+    Predicts the total runtime of the application for each scale-out of its range, the first job with Bell and the
+    successor jobs with the model. Returns the scale-outs, the predicted runtimes and the total prediction time.
+    """
+    scale_out_range, eval_data, db_data = prepare_for_inference(first_job_dummy, "initial", successor_jobs)
+    data_transformer.fit(eval_data, suffix="training")
+
+    bell_pred_times = AllocationAssistant()\
+        .fit((np.array(scale_outs), np.array(durations)))\
+        .predict((np.array(scale_out_range), None))
+
+    # get predictions
+    total_runtimes_list: List[float] = []
+    total_predict_time: float = 0
+    for scale_out in scale_out_range:
+        new_eval_data: List[CustomData] = [data_transformer(element) for i, element in enumerate(eval_data)
+                                           if db_data[i].end_scale_out == scale_out]
+
+        # batch jobs of each app together in correct order
+        new_eval_data = CustomData.to_app_batch_list(new_eval_data)
+
+        result: list = model_wrapper.predict(model, new_eval_data)
+        runtimes: torch.Tensor = torch.cat([d["job_runtime_pred"] for d in result if "job_runtime_pred" in d], dim=0)
+        total_predict_time += model_wrapper.predict_time
+        total_runtimes_list.append(sum(sum(runtimes.tolist(), [])) + bell_pred_times[scale_out_range.index(scale_out)])
+    return scale_out_range, total_runtimes_list, total_predict_time
+
+
 async def handle_initial_runtime_prediction(app_db_element: ApplicationExecutionModel, hdfs_api, mongo_api):
-    # get artifacts
-    checkpoint, data_transformer, model_wrapper, model = get_all_artifacts("onlinepredictor",
-                                                                           app_db_element,
-                                                                           hdfs_api)
+    # get artifacts, loading them from HDFS blocks, so it runs in a thread instead of on the shared event loop
+    checkpoint, data_transformer, model_wrapper, model = await asyncio.to_thread(get_all_artifacts,
+                                                                                 "onlinepredictor",
+                                                                                 app_db_element,
+                                                                                 hdfs_api)
 
     # get successor jobs
     first_job_past_values: List[Any] = await mongo_api. \
         aggregate(mongo_settings.mongodb_job_execution_collection, [{
         "$match": {
-            **{f"global_specs.{k}": v for k, v in app_db_element.global_specs.dict().items()},
-            **{f"optional_specs.{k}": v for k, v in app_db_element.optional_specs.dict().items()},
+            **spec_filter(app_db_element.global_specs, app_db_element.optional_specs),
             'application_signature': app_db_element.global_specs.algorithm_name,
             'job_id': {'$eq': 0},
             'start_time': {'$exists': True, '$ne': None},
@@ -67,8 +103,7 @@ async def handle_initial_runtime_prediction(app_db_element: ApplicationExecution
     related_successor_jobs: List[Any] = await mongo_api. \
         aggregate(mongo_settings.mongodb_job_execution_collection, [{
         "$match": {
-            **{f"global_specs.{k}": v for k, v in app_db_element.global_specs.dict().items()},
-            **{f"optional_specs.{k}": v for k, v in app_db_element.optional_specs.dict().items()},
+            **spec_filter(app_db_element.global_specs, app_db_element.optional_specs),
             'application_signature': app_db_element.global_specs.algorithm_name,
             'job_id': {'$gt': 0},
             'start_time': {'$exists': True, '$ne': None},
@@ -98,27 +133,10 @@ async def handle_initial_runtime_prediction(app_db_element: ApplicationExecution
     })
 
     # PREDICTION
-    scale_out_range, eval_data, db_data = prepare_for_inference(first_job_dummy, "initial", successor_jobs)
-    data_transformer.fit(eval_data, suffix="training")
-
-    bell_pred_times = AllocationAssistant()\
-        .fit((np.array(scale_outs), np.array(durations)))\
-        .predict((np.array(scale_out_range), None))
-
-    # get predictions
-    total_runtimes_list: List[float] = []
-    total_predict_time: float = 0
-    for scale_out in scale_out_range:
-        new_eval_data: List[CustomData] = [data_transformer(element) for i, element in enumerate(eval_data)
-                                           if db_data[i].end_scale_out == scale_out]
-
-        # batch jobs of each app together in correct order
-        new_eval_data = CustomData.to_app_batch_list(new_eval_data)
-
-        result: list = model_wrapper.predict(model, new_eval_data)
-        runtimes: torch.Tensor = torch.cat([d["job_runtime_pred"] for d in result if "job_runtime_pred" in d], dim=0)
-        total_predict_time += model_wrapper.predict_time
-        total_runtimes_list.append(sum(sum(runtimes.tolist(), [])) + bell_pred_times[scale_out_range.index(scale_out)])
+    scale_out_range, total_runtimes_list, total_predict_time = await asyncio.to_thread(
+        predict_initial_runtimes, first_job_dummy, successor_jobs, scale_outs, durations, data_transformer,
+        model_wrapper, model
+    )
 
     if len(total_runtimes_list) != len(scale_out_range):
         logging.error("There are more predicted runtimes than scale-outs!")
@@ -1,9 +1,12 @@
+import asyncio
+import datetime
 import logging
-from typing import Optional, Union
+from typing import Optional, Union, Tuple
 from bson import ObjectId
+from pymongo import UpdateOne
 
 from services.enel_service.common.apis.kubernetes_api import update_dict_func
-from services.enel_service.common.apis.mongo_api import MongoApi
+from services.enel_service.common.apis.mongo_api import MongoApi, BulkWriteCoalescer
 from services.enel_service.common.configuration import MongoSettings
 from services.enel_service.common.db_schemes import JobExecutionModel, ApplicationExecutionModel
 from services.enel_service.modeling.schemes import UpdateInformationRequest, RootDataUpdateModel
@@ -72,24 +75,7 @@ async def update_job_object(request: UpdateInformationRequest, mongo_api: MongoA
         "application_id": request.application_id,
         "job_id": request.job_id
     }, catch_error=False, session=session)
-    create: bool = False
-    # else: craft from corresponding app (id)
-    if old_job_db_result is None:
-        create = True
-        old_job_db_result = app_db_element.dict()
-        old_job_db_result["job_id"] = request.job_id
-        old_job_db_result["application_execution_id"] = request.application_execution_id
-        old_job_db_result["_id"] = str(ObjectId())
-        for dict_key in ["attempt_id", "fit_time", "predict_time", "preparation_time",
-                         "predicted_scale_out", "created_at", "updated_at"]:
-            old_job_db_result.pop(dict_key, None)
-
-    old_job_db_element: JobExecutionModel = JobExecutionModel(**old_job_db_result)
-    # update with remote data
-    new_job_db_result: dict = update_dict_func(old_job_db_element.dict(),
-                                               request.updates.dict(exclude_none=True, exclude_defaults=True),
-                                               check_existence=False)
-    new_job_db_element = JobExecutionModel(**new_job_db_result)
+    old_job_db_element, new_job_db_element, create = merge_job_object(request, app_db_element, old_job_db_result)
 
     if str(old_job_db_element.dict()) != str(new_job_db_element.dict()):
         logging.info(f"Update Job DB-element with "
@@ -123,7 +109,86 @@ async def update_job_object(request: UpdateInformationRequest, mongo_api: MongoA
     return new_job_db_element, ack
 
 
-async def handle_update_information(request: UpdateInformationRequest, mongo_api: MongoApi):
+def merge_job_object(request: UpdateInformationRequest, app_db_element: ApplicationExecutionModel,
+                     old_job_db_result: Optional[dict]) -> Tuple[JobExecutionModel, JobExecutionModel, bool]:
+    """
+    Applies the updates of the request to the job, which is crafted from its application if it does not exist yet.
+    Returns the old and the updated job and whether the job has to be created.
+    """
+    create: bool = False
+    # else: craft from corresponding app (id)
+    if old_job_db_result is None:
+        create = True
+        old_job_db_result = app_db_element.dict()
+        old_job_db_result["job_id"] = request.job_id
+        old_job_db_result["application_execution_id"] = request.application_execution_id
+        old_job_db_result["_id"] = str(ObjectId())
+        for dict_key in ["attempt_id", "fit_time", "predict_time", "preparation_time",
+                         "predicted_scale_out", "created_at", "updated_at"]:
+            old_job_db_result.pop(dict_key, None)
+
+    old_job_db_element: JobExecutionModel = JobExecutionModel(**old_job_db_result)
+    # update with remote data
+    new_job_db_result: dict = update_dict_func(old_job_db_element.dict(),
+                                               request.updates.dict(exclude_none=True, exclude_defaults=True),
+                                               check_existence=False)
+    return old_job_db_element, JobExecutionModel(**new_job_db_result), create
+
+
+async def update_job_object_batched(request: UpdateInformationRequest, mongo_api: MongoApi,
+                                    coalescer: BulkWriteCoalescer):
+    """
+    Same as update_job_object, but without a transaction: the app and the job are read concurrently, and the job
+    upsert and the app update are written concurrently through the coalescer, which merges them with the writes of
+    other applications. The app update is conditional on its end time, so it can be applied in any order.
+    """
+    job_collection: str = mongo_settings.mongodb_job_execution_collection
+    app_collection: str = mongo_settings.mongodb_application_execution_collection
+    job_filter: dict = {
+        "application_execution_id": request.application_execution_id,
+        "application_id": request.application_id,
+        "job_id": request.job_id
+    }
+
+    app_db_result, old_job_db_result = await asyncio.gather(
+        mongo_api.find_one(app_collection, {"_id": request.application_execution_id}, catch_error=False),
+        mongo_api.find_one(job_collection, job_filter, catch_error=False)
+    )
+    if app_db_result is None:
+        logging.error(f"Could not find App DB-element with "
+                      f"Application-Execution-Id '{request.application_execution_id}'.")
+        return None, False
+
+    app_db_element: ApplicationExecutionModel = ApplicationExecutionModel(**app_db_result)
+    old_job_db_element, new_job_db_element, create = merge_job_object(request, app_db_element, old_job_db_result)
+    if str(old_job_db_element.dict()) == str(new_job_db_element.dict()):
+        return new_job_db_element, True
+
+    logging.info(f"Update Job DB-element and App DB-element with "
+                 f"Application-Execution-Id '{request.application_execution_id}'...")
+    updated_at: datetime.datetime = datetime.datetime.now()
+    job_update: dict = {**new_job_db_element.dict(by_alias=True, exclude_none=True), "updated_at": updated_at}
+    if create:
+        job_update["created_at"] = updated_at
+    # use end_time and end_scale_out from this job, unless the app already ended later
+    app_filter: dict = {
+        "_id": request.application_execution_id,
+        "$or": [{"end_time": None}, {"end_time": {"$lt": new_job_db_element.end_time}}]
+    }
+    app_update: dict = {
+        "end_time": new_job_db_element.end_time,
+        "end_scale_out": new_job_db_element.end_scale_out,
+        "updated_at": updated_at
+    }
+    job_ack, app_ack = await asyncio.gather(
+        coalescer.write(job_collection, UpdateOne(job_filter, {"$set": job_update}, upsert=True)),
+        coalescer.write(app_collection, UpdateOne(app_filter, {"$set": app_update}))
+    )
+    return new_job_db_element, job_ack and app_ack
+
+
+async def handle_update_information(request: UpdateInformationRequest, mongo_api: MongoApi,
+                                    coalescer: Optional[BulkWriteCoalescer] = None):
     # extract infos
     application_execution_id: str = request.application_execution_id
     application_id: str = request.application_id
@@ -141,14 +206,18 @@ async def handle_update_information(request: UpdateInformationRequest, mongo_api
     db_element: Union[ApplicationExecutionModel, JobExecutionModel, None] = None
     ack: bool = False
 
-    async with await mongo_api.get_client().start_session() as session:
-        if update_event == "APPLICATION_START":
-            db_element, ack = await session.with_transaction(lambda s: update_application_object(request, mongo_api, s))
-        elif update_event == "JOB_END":
-            db_element, ack = await session.with_transaction(lambda s: update_job_object(request, mongo_api, s))
-        else:
-            logging.error(f"Unknown case! Update-Event = {update_event}")
-    await mongo_api.close_client()
+    if update_event == "JOB_END" and coalescer is not None:
+        db_element, ack = await update_job_object_batched(request, mongo_api, coalescer)
+    else:
+        async with await mongo_api.get_client().start_session() as session:
+            if update_event == "APPLICATION_START":
+                db_element, ack = await session.with_transaction(
+                    lambda s: update_application_object(request, mongo_api, s))
+            elif update_event == "JOB_END":
+                db_element, ack = await session.with_transaction(lambda s: update_job_object(request, mongo_api, s))
+            else:
+                logging.error(f"Unknown case! Update-Event = {update_event}")
+        await mongo_api.close_client()
 
     if db_element is not None and ack:
         return db_element
@@ -1,7 +1,7 @@
 import copy
 import logging
 from functools import partial, lru_cache
-from typing import Optional, Union, Any, List
+from typing import Optional, Union, Any, List, Type
 
 from bson import ObjectId
 from fastapi import HTTPException, status
@@ -12,7 +12,8 @@ from services.enel_service.common.apis.mongo_api import MongoApi
 from services.enel_service.common.configuration import HdfsSettings, MongoSettings, GeneralSettings, PredictionSettings
 
 # load hdfs settings
-from services.enel_service.common.db_schemes import JobExecutionModel, ApplicationExecutionModel, MetricsModel
+from services.enel_service.common.db_schemes import JobExecutionModel, ApplicationExecutionModel, MetricsModel, \
+    AppRecord, JobRecord
 from services.enel_service.config.onlinepredictor_config import OnlinePredictorConfig
 from services.enel_service.modeling.model_wrappers import OnlinePredictorModel
 from services.enel_service.modeling.models import AutoEncoder
@@ -69,20 +70,35 @@ def save_artifact(hdfs_api: HdfsApi, obj: any, file_name: str):
                   target_dir=hdfs_settings.hdfs_pretrained_models_subdir)
 
 
-async def get_by_execution_id(execution_id: str, mongo_api: MongoApi, scope: str = "application"):
+async def get_by_execution_id(execution_id: str, mongo_api: MongoApi, scope: str = "application",
+                              record_type: Optional[Type[Union[AppRecord, JobRecord]]] = None):
+    """
+    get an application or job by its id
+    :param execution_id: id of the application or job execution
+    :param mongo_api:
+    :param scope: "application" or "job"
+    :param record_type: if given, only the fields of this lightweight record are fetched and returned as such a record
+    :return: the full model, or a record of record_type
+    """
     target_collection: str = mongo_settings.mongodb_application_execution_collection
     if scope != "application":
         target_collection = mongo_settings.mongodb_job_execution_collection
 
+    # fetch only the fields of the record instead of the whole document
+    projection: tuple = (record_type.projection(),) if record_type is not None else ()
     db_element: Optional[Any] = await mongo_api.find_one(target_collection,
-                                                         {"_id": execution_id})
+                                                         {"_id": execution_id},
+                                                         *projection)
     if db_element is None:
         raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED,
                             detail="No element found in DB with specified Id.")
+    if record_type is not None:
+        return record_type.from_document(db_element)
     return JobExecutionModel(**db_element) if scope != "application" else ApplicationExecutionModel(**db_element)
 
 
-def get_all_artifacts(model_name: str, db_element: Union[ApplicationExecutionModel, JobExecutionModel, str],
+def get_all_artifacts(model_name: str,
+                      db_element: Union[ApplicationExecutionModel, JobExecutionModel, JobRecord, str],
                       hdfs_api: HdfsApi):
     get_artifact = partial(load_artifact, hdfs_api)
     strict: bool = general_settings.evaluation_mode != "TEST"
@@ -138,7 +154,7 @@ def get_all_artifacts(model_name: str, db_element: Union[ApplicationExecutionMod
     return checkpoint, data_transformer, model_wrapper, model
 
 
-def prepare_for_inference(db_element: Union[ApplicationExecutionModel, JobExecutionModel],
+def prepare_for_inference(db_element: Union[ApplicationExecutionModel, JobExecutionModel, JobRecord],
                           prediction_type: str, successor_jobs: Optional[List[JobExecutionModel]]):
     if prediction_type not in ["initial", "online", "offline"]:
         raise ValueError(f"'prediction_type' must be one of ['initial', 'online', 'offline']")
@@ -1,4 +1,6 @@
-from fastapi import FastAPI
+import logging
+
+from fastapi import FastAPI, HTTPException, status
 
 
 def start_server():
@@ -7,6 +9,7 @@ def start_server():
     from submission.routes import router as submission_router
     from submission.routes import metadata as submission_metadata
     from common.exception_handler import register_exception_handler
+    from common.apis.mongo_api import MongoApi, close_pooled_clients
 
     my_app = FastAPI(
         title="DRMS",
@@ -20,6 +23,22 @@ def start_server():
     my_app.include_router(submission_router)
     # exception handlers
     register_exception_handler(my_app)
+
+    # the pooled database client is shared by all requests of the worker
+    @my_app.on_event("startup")
+    async def check_database():
+        if not await MongoApi().ping():
+            logging.warning("Database is not reachable, requests will fail until it is.")
+
+    @my_app.on_event("shutdown")
+    async def close_database():
+        await close_pooled_clients()
+
+    @my_app.get("/health", tags=["health"])
+    async def health():
+        if not await MongoApi().ping():
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Database is not reachable")
+        return {"status": "ok"}
     # return app
     return my_app
 
@@ -0,0 +1,57 @@
+import asyncio
+import threading
+from unittest import TestCase
+
+from services.enel_service.common.async_utils import BackgroundEventLoop, get_background_loop
+
+
+class TestBackgroundEventLoop(TestCase):
+    def setUp(self) -> None:
+        self.loop = BackgroundEventLoop("test-loop")
+
+    def tearDown(self) -> None:
+        self.loop.stop()
+
+    def test_coroutines_share_one_loop(self):
+        async def current_loop():
+            await asyncio.sleep(0)
+            return asyncio.get_running_loop(), threading.current_thread()
+
+        results = [self.loop.run(current_loop()) for _ in range(3)]
+
+        self.assertEqual({(self.loop.loop, self.loop.thread)}, set(results))
+
+    def test_submitted_coroutines_run_concurrently(self):
+        started = asyncio.Event()
+
+        async def wait():
+            await started.wait()
+            return "done"
+
+        async def start():
+            started.set()
+
+        waiting = self.loop.submit(wait())
+        self.loop.run(start())
+
+        self.assertEqual("done", waiting.result(timeout=1))
+
+    def test_exceptions_are_raised_to_the_caller(self):
+        async def fail():
+            raise ValueError("failed")
+
+        with self.assertRaises(ValueError):
+            self.loop.run(fail())
+
+    def test_loops_are_shared_by_name(self):
+        self.assertIs(get_background_loop(), get_background_loop())
+        self.assertIsNot(get_background_loop(), get_background_loop("test-training-loop"))
+
+    def test_stopped_loops_are_restarted(self):
+        loop = get_background_loop("test-stopped-loop")
+        loop.stop()
+
+        restarted = get_background_loop("test-stopped-loop")
+        self.addCleanup(restarted.stop)
+        self.assertIsNot(loop, restarted)
+        self.assertEqual("done", restarted.run(asyncio.sleep(0, result="done")))
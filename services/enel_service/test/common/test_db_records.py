@@ -0,0 +1,67 @@
+import copy
+from unittest import TestCase
+from unittest.mock import patch
+
+from mongomock_motor import AsyncMongoMockClient
+
+from services.enel_service.common.apis import mongo_api as mongo_api_module
+from services.enel_service.common.apis.mongo_api import MongoApi, close_pooled_clients
+from services.enel_service.common.async_utils import BackgroundEventLoop, force_sync
+from services.enel_service.common.db_schemes import JobExecutionModel, ApplicationExecutionModel, AppRecord, \
+    JobRecord
+from services.enel_service.modeling import application_database_obj, job_database_obj
+
+
+class TestRecords(TestCase):
+    def setUp(self) -> None:
+        self.application_database_obj = copy.deepcopy(application_database_obj)
+        self.job_database_obj = copy.deepcopy(job_database_obj)
+
+    def test_job_record_matches_model(self):
+        record = JobRecord.from_document(self.job_database_obj)
+        model = JobExecutionModel(**self.job_database_obj)
+
+        for field in JobRecord._fields:
+            self.assertEqual(getattr(model, field), getattr(record, field), field)
+        # the specs are matched as dicts in the successor queries
+        self.assertEqual(model.global_specs.dict(), record.global_specs.dict())
+        self.assertEqual(model.optional_specs.dict(), record.optional_specs.dict())
+
+    def test_app_record_matches_model(self):
+        record = AppRecord.from_document(self.application_database_obj)
+        model = ApplicationExecutionModel(**self.application_database_obj)
+
+        for field in AppRecord._fields:
+            self.assertEqual(getattr(model, field), getattr(record, field), field)
+
+    def test_projection_excludes_stages(self):
+        self.assertNotIn("stages", JobRecord.projection())
+        self.assertIn("global_specs", JobRecord.projection())
+        self.assertEqual({"start_time", "end_time", "end_scale_out", "global_specs"}, set(AppRecord.projection()))
+
+
+class TestProjectedFind(TestCase):
+    def setUp(self) -> None:
+        patcher = patch.object(mongo_api_module, "AsyncIOMotorClient", side_effect=AsyncMongoMockClient)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.loop = BackgroundEventLoop("test-records-loop")
+        self.addCleanup(self.loop.stop)
+        self.addCleanup(lambda: force_sync(close_pooled_clients()))
+        self.mongo_api = MongoApi()
+        self.job_database_obj = copy.deepcopy(job_database_obj)
+
+    def test_find_one_with_projection(self):
+        async def find():
+            await self.mongo_api.insert_one("job_execution", self.job_database_obj)
+            return await self.mongo_api.find_one("job_execution", {"_id": self.job_database_obj["_id"]},
+                                                 JobRecord.projection())
+
+        document = self.loop.run(find())
+
+        self.assertNotIn("stages", document)
+        self.assertNotIn("master_specs", document)
+        record = JobRecord.from_document(document)
+        self.assertEqual(self.job_database_obj["_id"], record.id)
+        self.assertEqual(self.job_database_obj["job_id"], record.job_id)
+        self.assertEqual(self.job_database_obj["end_scale_out"], record.end_scale_out)
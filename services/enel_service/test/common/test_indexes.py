@@ -0,0 +1,195 @@
+import copy
+from typing import Iterator
+from unittest import TestCase, skipUnless
+from unittest.mock import patch, AsyncMock
+
+import pymongo
+from bson import ObjectId
+from mongomock_motor import AsyncMongoMockClient
+
+from services.enel_service.common.apis import mongo_api as mongo_api_module
+from services.enel_service.common.apis.mongo_api import MongoApi, close_pooled_clients
+from services.enel_service.common.async_utils import BackgroundEventLoop, force_sync
+from services.enel_service.common.db_schemes import JobExecutionModel, GlobalSpecsModel, OptionalSpecsModel, \
+    compute_spec_hash, spec_filter
+from services.enel_service import migrate_spec_hashes
+from services.enel_service.modeling import job_database_obj
+
+
+def mongod_available() -> bool:
+    try:
+        pymongo.MongoClient(MongoApi().connection_string, serverSelectionTimeoutMS=1000).admin.command("ping")
+        return True
+    except pymongo.errors.PyMongoError:
+        return False
+
+
+def plan_stages(explain_output) -> Iterator[str]:
+    if isinstance(explain_output, dict):
+        if isinstance(explain_output.get("stage"), str):
+            yield explain_output["stage"]
+        for value in explain_output.values():
+            yield from plan_stages(value)
+    elif isinstance(explain_output, list):
+        for value in explain_output:
+            yield from plan_stages(value)
+
+
+class TestSpecHash(TestCase):
+    def setUp(self) -> None:
+        self.job_database_obj = copy.deepcopy(job_database_obj)
+
+    def test_hash_is_computed_on_write(self):
+        job = JobExecutionModel(**{**self.job_database_obj, "spec_hash": "stale"})
+
+        self.assertEqual(compute_spec_hash(job.global_specs, job.optional_specs), job.spec_hash)
+        self.assertEqual(job.spec_hash, job.dict(by_alias=True, exclude_none=True)["spec_hash"])
+
+    def test_hash_differs_by_specs(self):
+        job = JobExecutionModel(**self.job_database_obj)
+        other = JobExecutionModel(**{**self.job_database_obj, "global_specs": {
+            **self.job_database_obj["global_specs"], "data_size_MB": 1}})
+
+        self.assertNotEqual(job.spec_hash, other.spec_hash)
+        self.assertEqual(job.spec_hash, spec_filter(job.global_specs, job.optional_specs)["spec_hash"])
+
+
+class TestCreateIndexes(TestCase):
+    def setUp(self) -> None:
+        patcher = patch.object(mongo_api_module, "AsyncIOMotorClient", side_effect=AsyncMongoMockClient)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.loop = BackgroundEventLoop("test-indexes-loop")
+        self.addCleanup(self.loop.stop)
+        self.addCleanup(lambda: force_sync(close_pooled_clients()))
+        self.mongo_api = MongoApi()
+        self.job_collection = self.mongo_api.settings.mongodb_job_execution_collection
+
+    def test_indexes_are_created(self):
+        async def create():
+            await MongoApi.create_indexes()
+            await self.mongo_api.connect()
+            return await self.mongo_api.database.get_collection(self.job_collection).index_information()
+
+        indexes = self.loop.run(create())
+
+        self.assertEqual([("spec_hash", 1), ("job_id", 1)], list(indexes["spec_hash_job_id"]["key"]))
+        self.assertIn("application_execution_id_job_id", indexes)
+
+    def test_spec_hashes_are_backfilled(self):
+        old_jobs = [{**copy.deepcopy(job_database_obj), "_id": str(ObjectId()), "job_id": job_id}
+                    for job_id in range(3)]
+
+        async def backfill():
+            await self.mongo_api.insert(self.job_collection, old_jobs)
+            count = await self.mongo_api.backfill_spec_hashes(self.job_collection, batch_size=2)
+            return count, await self.mongo_api.find(self.job_collection, {})
+
+        count, jobs = self.loop.run(backfill())
+
+        spec_hash = compute_spec_hash(GlobalSpecsModel(**job_database_obj["global_specs"]),
+                                      OptionalSpecsModel(**job_database_obj["optional_specs"]))
+        self.assertEqual(3, count)
+        self.assertEqual([spec_hash] * 3, [job["spec_hash"] for job in jobs])
+
+    def test_only_missing_spec_hashes_are_backfilled(self):
+        spec_hash = compute_spec_hash(GlobalSpecsModel(**job_database_obj["global_specs"]),
+                                      OptionalSpecsModel(**job_database_obj["optional_specs"]))
+        jobs = [{**copy.deepcopy(job_database_obj), "_id": str(ObjectId()), "job_id": job_id, "spec_hash": stored_hash}
+                for job_id, stored_hash in enumerate(["stale", spec_hash])]
+        jobs.append({**copy.deepcopy(job_database_obj), "_id": str(ObjectId()), "job_id": 2})
+
+        async def backfill():
+            await self.mongo_api.insert(self.job_collection, jobs)
+            count = await self.mongo_api.backfill_spec_hashes(self.job_collection)
+            return count, await self.mongo_api.find(self.job_collection, {})
+
+        count, jobs = self.loop.run(backfill())
+
+        self.assertEqual(1, count)
+        self.assertEqual(["stale", spec_hash, spec_hash], [job["spec_hash"] for job in jobs])
+
+    def test_migration_rehashes_outdated_spec_hashes(self):
+        spec_hash = compute_spec_hash(GlobalSpecsModel(**job_database_obj["global_specs"]),
+                                      OptionalSpecsModel(**job_database_obj["optional_specs"]))
+        jobs = [{**copy.deepcopy(job_database_obj), "_id": str(ObjectId()), "job_id": job_id, "spec_hash": stored_hash}
+                for job_id, stored_hash in enumerate(["stale", spec_hash, "stale"])]
+        self.loop.run(self.mongo_api.insert(self.job_collection, jobs))
+
+        # the in-memory stand-in drops its data with the client, so the migration keeps it open here
+        with patch.object(migrate_spec_hashes, "close_pooled_clients", AsyncMock()) as close:
+            count = self.loop.run(migrate_spec_hashes.migrate(batch_size=1))
+
+        self.assertEqual(2, count)
+        close.assert_awaited_once()
+        jobs = self.loop.run(self.mongo_api.find(self.job_collection, {}))
+        self.assertEqual([spec_hash] * 3, [job["spec_hash"] for job in jobs])
+
+
+@skipUnless(mongod_available(), "explain needs a MongoDB server")
+class TestSuccessorLookupPlan(TestCase):
+    def setUp(self) -> None:
+        self.loop = BackgroundEventLoop("test-explain-loop")
+        self.addCleanup(self.loop.stop)
+        self.addCleanup(lambda: force_sync(close_pooled_clients()))
+        self.mongo_api = MongoApi()
+        # a separate collection, so the jobs of the configured database are not touched
+        self.job_collection = f"test_job_execution_{ObjectId()}"
+        patcher = patch.object(self.mongo_api.settings, "mongodb_job_execution_collection", self.job_collection)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(lambda: self.loop.run(self.drop_collection()))
+
+        self.job = JobExecutionModel(**copy.deepcopy(job_database_obj))
+        jobs = []
+        for data_size in range(1, 21):
+            for job_id in range(10):
+                job = JobExecutionModel(**{**copy.deepcopy(job_database_obj), "_id": str(ObjectId()), "job_id": job_id,
+                                           "global_specs": {**job_database_obj["global_specs"],
+                                                            "data_size_MB": data_size}})
+                jobs.append(job.dict(by_alias=True, exclude_none=True))
+        self.loop.run(self.mongo_api.insert(self.job_collection, jobs))
+        self.loop.run(MongoApi.create_indexes())
+
+    async def drop_collection(self):
+        await self.mongo_api.connect()
+        await self.mongo_api.database.drop_collection(self.job_collection)
+
+    def assert_index_scan(self, pipeline: list):
+        stages = list(plan_stages(self.loop.run(self.mongo_api.explain_aggregate(self.job_collection, pipeline,
+                                                                                 catch_error=False))))
+        self.assertIn("IXSCAN", stages)
+        self.assertNotIn("COLLSCAN", stages)
+
+    def test_successor_jobs_use_index(self):
+        # the $match of get_successor_jobs and of the successors in handle_initial_runtime_prediction
+        self.assert_index_scan([{
+            "$match": {
+                **spec_filter(self.job.global_specs, self.job.optional_specs),
+                'application_signature': self.job.application_signature,
+                'job_id': {'$gt': self.job.job_id},
+                'start_time': {'$exists': True, '$ne': None},
+                'end_time': {'$exists': True, '$ne': None}
+            }}, {
+            "$group": {
+                "_id": "$job_id",
+                "doc": {"$first": "$$ROOT"}
+            }}
+        ])
+
+    def test_first_jobs_use_index(self):
+        # the $match of the first job runtimes in handle_initial_runtime_prediction
+        self.assert_index_scan([{
+            "$match": {
+                **spec_filter(self.job.global_specs, self.job.optional_specs),
+                'application_signature': self.job.global_specs.algorithm_name,
+                'job_id': {'$eq': 0},
+                'start_time': {'$exists': True, '$ne': None},
+                'end_time': {'$exists': True, '$ne': None}
+            }}, {
+            "$project": {
+                "start_time": 1,
+                "end_time": 1,
+                "application_execution_id": 1
+            }}
+        ])
@@ -0,0 +1,95 @@
+import asyncio
+import time
+from unittest import TestCase
+from unittest.mock import patch
+
+from mongomock_motor import AsyncMongoMockClient
+
+from services.enel_service.common.apis import mongo_api as mongo_api_module
+from services.enel_service.common.apis.mongo_api import MongoApi, close_pooled_clients, get_pooled_client
+from services.enel_service.common.async_utils import BackgroundEventLoop, force_sync
+
+
+def run_in_closed_loop(coroutine):
+    # unlike asyncio.run, this does not unset the event loop of the main thread, which async_return relies on
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class TestPooledClient(TestCase):
+    def setUp(self) -> None:
+        patcher = patch.object(mongo_api_module, "AsyncIOMotorClient", side_effect=AsyncMongoMockClient)
+        self.client_class = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.loop = BackgroundEventLoop("test-mongo-loop")
+        self.addCleanup(self.loop.stop)
+        self.addCleanup(lambda: force_sync(close_pooled_clients()))
+        self.mongo_api = MongoApi()
+
+    def test_client_is_shared_by_operations(self):
+        async def operations():
+            await self.mongo_api.insert_one("job_execution", {"job_id": 0})
+            await MongoApi().find_one("job_execution", {"job_id": 0})
+            await self.mongo_api.update_one("job_execution", {"job_id": 0}, {"$set": {"end_time": 1}})
+            return await self.mongo_api.find("job_execution", {})
+
+        documents = self.loop.run(operations())
+
+        self.assertEqual(1, documents[0]["end_time"])
+        self.assertEqual(1, self.client_class.call_count)
+        self.assertEqual(self.mongo_api.settings.mongodb_max_pool_size, self.client_class.call_args.kwargs["maxPoolSize"])
+
+    def test_clients_are_bound_to_their_loop(self):
+        client = self.loop.run(self._get_client())
+
+        self.assertIs(client, self.loop.run(self._get_client()))
+        self.assertIsNot(client, run_in_closed_loop(self._get_client()))
+        # the client of the closed loop is dropped
+        run_in_closed_loop(self._get_client())
+        self.assertEqual(2, len(mongo_api_module._clients))
+
+    def test_close_clients_of_running_loop(self):
+        other_loop = BackgroundEventLoop("test-other-mongo-loop")
+        self.addCleanup(other_loop.stop)
+        client = self.loop.run(self._get_client())
+        other_client = other_loop.run(self._get_client())
+
+        self.loop.run(close_pooled_clients(running_loop_only=True))
+
+        self.assertIsNot(client, self.loop.run(self._get_client()))
+        self.assertIs(other_client, other_loop.run(self._get_client()))
+
+    def test_ping(self):
+        self.assertTrue(self.loop.run(self.mongo_api.ping()))
+
+    def test_operations_reuse_pooled_client(self):
+        # the in-memory stand-in only shows the client overhead, against a mongod every new client also pays for
+        # server discovery and the authentication handshake
+        async def operations(pooled: bool, count: int = 100):
+            for job_id in range(count):
+                await self.mongo_api.insert_one("job_execution", {"job_id": job_id})
+                if not pooled:
+                    # what every operation did before: create a new client and close it afterwards
+                    await close_pooled_clients()
+                await self.mongo_api.find_one("job_execution", {"job_id": job_id})
+                if not pooled:
+                    await close_pooled_clients()
+
+        clients = {}
+        for pooled in (False, True):
+            calls = self.client_class.call_count
+            start = time.perf_counter()
+            self.loop.run(operations(pooled))
+            print(f"\n{'pooled' if pooled else 'client per operation'}: "
+                  f"{200 / (time.perf_counter() - start):.0f} ops/sec")
+            clients[pooled] = self.client_class.call_count - calls
+
+        # a pooled client serves all operations, one is created as the previous one was closed
+        self.assertEqual({False: 200, True: 1}, clients)
+        self.assertEqual(100, len(self.loop.run(self.mongo_api.find("job_execution", {}))))
+
+    async def _get_client(self):
+        return get_pooled_client(self.mongo_api.connection_string, 10)
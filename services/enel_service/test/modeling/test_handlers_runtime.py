@@ -1,18 +1,19 @@
 import copy
+import threading
 from contextlib import redirect_stderr
 from io import StringIO
 from typing import List
 from unittest import TestCase
-from unittest.mock import MagicMock, Mock
+from unittest.mock import MagicMock, Mock, patch
 
 from services.enel_service.modeling import request_id, job_database_obj
 from services.enel_service.common.apis.hdfs_api import HdfsApi
 from services.enel_service.common.apis.mongo_api import MongoApi
-from services.enel_service.common.async_utils import async_return, force_sync
+from services.enel_service.common.async_utils import async_return, force_sync, BackgroundEventLoop
 from services.enel_service.common.configuration import HdfsSettings, MongoSettings
 from services.enel_service.common.db_schemes import JobExecutionModel
 from services.enel_service.config.onlinepredictor_config import OnlinePredictorConfig
-from services.enel_service.modeling.handlers_runtime import handle_online_runtime_prediction
+from services.enel_service.modeling.handlers_runtime import handle_online_runtime_prediction, get_successor_jobs
 from services.enel_service.modeling.model_wrappers import OnlinePredictorModel
 from services.enel_service.modeling.transforms import CustomCompose, TransformationHandler
 from services.enel_service.modeling.utils import reset_artifact_cache, prepare_for_inference
@@ -82,7 +83,11 @@ class TestHandleOnlineRuntimePrediction(TestCase):
             self.mongo_api.aggregate.assert_called_once()
             self.mongo_api.find.assert_not_called()
 
-    def test_prediction_ok_with_history(self):
+    def mock_history(self):
+        """
+        Mocks the artifacts and the historical data of the predecessor and successor jobs, returns the successor jobs
+        and the scale-outs they were executed with.
+        """
         onlinepredictor_config: OnlinePredictorConfig = OnlinePredictorConfig()
         onlinepredictor_config.model_setup["epochs"] = [20, 20]
         onlinepredictor_config.early_stopping["patience"] = 5
@@ -142,6 +147,10 @@ class TestHandleOnlineRuntimePrediction(TestCase):
 
         # we find historical data for successor jobs
         self.mongo_api.aggregate = MagicMock(return_value=async_return([el.dict() for el in successor_jobs]))
+        return successor_jobs, unique_scale_outs
+
+    def test_prediction_ok_with_history(self):
+        successor_jobs, unique_scale_outs = self.mock_history()
 
         with redirect_stderr(StringIO()) as _:
             response = force_sync(handle_online_runtime_prediction(self.request_id, self.hdfs_api, self.mongo_api))
@@ -155,3 +164,34 @@ class TestHandleOnlineRuntimePrediction(TestCase):
             self.assertTrue(isinstance(response.abort, bool))
             self.mongo_api.aggregate.assert_called_once()
             self.mongo_api.find.assert_called_once()
+
+    def test_slow_fine_tuning_does_not_block_the_loop(self):
+        successor_jobs, _ = self.mock_history()
+        fine_tuning, release = threading.Event(), threading.Event()
+        fit = OnlinePredictorModel.fit
+
+        def slow_fit(model_wrapper, *args, **kwargs):
+            fine_tuning.set()
+            release.wait(timeout=10)
+            return fit(model_wrapper, *args, **kwargs)
+
+        loop = BackgroundEventLoop("test-runtime-prediction")
+        self.addCleanup(loop.stop)
+        self.addCleanup(release.set)
+        with patch.object(OnlinePredictorModel, 'fit', autospec=True, side_effect=slow_fit), \
+                redirect_stderr(StringIO()) as _:
+            prediction = loop.submit(handle_online_runtime_prediction(self.request_id, self.hdfs_api, self.mongo_api))
+            self.assertTrue(fine_tuning.wait(timeout=60))
+
+            # an event of another application is handled on the same loop while the fine-tuning is running
+            db_element = JobExecutionModel(**self.database_obj)
+            other_successor_jobs = loop.run(get_successor_jobs(db_element.global_specs,
+                                                               db_element.optional_specs,
+                                                               "other_application_signature",
+                                                               0,
+                                                               self.mongo_api), timeout=5)
+            self.assertEqual(len(successor_jobs), len(other_successor_jobs))
+            self.assertFalse(prediction.done())
+
+            release.set()
+            self.assertFalse(prediction.result(timeout=120).abort)
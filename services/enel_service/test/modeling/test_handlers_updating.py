@@ -1,11 +1,17 @@
+import asyncio
 import copy
 import datetime
+from typing import List
 from unittest import TestCase
 from unittest.mock import MagicMock, call, Mock, patch, AsyncMock, ANY
 
+from bson import ObjectId
+from mongomock_motor import AsyncMongoMockClient
+
 from services.enel_service.modeling import request_id, application_database_obj, job_database_obj
 from services.enel_service.common.apis.kubernetes_api import update_dict_func
-from services.enel_service.common.apis.mongo_api import MongoApi
+from services.enel_service.common.apis import mongo_api as mongo_api_module
+from services.enel_service.common.apis.mongo_api import MongoApi, BulkWriteCoalescer, close_pooled_clients
 from services.enel_service.common.async_utils import async_return, force_sync
 from services.enel_service.common.configuration import MongoSettings
 from services.enel_service.common.db_schemes import JobExecutionModel, ApplicationExecutionModel
@@ -203,3 +209,75 @@ class TestHandleOnlineUpdateInformation(TestCase):
                 {"$set": job_db_element.dict(by_alias=True, exclude_none=True)},
                 upsert=True, catch_error=False, session=ANY, create=False
             )
+
+
+class TestBatchedJobUpdate(TestCase):
+
+    def setUp(self) -> None:
+        patcher = patch.object(mongo_api_module, "AsyncIOMotorClient", side_effect=AsyncMongoMockClient)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.mongo_api = MongoApi()
+        self.mongo_settings = MongoSettings.get_instance()
+        self.coalescer = BulkWriteCoalescer(self.mongo_api)
+
+        self.app_db_element = copy.deepcopy(application_database_obj)
+        self.end_time = self.app_db_element["end_time"]
+
+    def request(self, application_execution_id: str, job_id: int, end_time: datetime.datetime, end_scale_out: int):
+        return UpdateInformationRequest(
+            application_execution_id=application_execution_id,
+            application_id="application123",
+            job_id=job_id,
+            update_event="JOB_END",
+            updates={"end_time": end_time, "end_scale_out": end_scale_out}
+        )
+
+    def run_updates(self, app_ids: List[str], requests: List[UpdateInformationRequest]):
+        async def run():
+            await self.mongo_api.insert(self.mongo_settings.mongodb_application_execution_collection,
+                                        [{**self.app_db_element, "_id": app_id} for app_id in app_ids])
+            with patch.object(self.mongo_api, "bulk_write", wraps=self.mongo_api.bulk_write) as bulk_write:
+                elements = await asyncio.gather(*[
+                    handle_update_information(request, self.mongo_api, self.coalescer) for request in requests
+                ])
+            apps = await self.mongo_api.find(self.mongo_settings.mongodb_application_execution_collection, {})
+            jobs = await self.mongo_api.find(self.mongo_settings.mongodb_job_execution_collection, {})
+            return elements, bulk_write.call_count, apps, jobs
+
+        return force_sync(run())
+
+    def tearDown(self) -> None:
+        force_sync(close_pooled_clients())
+
+    def test_updates_of_concurrent_applications_are_coalesced(self):
+        app_ids = [str(ObjectId()) for _ in range(10)]
+        later = self.end_time + datetime.timedelta(minutes=5)
+        requests = [self.request(app_id, 1, later, 8) for app_id in app_ids]
+
+        elements, bulk_writes, apps, jobs = self.run_updates(app_ids, requests)
+
+        # one bulk write for the jobs and one for the apps
+        self.assertEqual(2, bulk_writes)
+        self.assertEqual(10, len(jobs))
+        self.assertTrue(all(element is not None and element.end_scale_out == 8 for element in elements))
+        self.assertEqual({(later, 8)}, {(app["end_time"], app["end_scale_out"]) for app in apps})
+
+    def test_app_keeps_later_end_time(self):
+        app_id = str(ObjectId())
+        earlier = self.end_time - datetime.timedelta(minutes=5)
+
+        elements, _, apps, jobs = self.run_updates([app_id], [self.request(app_id, 1, earlier, 8)])
+
+        self.assertEqual(earlier, jobs[0]["end_time"])
+        self.assertEqual((self.end_time, self.app_db_element["end_scale_out"]),
+                         (apps[0]["end_time"], apps[0]["end_scale_out"]))
+        # the conditional app update does not match, which is not an error
+        self.assertIsNotNone(elements[0])
+
+    def test_missing_app(self):
+        elements, bulk_writes, _, jobs = self.run_updates([], [self.request(str(ObjectId()), 1, self.end_time, 8)])
+
+        self.assertEqual([None], elements)
+        self.assertEqual(0, bulk_writes)
+        self.assertEqual([], jobs)
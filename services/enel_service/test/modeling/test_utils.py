@@ -5,12 +5,12 @@ from unittest.mock import MagicMock, call, Mock
 
 from fastapi import HTTPException, status
 
-from services.enel_service.modeling import request_id, application_database_obj
+from services.enel_service.modeling import request_id, application_database_obj, job_database_obj
 from services.enel_service.common.apis.hdfs_api import HdfsApi
 from services.enel_service.common.apis.mongo_api import MongoApi
 from services.enel_service.common.async_utils import async_return
 from services.enel_service.common.configuration import HdfsSettings, MongoSettings
-from services.enel_service.common.db_schemes import ApplicationExecutionModel
+from services.enel_service.common.db_schemes import ApplicationExecutionModel, JobRecord
 from services.enel_service.modeling.utils import reset_artifact_cache, get_all_artifacts, get_by_execution_id
 
 
@@ -131,3 +131,13 @@ class TestGetByExecutionId(TestCase):
         self.assertEqual(exc.exception.status_code, status.HTTP_412_PRECONDITION_FAILED)
         self.assertEqual(exc.exception.detail, "No element found in DB with specified Id.")
         self.mongo_api.find_one.assert_called_once_with("job_execution", {"_id": self.db_element_id})
+
+    def test_record_type(self):
+        self.mongo_api.find_one = MagicMock(return_value=async_return(copy.deepcopy(job_database_obj)))
+
+        record: JobRecord = asyncio.run(get_by_execution_id(self.db_element_id, self.mongo_api, scope="job",
+                                                            record_type=JobRecord))
+        self.assertIsInstance(record, JobRecord)
+        self.assertEqual(job_database_obj["job_id"], record.job_id)
+        self.mongo_api.find_one.assert_called_once_with("job_execution", {"_id": self.db_element_id},
+                                                        JobRecord.projection())
@@ -1,16 +1,29 @@
 import json
-from typing import Dict, Optional, List
+from typing import Dict, Optional, List, Type, TypeVar, Union
 from enum import Enum
 from abc import ABC, abstractmethod
 
 from pydantic import BaseModel, Field
 
 
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+
+def build_model(model: Type[ModelT], data: dict, trusted: bool = False) -> ModelT:
+    """
+    Builds a model from listener data. Trusted data is taken as is without running pydantic validation, so nested
+    models have to be built by the caller.
+    """
+    return model.construct(**data) if trusted else model(**data)
+
+
 class EventType(str, Enum):
     JOB_START = "JOB_START"
     JOB_END = "JOB_END"
     APPLICATION_START = "APPLICATION_START"
     APPLICATION_END = "APPLICATION_END"
+    # carries several of the events above, its payload is {"events": [<envelope>, ...]}
+    BATCH = "BATCH"
 
 
 class MessageEnvelope(BaseModel):
@@ -19,7 +32,10 @@ class MessageEnvelope(BaseModel):
 
     @staticmethod
     def from_json(json_str: str) -> "MessageEnvelope":
-        data = json.loads(json_str)
+        return MessageEnvelope.from_dict(json.loads(json_str))
+
+    @staticmethod
+    def from_dict(data: dict) -> "MessageEnvelope":
         data['event_type'] = EventType(data['event_type'])
         return MessageEnvelope(**data)
 
@@ -79,6 +95,12 @@ class Stage(BaseModel):
     rdd_disk_size: int
     metrics: StageMetrics
 
+    @staticmethod
+    def create(data: dict, trusted: bool = False) -> "Stage":
+        if trusted:
+            return Stage.construct(**{**data, 'metrics': StageMetrics.construct(**data['metrics'])})
+        return Stage(**data)
+
 
 class AppStartMessage(BaseModel):
     application_id: str  # spark app id
@@ -92,12 +114,12 @@ class AppStartMessage(BaseModel):
     environment_specs: EnvironmentSpecs
 
     @staticmethod
-    def create(data: dict) -> "AppStartMessage":
-        data['app_specs'] = AppSpecs(**data.get('app_specs', {}))
-        data['driver_specs'] = DriverSpecs(**data.get('driver_specs', {}))
-        data['executor_specs'] = ExecutorSpecs(**data.get('executor_specs', {}))
-        data['environment_specs'] = EnvironmentSpecs(**data.get('environment_specs', {}))
-        return AppStartMessage(**data)
+    def create(data: dict, trusted: bool = False) -> "AppStartMessage":
+        data['app_specs'] = build_model(AppSpecs, data.get('app_specs', {}), trusted)
+        data['driver_specs'] = build_model(DriverSpecs, data.get('driver_specs', {}), trusted)
+        data['executor_specs'] = build_model(ExecutorSpecs, data.get('executor_specs', {}), trusted)
+        data['environment_specs'] = build_model(EnvironmentSpecs, data.get('environment_specs', {}), trusted)
+        return build_model(AppStartMessage, data, trusted)
 
 
 class AppEndMessage(BaseModel):
@@ -106,8 +128,8 @@ class AppEndMessage(BaseModel):
     num_executors: int
 
     @staticmethod
-    def create(data: dict) -> "AppEndMessage":
-        return AppEndMessage(**data)
+    def create(data: dict, trusted: bool = False) -> "AppEndMessage":
+        return build_model(AppEndMessage, data, trusted)
 
 
 class JobStartMessage(BaseModel):
@@ -117,8 +139,8 @@ class JobStartMessage(BaseModel):
     num_executors: int
 
     @staticmethod
-    def create(data: dict) -> "JobStartMessage":
-        return JobStartMessage(**data)
+    def create(data: dict, trusted: bool = False) -> "JobStartMessage":
+        return build_model(JobStartMessage, data, trusted)
 
 
 class JobEndMessage(BaseModel):
@@ -130,10 +152,37 @@ class JobEndMessage(BaseModel):
     stages: Dict[str, Stage]
 
     @staticmethod
-    def create(data: dict) -> "JobEndMessage":
+    def create(data: dict, trusted: bool = False) -> "JobEndMessage":
         stages_data = data.pop("stages", {})
-        stages = {key: Stage(**value) for key, value in stages_data.items()}
-        return JobEndMessage(stages=stages, **data)
+        stages = {key: Stage.create(value, trusted) for key, value in stages_data.items()}
+        return build_model(JobEndMessage, {**data, 'stages': stages}, trusted)
+
+
+EventMessage = Union[AppStartMessage, AppEndMessage, JobStartMessage, JobEndMessage]
+
+MESSAGE_TYPES: Dict[EventType, Type[EventMessage]] = {
+    EventType.JOB_START: JobStartMessage,
+    EventType.JOB_END: JobEndMessage,
+    EventType.APPLICATION_START: AppStartMessage,
+    EventType.APPLICATION_END: AppEndMessage,
+}
+
+
+def create_message(envelope: MessageEnvelope, trusted: bool = False) -> EventMessage:
+    """
+    Creates the event message carried by a (non-batch) envelope.
+    """
+    message_type = MESSAGE_TYPES.get(envelope.event_type)
+    if message_type is None:
+        raise ValueError(f"Unknown event type: {envelope.event_type}")
+    return message_type.create(envelope.payload, trusted)
+
+
+def create_batch_messages(envelope: MessageEnvelope, trusted: bool = False) -> List[EventMessage]:
+    """
+    Creates the event messages carried by a batch envelope.
+    """
+    return [create_message(MessageEnvelope.from_dict(event), trusted) for event in envelope.payload.get('events', [])]
 
 
 class ResponseMessage(BaseModel):
@@ -146,11 +195,38 @@ class ResponseMessage(BaseModel):
         return ResponseMessage(**data)
 
 
+class BatchResponseMessage(BaseModel):
+    # one response per event of the batch, in the order of the events
+    responses: List[ResponseMessage]
+
+    @staticmethod
+    def create(json_str: str) -> "BatchResponseMessage":
+        data = json.loads(json_str)
+        return BatchResponseMessage(**data)
+
+
+class ErrorResponseMessage(BaseModel):
+    # sent instead of a response if a request could not be processed
+    error: str
+
+    @staticmethod
+    def create(json_str: str) -> "ErrorResponseMessage":
+        data = json.loads(json_str)
+        return ErrorResponseMessage(**data)
+
+
 class EventHandler(ABC):
     """
     Interface for handling different Spark event types.
     """
 
+    @property
+    def name(self) -> str:
+        """
+        Name of the handler, used to label its metrics.
+        """
+        return type(self).__name__
+
     @abstractmethod
     def handle_application_start(self, message: AppStartMessage) -> ResponseMessage:
         pass
@@ -167,6 +243,28 @@ class EventHandler(ABC):
     def handle_application_end(self, message: AppEndMessage) -> ResponseMessage:
         pass
 
+    def handle_message(self, message: EventMessage) -> ResponseMessage:
+        """
+        Delegates the message to the handler method of its event type.
+        """
+        if isinstance(message, JobStartMessage):
+            return self.handle_job_start(message)
+        elif isinstance(message, JobEndMessage):
+            return self.handle_job_end(message)
+        elif isinstance(message, AppStartMessage):
+            return self.handle_application_start(message)
+        elif isinstance(message, AppEndMessage):
+            return self.handle_application_end(message)
+        else:
+            raise ValueError(f"Unknown message type: {type(message).__name__}")
+
+    def handle_batch(self, messages: List[EventMessage]) -> List[ResponseMessage]:
+        """
+        Handles the messages of a batch in order. Handlers may override this to persist a batch with fewer database
+        writes, but must return one response per message.
+        """
+        return [self.handle_message(message) for message in messages]
+
     @staticmethod
     def no_op_app_start_response(message: AppStartMessage) -> ResponseMessage:
         return ResponseMessage(
@@ -191,7 +289,7 @@ class EventHandler(ABC):
 # The NoOpEventHandler will recommend the minimum number of executors set in the app specs.
 class NoOpEventHandler(EventHandler):
 
-    def __init__(self, db):
+    def __init__(self, db=None):
         pass
 
     def handle_application_start(self, message: AppStartMessage) -> ResponseMessage:
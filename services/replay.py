@@ -0,0 +1,251 @@
+"""
+Replays recorded bridge events against a bridge service and reports latency percentiles and throughput.
+
+Recordings are JSON lines of message envelopes, as written by `python3 -m services.bridge_service --record <file>`.
+Each recorded application is replayed by N simulated applications running concurrently. By default, the bridge is
+started in-process with MongoDB replaced by an in-memory stand-in (mongomock), so the replay runs offline:
+
+    python3 -m services.replay events.jsonl --handler EllisEventHandler --apps 8 --rate 20
+
+Handlers that need further infrastructure (EnelEventHandler needs MongoDB transactions and HDFS) are replayed against a
+separately started bridge service:
+
+    python3 -m services.replay events.jsonl --endpoint tcp://localhost:5555 --apps 8
+"""
+import argparse
+import json
+import socket
+import threading
+import time
+from typing import List, Optional
+
+import numpy as np
+import zmq
+
+from .codec import JSON_CODEC
+from .event_handler import EventHandler, EventType, NoOpEventHandler
+from .server import ZeroMQServer
+
+try:
+    import mongomock
+except ImportError:  # mongomock is only needed for offline replays of database backed handlers
+    mongomock = None
+
+
+class EventRecorder:
+    """
+    Appends every received message envelope as a JSON line to a file. APPLICATION_START envelopes are recorded with the
+    app_event_id the handler responded with, which identifies the following events of the application.
+    """
+
+    def __init__(self, path: str):
+        self.file = open(path, "a")
+        self.lock = threading.Lock()
+
+    def record(self, envelope: dict, app_event_id: Optional[str] = None):
+        if app_event_id is not None:
+            envelope = {**envelope, 'app_event_id': app_event_id}
+        line = json.dumps(envelope)
+        with self.lock:
+            self.file.write(line + "\n")
+            self.file.flush()
+
+
+def load_streams(path: str) -> List[List[dict]]:
+    """
+    Splits a recording into the event streams of its applications. Every APPLICATION_START opens a new stream, which
+    the following events join by the app_event_id recorded with it. In recordings without these ids, the events of an
+    app_event_id belong to the earliest stream that has not been assigned an app_event_id yet, which is only correct if
+    the applications were recorded one after another.
+    """
+    streams: List[List[dict]] = []
+    unassigned: List[List[dict]] = []
+    assigned: dict[str, List[dict]] = {}
+
+    with open(path) as file:
+        for line in file:
+            if not line.strip():
+                continue
+            envelope = json.loads(line)
+            if envelope['event_type'] == EventType.APPLICATION_START.value:
+                recorded_app_event_id = envelope.pop('app_event_id', None)
+                stream = [envelope]
+                streams.append(stream)
+                if recorded_app_event_id is None:
+                    unassigned.append(stream)
+                else:
+                    assigned[recorded_app_event_id] = stream
+                continue
+
+            app_event_id = envelope['payload'].get('app_event_id')
+            if app_event_id not in assigned:
+                if not unassigned:
+                    print(f"Skipping event of app {app_event_id}, its APPLICATION_START was not recorded")
+                    continue
+                assigned[app_event_id] = unassigned.pop(0)
+            assigned[app_event_id].append(envelope)
+
+    return streams
+
+
+def create_offline_handler(handler_name: str) -> EventHandler:
+    """
+    Creates an event handler whose database is replaced by an in-memory stand-in.
+    """
+    if handler_name == 'NoOpEventHandler':
+        return NoOpEventHandler()
+    elif handler_name == 'EllisEventHandler':
+        if mongomock is None:
+            raise RuntimeError("mongomock is required to replay EllisEventHandler offline")
+        from .ellis_port.config import Config
+        from .ellis_port.ellis_event_handler import EllisEventHandler
+        return EllisEventHandler(db=mongomock.MongoClient(tz_aware=True)[Config.MONGODB_DATABASE])
+    else:
+        raise ValueError(f"{handler_name} cannot be replayed offline, start the bridge service and use --endpoint")
+
+
+class SimulatedApplication(threading.Thread):
+    """
+    Replays the event stream of one recorded application. The app_event_id assigned by the bridge at application
+    start replaces the recorded one in all following events. Timestamps are shifted to the time of the replay, so
+    simulated applications of the same recording do not collide in the database.
+    """
+
+    TIMEOUT_MS = 60000
+
+    def __init__(self, context: zmq.Context, endpoint: str, index: int, stream: List[dict], rate: float):
+        super().__init__(name=f"simulated-app-{index}", daemon=True)
+        self.context = context
+        self.endpoint = endpoint
+        self.index = index
+        self.stream = stream
+        self.rate = rate
+        # (event type, latency in seconds)
+        self.latencies: List[tuple[str, float]] = []
+
+    def run(self):
+        client = self.context.socket(zmq.REQ)
+        client.setsockopt(zmq.LINGER, 0)
+        client.setsockopt(zmq.RCVTIMEO, self.TIMEOUT_MS)
+        client.connect(self.endpoint)
+        app_event_id: Optional[str] = None
+        time_offset = int(time.time() * 1000) + self.index - self.stream[0]['payload'].get('app_time', 0)
+        try:
+            for envelope in self.stream:
+                envelope = json.loads(json.dumps(envelope))
+                payload = envelope['payload']
+                if 'app_time' in payload:
+                    payload['app_time'] += time_offset
+                if envelope['event_type'] == EventType.APPLICATION_START.value:
+                    payload['application_id'] = f"{payload.get('application_id', 'app')}-replay-{self.index}"
+                elif app_event_id is not None:
+                    payload['app_event_id'] = app_event_id
+
+                start = time.perf_counter()
+                client.send(JSON_CODEC.encode(envelope))
+                response = JSON_CODEC.decode(client.recv())
+                self.latencies.append((envelope['event_type'], time.perf_counter() - start))
+
+                if envelope['event_type'] == EventType.APPLICATION_START.value:
+                    app_event_id = response['app_event_id']
+                if self.rate > 0:
+                    time.sleep(1 / self.rate)
+        finally:
+            client.close()
+
+
+def replay(streams: List[List[dict]], endpoint: str, num_apps: int, rate: float) -> dict:
+    """
+    Replays the streams with num_apps concurrent simulated applications and returns the latency report.
+    """
+    context = zmq.Context()
+    applications = [
+        SimulatedApplication(context, endpoint, i, streams[i % len(streams)], rate) for i in range(num_apps)
+    ]
+    start = time.perf_counter()
+    for application in applications:
+        application.start()
+    for application in applications:
+        application.join()
+    duration = time.perf_counter() - start
+    context.term()
+
+    latencies = [latency for application in applications for latency in application.latencies]
+    return create_report(latencies, duration)
+
+
+def create_report(latencies: List[tuple[str, float]], duration: float) -> dict:
+    """
+    Computes p50/p95/p99 latencies in milliseconds per event type and overall, as well as the throughput.
+    """
+    def percentiles(values: List[float]) -> dict:
+        p50, p95, p99 = np.percentile(np.array(values) * 1e3, [50, 95, 99])
+        return {'count': len(values), 'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p99}
+
+    report = {
+        'events': len(latencies),
+        'duration_s': duration,
+        'throughput_events_per_s': len(latencies) / duration if duration > 0 else 0.0,
+        'latency': {},
+    }
+    if latencies:
+        for event_type in sorted({event_type for event_type, _ in latencies}):
+            report['latency'][event_type] = percentiles(
+                [latency for other, latency in latencies if other == event_type]
+            )
+        report['latency']['ALL'] = percentiles([latency for _, latency in latencies])
+    return report
+
+
+def print_report(report: dict):
+    print(f"Replayed {report['events']} events in {report['duration_s']:.2f}s "
+          f"({report['throughput_events_per_s']:.1f} events/s)")
+    print(f"{'event type':<20}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for event_type, stats in report['latency'].items():
+        print(f"{event_type:<20}{stats['count']:>8}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}"
+              f"{stats['p99_ms']:>10.2f}")
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('', 0))
+        return s.getsockname()[1]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded events against the bridge service")
+    parser.add_argument('recording', type=str, help='JSON lines file of recorded message envelopes')
+    parser.add_argument(
+        '--handler',
+        type=str,
+        default='NoOpEventHandler',
+        help='Event handler of the in-process bridge, NoOpEventHandler or EllisEventHandler (default: NoOpEventHandler)'
+    )
+    parser.add_argument(
+        '--endpoint',
+        type=str,
+        default=None,
+        help='Replay against a running bridge service (e.g. tcp://localhost:5555) instead of an in-process one'
+    )
+    parser.add_argument('--apps', type=int, default=1, help='Number of concurrent simulated applications (default: 1)')
+    parser.add_argument(
+        '--rate',
+        type=float,
+        default=0,
+        help='Events per second sent by each simulated application, 0 sends as fast as possible (default: 0)'
+    )
+    parser.add_argument('--workers', type=int, default=4, help='Workers of the in-process bridge (default: 4)')
+    args = parser.parse_args()
+
+    recorded_streams = load_streams(args.recording)
+    if not recorded_streams:
+        raise ValueError(f"No recorded application found in {args.recording}")
+
+    bridge_endpoint = args.endpoint
+    if bridge_endpoint is None:
+        port = free_port()
+        server = ZeroMQServer(create_offline_handler(args.handler), port, args.workers)
+        threading.Thread(target=server.start, daemon=True).start()
+        bridge_endpoint = f"tcp://localhost:{port}"
+
+    print_report(replay(recorded_streams, bridge_endpoint, args.apps, args.rate))
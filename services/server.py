@@ -1,57 +1,175 @@
+import threading
+import time
+import traceback
+import zlib
+from typing import List
+
 import zmq
 
-from .event_handler import EventHandler, EventType, ResponseMessage, MessageEnvelope, \
-    AppStartMessage, AppEndMessage, JobStartMessage, JobEndMessage
+from .codec import Codec, JSON_CODEC, detect_codec
+from .event_handler import EventHandler, EventType, ResponseMessage, MessageEnvelope, BatchResponseMessage, \
+    ErrorResponseMessage, EventMessage, create_message, create_batch_messages
+from .metrics import BridgeMetrics
 
 
 class ZeroMQServer:
     """
     ZeroMQ server that receives RequestMessages from clients and responds with ResponseMessages.
+
+    Clients connect to a ROUTER front end. Each request is forwarded to one of a pool of worker threads, which are
+    connected through DEALER sockets to an in-process ROUTER back end. Requests are routed by their application, so
+    events of one application are processed in order while different applications are processed in parallel.
+
+    A BATCH request carries several events and is answered with one response per event. A request that fails is
+    answered with an ErrorResponseMessage.
+
+    Requests are either JSON or msgpack encoded, responses use the encoding of the request. Payloads of trusted
+    listeners can be turned into messages without pydantic validation. Decode, handler and encode latencies as well as
+    the queue depth of each worker are recorded in `metrics`.
     """
 
-    def __init__(self, event_handler: EventHandler, port: int):
+    BACKEND_ADDRESS = "inproc://bridge-workers"
+    READY = b"READY"
+
+    def __init__(self, event_handler: EventHandler, port: int, num_workers: int = 1, trusted_payloads: bool = False,
+                 recorder=None):
+        if num_workers < 1:
+            raise ValueError(f"At least one worker is required, got {num_workers}")
         self.port = port
         self.event_handler = event_handler
+        self.trusted_payloads = trusted_payloads
+        self.metrics = BridgeMetrics()
+        # optionally records all received envelopes, see services.replay.EventRecorder
+        self.recorder = recorder
         self.context = zmq.Context()
-        self.socket = self.context.socket(zmq.REP)
-        self.socket.bind(f"tcp://*:{self.port}")
+        self.frontend = self.context.socket(zmq.ROUTER)
+        self.frontend.bind(f"tcp://*:{self.port}")
+        self.backend = self.context.socket(zmq.ROUTER)
+        self.backend.bind(self.BACKEND_ADDRESS)
+        self.worker_ids = [f"worker-{i}".encode() for i in range(num_workers)]
+        self.workers = [
+            threading.Thread(target=self._work, args=(worker_id,), name=worker_id.decode(), daemon=True)
+            for worker_id in self.worker_ids
+        ]
 
     def start(self):
-        print(f"Server started at tcp://*:{self.port}")
+        for worker in self.workers:
+            worker.start()
+        self._await_workers()
+        print(f"Server started at tcp://*:{self.port} with {len(self.workers)} worker(s)")
+
+        poller = zmq.Poller()
+        poller.register(self.frontend, zmq.POLLIN)
+        poller.register(self.backend, zmq.POLLIN)
         try:
             while True:
-                message = self.socket.recv_string()
-                envelope = MessageEnvelope.from_json(message)
+                sockets = dict(poller.poll())
+
+                # replies from workers: [worker_id, client_id, b'', response]
+                if self.backend in sockets:
+                    frames = self.backend.recv_multipart()
+                    self.frontend.send_multipart(frames[1:])
 
-                response_message = self.process_message(envelope)
-                response_json = response_message.json()
-                self.socket.send_string(response_json)
+                # requests from clients: [client_id, b'', request]
+                if self.frontend in sockets:
+                    client_id, delimiter, message = self.frontend.recv_multipart()
+                    worker_id = self.select_worker(message)
+                    self.metrics.queue_depth.inc(worker=worker_id.decode())
+                    self.backend.send_multipart([worker_id, client_id, delimiter, message])
 
         except KeyboardInterrupt:
             print("Server shutting down.")
         finally:
-            self.socket.close()
+            self.frontend.close()
+            self.backend.close()
             self.context.term()
 
-    def process_message(self, envelope: MessageEnvelope) -> ResponseMessage:
+    def select_worker(self, message: bytes) -> bytes:
         """
-        Process the incoming request and delegate to the appropriate event handler method.
+        Select the worker for a raw request. Requests of the same application are always assigned to the same worker.
         """
-        event_type = envelope.event_type
-        print(f"Processing {event_type.value} event")
+        key = self.routing_key(message)
+        return self.worker_ids[zlib.crc32(key.encode()) % len(self.worker_ids)]
+
+    @staticmethod
+    def routing_key(message: bytes) -> str:
+        """
+        Extract the key requests are routed by. APPLICATION_START events do not yet have an app_event_id, so the
+        spark application id is used instead.
+
+        Only the key is peeked at, the request is decoded by the worker. Batches are sent by the listener of a single
+        application, so the first key found in a batch is the key of all its events.
+        """
+        codec = detect_codec(message)
+        return codec.peek(message, 'app_event_id') or codec.peek(message, 'application_id') or ''
 
-        if event_type == EventType.JOB_START:
-            message = JobStartMessage.create(envelope.payload)
-            return self.event_handler.handle_job_start(message)
-        elif event_type == EventType.JOB_END:
-            message = JobEndMessage.create(envelope.payload)
-            return self.event_handler.handle_job_end(message)
-        elif event_type == EventType.APPLICATION_START:
-            message = AppStartMessage.create(envelope.payload)
-            return self.event_handler.handle_application_start(message)
-        elif event_type == EventType.APPLICATION_END:
-            message = AppEndMessage.create(envelope.payload)
-            return self.event_handler.handle_application_end(message)
+    def _await_workers(self):
+        pending = set(self.worker_ids)
+        while pending:
+            worker_id, _ = self.backend.recv_multipart()
+            pending.discard(worker_id)
+
+    def _work(self, worker_id: bytes):
+        socket = self.context.socket(zmq.DEALER)
+        socket.setsockopt(zmq.IDENTITY, worker_id)
+        socket.setsockopt(zmq.LINGER, 0)
+        socket.connect(self.BACKEND_ADDRESS)
+        socket.send(self.READY)
+        try:
+            while True:
+                client_id, delimiter, message = socket.recv_multipart()
+                codec = JSON_CODEC
+                try:
+                    codec = detect_codec(message)
+                    envelope, event_message = self.decode_message(codec, message)
+                    response_message = self.process_message(envelope.event_type, event_message)
+                    if self.recorder is not None and envelope.event_type == EventType.APPLICATION_START:
+                        # recorded with its app_event_id, so replays can map the following events to it
+                        self.recorder.record({'event_type': envelope.event_type.value, 'payload': event_message.dict()},
+                                             response_message.app_event_id)
+                    with self.metrics.encode_seconds.time(event_type=envelope.event_type.value):
+                        response = codec.encode(response_message.dict())
+                    socket.send_multipart([client_id, delimiter, response])
+                except Exception as e:
+                    print(f"Failed to process message on {worker_id.decode()}:")
+                    traceback.print_exc()
+                    # the client's REQ socket can only send its next request once it received a response
+                    error_response = ErrorResponseMessage(error=f"{type(e).__name__}: {e}")
+                    socket.send_multipart([client_id, delimiter, codec.encode(error_response.dict())])
+                finally:
+                    self.metrics.queue_depth.dec(worker=worker_id.decode())
+        except zmq.ContextTerminated:
+            pass
+        finally:
+            socket.close()
+
+    def decode_message(self, codec: Codec, message: bytes) -> tuple[MessageEnvelope, EventMessage | List[EventMessage]]:
+        """
+        Decode a raw request into its envelope and the event message, or the event messages of a batch.
+        """
+        start = time.perf_counter()
+        data = codec.decode(message)
+        if self.recorder is not None and data.get('event_type') != EventType.APPLICATION_START.value:
+            # the envelope is recorded before it is turned into messages, recording does not count as decoding. An
+            # APPLICATION_START is recorded once it is handled.
+            record_start = time.perf_counter()
+            self.recorder.record(data)
+            start += time.perf_counter() - record_start
+        envelope = MessageEnvelope.from_dict(data)
+        if envelope.event_type == EventType.BATCH:
+            event_message = create_batch_messages(envelope, self.trusted_payloads)
         else:
-            print(f"Unknown event type: {event_type}")
-            raise ValueError(f"Unknown event type: {event_type}")
+            event_message = create_message(envelope, self.trusted_payloads)
+        self.metrics.decode_seconds.observe(time.perf_counter() - start, event_type=envelope.event_type.value)
+        return envelope, event_message
+
+    def process_message(self, event_type: EventType,
+                        event_message: EventMessage | List[EventMessage]) -> ResponseMessage | BatchResponseMessage:
+        """
+        Process the incoming request and delegate to the appropriate event handler method.
+        """
+        print(f"Processing {event_type.value} event")
+        with self.metrics.handler_seconds.time(event_type=event_type.value, handler=self.event_handler.name):
+            if event_type == EventType.BATCH:
+                return BatchResponseMessage(responses=self.event_handler.handle_batch(event_message))
+            return self.event_handler.handle_message(event_message)
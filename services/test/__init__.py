@@ -0,0 +1,35 @@
+def job_end_envelope(num_stages: int) -> dict:
+    stage = {
+        'stage_name': 'map at KMeans.scala:123',
+        'num_tasks': 200,
+        'parent_stage_ids': [1, 2],
+        'attempt_id': 0,
+        'failure_reason': '',
+        'start_time': 1000,
+        'end_time': 2000,
+        'start_scale_out': 4,
+        'end_scale_out': 4,
+        'rescaling_time_ratio': 0.0,
+        'rdd_num_partitions': 200,
+        'rdd_num_cached_partitions': 0,
+        'rdd_mem_size': 0,
+        'rdd_disk_size': 0,
+        'metrics': {
+            'cpu_utilization': 0.8,
+            'gc_time_ratio': 0.01,
+            'shuffle_read_write_ratio': 1.2,
+            'input_output_ratio': 0.5,
+            'memory_spill_ratio': 0.0,
+        },
+    }
+    return {
+        'event_type': 'JOB_END',
+        'payload': {
+            'app_event_id': '6710fd0e2a3b4c5d6e7f8091',
+            'app_time': 5000,
+            'job_id': 3,
+            'num_executors': 4,
+            'rescaling_time_ratio': 0.0,
+            'stages': {str(i): {**stage, 'stage_id': str(i)} for i in range(num_stages)},
+        },
+    }
@@ -0,0 +1,61 @@
+import json
+import timeit
+import unittest
+
+from services.codec import JSON_CODEC, MSGPACK_CODEC, detect_codec
+from services.event_handler import MessageEnvelope, JobEndMessage, EventType
+from services.test import job_end_envelope
+
+
+class TestCodec(unittest.TestCase):
+
+    def test_detects_json(self):
+        message = json.dumps(job_end_envelope(1)).encode()
+        self.assertIs(JSON_CODEC, detect_codec(message))
+        self.assertIs(JSON_CODEC, detect_codec(b' ' + message))
+
+    @unittest.skipIf(MSGPACK_CODEC is None, "msgpack is not installed")
+    def test_msgpack_round_trip(self):
+        data = job_end_envelope(3)
+        message = MSGPACK_CODEC.encode(data)
+        codec = detect_codec(message)
+        self.assertIs(MSGPACK_CODEC, codec)
+
+        envelope = MessageEnvelope.from_dict(codec.decode(message))
+        self.assertEqual(EventType.JOB_END, envelope.event_type)
+        self.assertEqual(3, len(JobEndMessage.create(envelope.payload).stages))
+
+    def test_json_peek(self):
+        message = json.dumps(job_end_envelope(3)).encode()
+        self.assertEqual('6710fd0e2a3b4c5d6e7f8091', JSON_CODEC.peek(message, 'app_event_id'))
+        self.assertIsNone(JSON_CODEC.peek(message, 'application_id'))
+        self.assertEqual('a"b', JSON_CODEC.peek(json.dumps({'payload': {'app_event_id': 'a"b'}}).encode(),
+                                                'app_event_id'))
+
+    @unittest.skipIf(MSGPACK_CODEC is None, "msgpack is not installed")
+    def test_msgpack_peek(self):
+        message = MSGPACK_CODEC.encode(job_end_envelope(3))
+        self.assertEqual('6710fd0e2a3b4c5d6e7f8091', MSGPACK_CODEC.peek(message, 'app_event_id'))
+        self.assertIsNone(MSGPACK_CODEC.peek(message, 'application_id'))
+        long_id = 'x' * 300
+        self.assertEqual(long_id, MSGPACK_CODEC.peek(MSGPACK_CODEC.encode({'app_event_id': long_id}), 'app_event_id'))
+
+    @unittest.skipIf(MSGPACK_CODEC is None, "msgpack is not installed")
+    def test_codecs_decode_equal_messages(self):
+        """A JOB_END message with hundreds of stages decodes to the same message with JSON and msgpack."""
+        data = job_end_envelope(500)
+        number = 5
+        messages = []
+        for codec in [JSON_CODEC, MSGPACK_CODEC]:
+            message = codec.encode(data)
+            seconds = timeit.timeit(lambda: codec.decode(message), number=number)
+            print(f"{codec.name}: {len(message)} bytes, {seconds / number * 1e3:.3f} ms per decode")
+            envelope = MessageEnvelope.from_dict(codec.decode(message))
+            messages.append(JobEndMessage.create(envelope.payload))
+
+        json_message, msgpack_message = messages
+        self.assertEqual(500, len(json_message.stages))
+        self.assertEqual(json_message, msgpack_message)
+
+if __name__ == '__main__':
+    unittest.main()
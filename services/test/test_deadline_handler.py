@@ -0,0 +1,140 @@
+import threading
+import unittest
+
+from services.deadline_handler import DeadlineEventHandler
+from services.event_handler import EventHandler, AppStartMessage, JobStartMessage, JobEndMessage, AppEndMessage, \
+    ResponseMessage
+
+
+class SlowEventHandler(EventHandler):
+    """
+    Recommends 10 executors at job end, but only after it is released.
+    """
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.finished = threading.Event()
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+        self.finished_jobs: list[int] = []
+        # applications whose job ends are not held back
+        self.fast_apps: set[str] = set()
+
+    def handle_application_start(self, message: AppStartMessage) -> ResponseMessage:
+        return self.no_op_app_start_response(message)
+
+    def handle_job_start(self, message: JobStartMessage) -> ResponseMessage:
+        return self.no_op_job_event_recommendation(message)
+
+    def handle_job_end(self, message: JobEndMessage) -> ResponseMessage:
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        if message.app_event_id not in self.fast_apps:
+            self.release.wait(timeout=5)
+        with self.lock:
+            self.running -= 1
+            self.finished_jobs.append(message.job_id)
+        self.finished.set()
+        return ResponseMessage(app_event_id=message.app_event_id, recommended_scale_out=10 + message.job_id)
+
+    def handle_application_end(self, message: AppEndMessage) -> ResponseMessage:
+        return self.no_op_app_end_response(message)
+
+
+def job_end(job_id: int, app_event_id: str = 'app') -> JobEndMessage:
+    return JobEndMessage(app_event_id=app_event_id, app_time=0, job_id=job_id, num_executors=4, rescaling_time_ratio=0.0,
+                         stages={})
+
+
+class TestDeadlineEventHandler(unittest.TestCase):
+
+    def setUp(self):
+        self.slow_handler = SlowEventHandler()
+        self.handler = DeadlineEventHandler(self.slow_handler, deadline_ms=50)
+
+    def tearDown(self):
+        self.slow_handler.release.set()
+        self.handler.executor.shutdown()
+
+    def test_answers_in_time(self):
+        self.slow_handler.release.set()
+        self.assertEqual(10, self.handler.handle_job_end(job_end(0)).recommended_scale_out)
+        self.assertNotIn('app', self.handler.pending)
+
+    def test_attaches_late_recommendation_to_next_response(self):
+        self.assertEqual(4, self.handler.handle_job_end(job_end(0)).recommended_scale_out)
+
+        self.slow_handler.release.set()
+        self.slow_handler.finished.wait(timeout=5)
+        self.handler.pending['app'][-1].result(timeout=5)
+
+        job_start = JobStartMessage(app_event_id='app', app_time=0, job_id=1, num_executors=4)
+        self.assertEqual(10, self.handler.handle_job_start(job_start).recommended_scale_out)
+        # the late recommendation is only attached once
+        self.assertEqual(4, self.handler.handle_job_start(job_start).recommended_scale_out)
+
+    def test_application_end_awaits_background_computation(self):
+        self.handler.handle_job_end(job_end(0))
+        threading.Timer(0.05, self.slow_handler.release.set).start()
+        self.handler.handle_application_end(AppEndMessage(app_event_id='app', app_time=0, num_executors=4))
+        self.assertTrue(self.slow_handler.finished.is_set())
+        self.assertNotIn('app', self.handler.pending)
+
+    def test_application_end_awaits_all_background_computations(self):
+        self.assertEqual(4, self.handler.handle_job_end(job_end(0)).recommended_scale_out)
+        self.assertEqual(4, self.handler.handle_job_end(job_end(1)).recommended_scale_out)
+        self.assertEqual(2, len(self.handler.pending['app']))
+
+        threading.Timer(0.05, self.slow_handler.release.set).start()
+        self.handler.handle_application_end(AppEndMessage(app_event_id='app', app_time=0, num_executors=4))
+        self.assertEqual([0, 1], self.slow_handler.finished_jobs)
+        self.assertNotIn('app', self.handler.pending)
+
+    def test_job_ends_of_an_application_run_one_after_another(self):
+        for job_id in range(3):
+            self.handler.handle_job_end(job_end(job_id))
+        self.slow_handler.release.set()
+        self.handler.pending['app'][-1].result(timeout=5)
+
+        self.assertEqual([0, 1, 2], self.slow_handler.finished_jobs)
+        self.assertEqual(1, self.slow_handler.max_running)
+        # the latest finished recommendation is attached
+        job_start = JobStartMessage(app_event_id='app', app_time=0, job_id=3, num_executors=4)
+        self.assertEqual(12, self.handler.handle_job_start(job_start).recommended_scale_out)
+        self.assertNotIn('app', self.handler.pending)
+
+    def test_queued_job_ends_do_not_occupy_workers(self):
+        handler = DeadlineEventHandler(self.slow_handler, deadline_ms=50, max_workers=2)
+        self.addCleanup(handler.executor.shutdown)
+        for job_id in range(4):
+            self.assertEqual(4, handler.handle_job_end(job_end(job_id)).recommended_scale_out)
+
+        # only the running job end of the slow application holds a worker
+        self.slow_handler.fast_apps.add('other')
+        self.assertEqual(10, handler.handle_job_end(job_end(0, 'other')).recommended_scale_out)
+
+        self.slow_handler.release.set()
+        handler.pending['app'][-1].result(timeout=5)
+        self.assertEqual([0, 0, 1, 2, 3], self.slow_handler.finished_jobs)
+
+    def test_failed_job_end_does_not_stop_the_following_ones(self):
+        class FailingHandler(SlowEventHandler):
+            def handle_job_end(self, message: JobEndMessage) -> ResponseMessage:
+                if message.job_id == 0:
+                    raise ValueError("failed")
+                return super().handle_job_end(message)
+
+        failing_handler = FailingHandler()
+        failing_handler.release.set()
+        handler = DeadlineEventHandler(failing_handler, deadline_ms=1000)
+        self.addCleanup(handler.executor.shutdown)
+
+        with self.assertRaises(ValueError):
+            handler.handle_job_end(job_end(0))
+        self.assertEqual(11, handler.handle_job_end(job_end(1)).recommended_scale_out)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import copy
+import timeit
+import unittest
+
+from services.event_handler import AppStartMessage, JobEndMessage, JobStartMessage
+from services.test import job_end_envelope
+
+
+def app_start_payload() -> dict:
+    return {
+        'application_id': 'spark-application-1',
+        'app_name': 'kmeans',
+        'app_time': 0,
+        'is_adaptive': True,
+        'is_training': False,
+        'app_specs': {
+            'algorithm_name': 'kmeans',
+            'algorithm_args': ['--k', '10'],
+            'datasize_mb': 2000,
+            'target_runtime': 600000,
+            'min_executors': 2,
+            'max_executors': 12,
+        },
+        'driver_specs': {'cores': 2, 'memory': '2g', 'memory_overhead': '512m'},
+        'executor_specs': {'cores': 4, 'memory': '4g'},
+        'environment_specs': {
+            'machine_type': 'e2-standard-4',
+            'hadoop_version': '3.3.6',
+            'spark_version': '3.5.3',
+            'scala_version': '2.12',
+            'java_version': '17',
+        },
+    }
+
+
+class TestTrustedMessages(unittest.TestCase):
+
+    def test_trusted_app_start_equals_validated(self):
+        validated = AppStartMessage.create(app_start_payload())
+        trusted = AppStartMessage.create(app_start_payload(), trusted=True)
+        self.assertEqual(validated.dict(), trusted.dict())
+        self.assertIsNone(trusted.executor_specs.memory_overhead)
+
+    def test_trusted_job_start_equals_validated(self):
+        payload = {'app_event_id': 'app', 'app_time': 10, 'job_id': 1, 'num_executors': 4}
+        self.assertEqual(JobStartMessage.create(dict(payload)), JobStartMessage.create(dict(payload), trusted=True))
+
+    def test_trusted_job_end_equals_validated(self):
+        payload = job_end_envelope(3)['payload']
+        validated = JobEndMessage.create(copy.deepcopy(payload))
+        trusted = JobEndMessage.create(copy.deepcopy(payload), trusted=True)
+        self.assertEqual(validated.dict(), trusted.dict())
+        self.assertEqual(0.8, trusted.stages['1'].metrics.cpu_utilization)
+
+    def test_trusted_job_end_equals_validated_for_many_stages(self):
+        """Trusted JOB_END messages with many stages equal the validated ones, the parsing overhead is printed."""
+        for num_stages in [10, 100, 1000]:
+            payload = job_end_envelope(num_stages)['payload']
+            number = max(1, 100 // num_stages)
+            timings, messages = {}, {}
+            for trusted in [False, True]:
+                payloads = [copy.deepcopy(payload) for _ in range(number)]
+                seconds = timeit.timeit(lambda: JobEndMessage.create(payloads.pop(), trusted), number=number)
+                timings[trusted] = seconds / number * 1e3
+                messages[trusted] = JobEndMessage.create(copy.deepcopy(payload), trusted)
+            print(f"{num_stages} stages: validated {timings[False]:.3f} ms, trusted {timings[True]:.3f} ms per event")
+            self.assertEqual(num_stages, len(messages[True].stages))
+            self.assertEqual(messages[False].dict(), messages[True].dict())
+
+if __name__ == '__main__':
+    unittest.main()
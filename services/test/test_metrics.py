@@ -0,0 +1,45 @@
+import unittest
+import urllib.request
+
+from services.metrics import Histogram, Gauge, BridgeMetrics, start_metrics_server
+from services.test.test_server import free_port
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram("latency_seconds", "Latency.", ("handler",), buckets=(0.1, 1.0))
+        histogram.observe(0.05, handler="EllisEventHandler")
+        histogram.observe(0.1, handler="EllisEventHandler")
+        histogram.observe(0.5, handler="EllisEventHandler")
+        histogram.observe(2.0, handler="EllisEventHandler")
+
+        lines = histogram.expose()
+        self.assertIn('latency_seconds_bucket{handler="EllisEventHandler",le="0.1"} 2', lines)
+        self.assertIn('latency_seconds_bucket{handler="EllisEventHandler",le="1.0"} 3', lines)
+        self.assertIn('latency_seconds_bucket{handler="EllisEventHandler",le="+Inf"} 4', lines)
+        self.assertIn('latency_seconds_count{handler="EllisEventHandler"} 4', lines)
+
+    def test_gauge(self):
+        gauge = Gauge("queue_depth", "Queue depth.", ("worker",))
+        gauge.inc(worker="worker-0")
+        gauge.inc(worker="worker-0")
+        gauge.dec(worker="worker-0")
+        self.assertEqual(1, gauge.value(worker="worker-0"))
+        self.assertIn('queue_depth{worker="worker-0"} 1', gauge.expose())
+
+    def test_metrics_endpoint(self):
+        metrics = BridgeMetrics()
+        metrics.handler_seconds.observe(0.2, event_type="JOB_END", handler="NoOpEventHandler")
+        port = free_port()
+        server = start_metrics_server(metrics, port)
+        try:
+            with urllib.request.urlopen(f"http://localhost:{port}/metrics") as response:
+                body = response.read().decode()
+        finally:
+            server.shutdown()
+        self.assertIn('bridge_handler_seconds_count{event_type="JOB_END",handler="NoOpEventHandler"} 1', body)
+
+
+if __name__ == '__main__':
+    unittest.main()
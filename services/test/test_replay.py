@@ -0,0 +1,105 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+from services.replay import load_streams, replay, create_offline_handler, free_port, EventRecorder, mongomock
+from services.server import ZeroMQServer
+from services.test.test_event_handler import app_start_payload
+
+
+def recorded_application(app_event_id: str, num_jobs: int) -> list[dict]:
+    events = [{'event_type': 'APPLICATION_START', 'payload': {**app_start_payload(), 'is_adaptive': False}}]
+    for job_id in range(num_jobs):
+        job = {'app_event_id': app_event_id, 'app_time': 1000 * job_id, 'job_id': job_id, 'num_executors': 4}
+        events.append({'event_type': 'JOB_START', 'payload': job})
+        events.append({'event_type': 'JOB_END', 'payload': {
+            **job, 'app_time': 1000 * job_id + 500, 'rescaling_time_ratio': 0.0, 'stages': {}
+        }})
+    events.append({'event_type': 'APPLICATION_END', 'payload': {
+        'app_event_id': app_event_id, 'app_time': 1000 * num_jobs, 'num_executors': 4
+    }})
+    return events
+
+
+class TestReplay(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.recording = os.path.join(self.directory.name, 'events.jsonl')
+        recorder = EventRecorder(self.recording)
+        for envelope in recorded_application('first', 2) + recorded_application('second', 3):
+            recorder.record(envelope)
+        recorder.file.close()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def start_bridge(self, handler_name: str) -> str:
+        port = free_port()
+        server = ZeroMQServer(create_offline_handler(handler_name), port, num_workers=2)
+        threading.Thread(target=server.start, daemon=True).start()
+        return f"tcp://localhost:{port}"
+
+    def test_load_streams(self):
+        streams = load_streams(self.recording)
+        self.assertEqual([6, 8], [len(stream) for stream in streams])
+        self.assertEqual({'first'}, {e['payload']['app_event_id'] for e in streams[0][1:]})
+        self.assertEqual({'second'}, {e['payload']['app_event_id'] for e in streams[1][1:]})
+
+    def test_load_streams_of_concurrent_applications(self):
+        recording = os.path.join(self.directory.name, 'concurrent.jsonl')
+        recorder = EventRecorder(recording)
+        first, second = recorded_application('first', 2), recorded_application('second', 3)
+        recorder.record(first[0], 'first')
+        recorder.record(second[0], 'second')
+        # the second application's jobs start first
+        for envelope in second[1:3] + first[1:] + second[3:]:
+            recorder.record(envelope)
+        recorder.file.close()
+
+        streams = load_streams(recording)
+        self.assertEqual([6, 8], [len(stream) for stream in streams])
+        self.assertEqual({'first'}, {e['payload']['app_event_id'] for e in streams[0][1:]})
+        self.assertEqual({'second'}, {e['payload']['app_event_id'] for e in streams[1][1:]})
+        self.assertNotIn('app_event_id', streams[0][0])
+
+    @unittest.skipIf(mongomock is None, "mongomock is not installed")
+    def test_bridge_records_app_event_ids(self):
+        recording = os.path.join(self.directory.name, 'replayed.jsonl')
+        recorder = EventRecorder(recording)
+        port = free_port()
+        server = ZeroMQServer(create_offline_handler('EllisEventHandler'), port, num_workers=2, recorder=recorder)
+        threading.Thread(target=server.start, daemon=True).start()
+
+        replay(load_streams(self.recording), f"tcp://localhost:{port}", num_apps=4, rate=0)
+        recorder.file.close()
+
+        streams = load_streams(recording)
+        self.assertEqual([6, 6, 8, 8], sorted(len(stream) for stream in streams))
+        for stream in streams:
+            self.assertEqual(1, len({e['payload']['app_event_id'] for e in stream[1:]}))
+
+    def test_replay_no_op_handler(self):
+        report = replay(load_streams(self.recording), self.start_bridge('NoOpEventHandler'), num_apps=4, rate=0)
+        self.assertEqual(2 * 6 + 2 * 8, report['events'])
+        self.assertEqual(4, report['latency']['APPLICATION_START']['count'])
+        self.assertEqual(10, report['latency']['JOB_END']['count'])
+        self.assertGreater(report['throughput_events_per_s'], 0)
+        stats = report['latency']['ALL']
+        self.assertLessEqual(stats['p50_ms'], stats['p95_ms'])
+        self.assertLessEqual(stats['p95_ms'], stats['p99_ms'])
+
+    @unittest.skipIf(mongomock is None, "mongomock is not installed")
+    def test_replay_ellis_handler_offline(self):
+        report = replay(load_streams(self.recording), self.start_bridge('EllisEventHandler'), num_apps=2, rate=0)
+        self.assertEqual(6 + 8, report['events'])
+
+    def test_recording_is_json_lines(self):
+        with open(self.recording) as file:
+            self.assertEqual('APPLICATION_START', json.loads(file.readline())['event_type'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,170 @@
+import json
+import threading
+import time
+import unittest
+
+import zmq
+
+from services.codec import MSGPACK_CODEC, JsonCodec
+from services.event_handler import EventHandler, AppStartMessage, JobStartMessage, JobEndMessage, AppEndMessage, \
+    ResponseMessage, BatchResponseMessage, ErrorResponseMessage
+from services.replay import free_port
+from services.server import ZeroMQServer
+
+
+class SlowJsonCodec(JsonCodec):
+
+    def decode(self, message: bytes) -> dict:
+        time.sleep(0.05)
+        return super().decode(message)
+
+
+def job_start_envelope(app_event_id: str, job_id: int) -> str:
+    return json.dumps({
+        'event_type': 'JOB_START',
+        'payload': {'app_event_id': app_event_id, 'app_time': 0, 'job_id': job_id, 'num_executors': 2},
+    })
+
+
+class BlockingEventHandler(EventHandler):
+    """
+    Blocks job starts of the 'slow' application until released and records the order of processed jobs.
+    """
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.processed: list[tuple[str, int]] = []
+
+    def handle_application_start(self, message: AppStartMessage) -> ResponseMessage:
+        return self.no_op_app_start_response(message)
+
+    def handle_job_start(self, message: JobStartMessage) -> ResponseMessage:
+        if message.app_event_id == 'slow':
+            self.release.wait(timeout=10)
+        self.processed.append((message.app_event_id, message.job_id))
+        return self.no_op_job_event_recommendation(message)
+
+    def handle_job_end(self, message: JobEndMessage) -> ResponseMessage:
+        return self.no_op_job_event_recommendation(message)
+
+    def handle_application_end(self, message: AppEndMessage) -> ResponseMessage:
+        return self.no_op_app_end_response(message)
+
+
+class TestZeroMQServer(unittest.TestCase):
+
+    def setUp(self):
+        self.port = free_port()
+        self.handler = BlockingEventHandler()
+        self.server = ZeroMQServer(self.handler, self.port, num_workers=4)
+        threading.Thread(target=self.server.start, daemon=True).start()
+        self.context = zmq.Context()
+
+    def tearDown(self):
+        self.handler.release.set()
+        self.context.destroy(linger=0)
+
+    def request(self, envelope: str, timeout_ms: int = 5000) -> ResponseMessage:
+        client = self.context.socket(zmq.REQ)
+        client.setsockopt(zmq.RCVTIMEO, timeout_ms)
+        client.setsockopt(zmq.LINGER, 0)
+        client.connect(f"tcp://localhost:{self.port}")
+        try:
+            client.send_string(envelope)
+            return ResponseMessage.create(client.recv_string())
+        finally:
+            client.close()
+
+    def test_routes_applications_to_stable_workers(self):
+        self.assertEqual(
+            self.server.select_worker(job_start_envelope('app', 1).encode()),
+            self.server.select_worker(job_start_envelope('app', 2).encode()),
+        )
+
+    def test_slow_application_does_not_block_others(self):
+        slow_worker = self.server.select_worker(job_start_envelope('slow', 0).encode())
+        fast_app = next(
+            f"fast-{i}" for i in range(100)
+            if self.server.select_worker(job_start_envelope(f"fast-{i}", 0).encode()) != slow_worker
+        )
+
+        slow_response = {}
+        slow_client = threading.Thread(
+            target=lambda: slow_response.update(response=self.request(job_start_envelope('slow', 0)))
+        )
+        slow_client.start()
+
+        response = self.request(job_start_envelope(fast_app, 0))
+        self.assertEqual(fast_app, response.app_event_id)
+        self.assertNotIn(('slow', 0), self.handler.processed)
+
+        self.handler.release.set()
+        slow_client.join(timeout=5)
+        self.assertEqual('slow', slow_response['response'].app_event_id)
+
+    @unittest.skipIf(MSGPACK_CODEC is None, "msgpack is not installed")
+    def test_responds_in_request_encoding(self):
+        client = self.context.socket(zmq.REQ)
+        client.setsockopt(zmq.RCVTIMEO, 5000)
+        client.connect(f"tcp://localhost:{self.port}")
+        client.send(MSGPACK_CODEC.encode(json.loads(job_start_envelope('binary', 0))))
+        response = ResponseMessage(**MSGPACK_CODEC.decode(client.recv()))
+        client.close()
+        self.assertEqual('binary', response.app_event_id)
+
+    def test_events_of_one_application_stay_ordered(self):
+        for job_id in range(5):
+            self.request(job_start_envelope('ordered', job_id))
+        jobs = [job_id for app, job_id in self.handler.processed if app == 'ordered']
+        self.assertEqual(list(range(5)), jobs)
+
+    def test_batch_is_answered_per_event(self):
+        batch = json.dumps({
+            'event_type': 'BATCH',
+            'payload': {'events': [json.loads(job_start_envelope('batched', job_id)) for job_id in range(3)]},
+        })
+        client = self.context.socket(zmq.REQ)
+        client.setsockopt(zmq.RCVTIMEO, 5000)
+        client.connect(f"tcp://localhost:{self.port}")
+        client.send_string(batch)
+        response = BatchResponseMessage.create(client.recv_string())
+        client.close()
+
+        self.assertEqual(3, len(response.responses))
+        self.assertEqual(['batched'] * 3, [r.app_event_id for r in response.responses])
+        self.assertEqual([('batched', 0), ('batched', 1), ('batched', 2)],
+                         [event for event in self.handler.processed if event[0] == 'batched'])
+        self.assertEqual(self.server.select_worker(job_start_envelope('batched', 0).encode()),
+                         self.server.select_worker(batch.encode()))
+
+    def test_failed_request_is_answered_with_an_error(self):
+        client = self.context.socket(zmq.REQ)
+        client.setsockopt(zmq.RCVTIMEO, 5000)
+        client.setsockopt(zmq.LINGER, 0)
+        client.connect(f"tcp://localhost:{self.port}")
+        try:
+            client.send_string(json.dumps({'event_type': 'UNKNOWN', 'payload': {'app_event_id': 'broken'}}))
+            self.assertIn('UNKNOWN', ErrorResponseMessage.create(client.recv_string()).error)
+            # the client can send its next request
+            client.send_string(job_start_envelope('broken', 0))
+            self.assertEqual('broken', ResponseMessage.create(client.recv_string()).app_event_id)
+        finally:
+            client.close()
+
+    def test_records_latencies(self):
+        self.request(job_start_envelope('measured', 0))
+        exposition = self.server.metrics.expose()
+        self.assertIn('bridge_handler_seconds_count{event_type="JOB_START",handler="BlockingEventHandler"} 1',
+                      exposition)
+        self.assertIn('bridge_decode_seconds_count{event_type="JOB_START"} 1', exposition)
+        self.assertIn('bridge_encode_seconds_count{event_type="JOB_START"} 1', exposition)
+
+    def test_decode_latency_includes_wire_decode(self):
+        self.server.decode_message(SlowJsonCodec(), job_start_envelope('measured', 0).encode())
+        _, total, count = self.server.metrics.decode_seconds._series[('JOB_START',)]
+        self.assertEqual(1, count)
+        self.assertGreaterEqual(total, 0.05)
+
+
+if __name__ == '__main__':
+    unittest.main()